@@ -0,0 +1,329 @@
+"""A local stand-in for the Monarch API and NCBI eutils, for benchmarks.
+
+Serves /v3/api/association/all, /v3/api/search, /v3/api/entity/{id}, the (v2) /api/sim/search and
+/entrez/eutils/efetch.fcgi. Payloads recorded from the live services are replayed from the fixtures
+directory when present; any other request gets a deterministic synthetic payload of the same
+shape. With record=True (--record), requests without a recording are proxied to the live
+services instead and their responses saved as new recordings. Every response is delayed by the
+configured latency (plus optional random jitter), and calls are counted per endpoint.
+
+Run it standalone and point the plugin at it:
+
+    poetry run python benchmarks/fake_upstream.py --port 8765 --latency 0.05
+    MONARCH_API_URL=http://localhost:8765/v3/api MONARCH_API_V2_URL=http://localhost:8765/api make start-dev
+
+Publication lookups go through the eutils package, which always talks to NCBI; the in-process
+benchmarks (loadgen.py, test_endpoints.py) redirect it here, see harness.py.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import socket
+import threading
+import time
+import zlib
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qsl
+from xml.sax.saxutils import escape
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request, Response
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# synthetic associations cite PMIDs from a shared pool, so publication lookups overlap across responses
+PMID_POOL = 500
+PMID_BASE = 10000000
+
+# where requests are proxied to when recording, by path prefix
+LIVE_HOSTS = {
+    "/v3/api/": "https://api-v3.monarchinitiative.org",
+    "/api/": "https://api.monarchinitiative.org",
+    "/entrez/eutils/": "https://eutils.ncbi.nlm.nih.gov",
+}
+
+# (subject prefix, object prefix) of each association category served by the plugin
+CATEGORY_PREFIXES: Dict[str, Tuple[str, str]] = {
+    "biolink:DiseaseToPhenotypicFeatureAssociation": ("MONDO", "HP"),
+    "biolink:GeneToPhenotypicFeatureAssociation": ("HGNC", "HP"),
+    "biolink:CausalGeneToDiseaseAssociation": ("HGNC", "MONDO"),
+    "biolink:CorrelatedGeneToDiseaseAssociation": ("HGNC", "MONDO"),
+}
+
+
+def request_key(method: str, path: str, params: List[Tuple[str, str]]) -> str:
+    """The key a recorded payload is stored under: method, path and sorted parameters."""
+    query = "&".join(f"{k}={v}" for k, v in sorted(params))
+    return f"{method} {path}?{query}"
+
+
+def fixture_path(fixtures_dir: str, key: str) -> str:
+    return os.path.join(fixtures_dir, hashlib.sha1(key.encode()).hexdigest() + ".json")
+
+
+def _seed(*parts: str) -> int:
+    return zlib.crc32("|".join(parts).encode())
+
+
+def _curie(prefix: str, n: int) -> str:
+    return f"{prefix}:{n}" if prefix == "HGNC" else f"{prefix}:{n:07d}"
+
+
+def synthetic_associations(category: str, entity: str, limit: int, offset: int) -> dict:
+    seed = _seed(category, entity)
+    total = 20 + seed % 180
+    subject_prefix, object_prefix = CATEGORY_PREFIXES.get(category, ("MONDO", "HP"))
+    entity_is_subject = entity.split(":")[0] != object_prefix
+
+    items = []
+    for i in range(offset, min(offset + limit, total)):
+        other = _curie(object_prefix if entity_is_subject else subject_prefix, (seed + i * 7919) % 1000000)
+        subject, object = (entity, other) if entity_is_subject else (other, entity)
+        items.append({
+            "id": f"uuid:{seed:x}-{i}",
+            "category": category,
+            "subject": subject,
+            "subject_label": f"label of {subject}",
+            "predicate": "biolink:has_phenotype",
+            "object": object,
+            "object_label": f"label of {object}",
+            "publications": [f"PMID:{PMID_BASE + (seed + i * 31 + j) % PMID_POOL}" for j in range(i % 4)],
+            "frequency_qualifier": "HP:0040282" if i % 2 else None,
+            "onset_qualifier": None,
+        })
+    return {"limit": limit, "offset": offset, "total": total, "items": items}
+
+
+def synthetic_search(term: str, category: Optional[str], limit: int, offset: int) -> dict:
+    total = 50
+    items = [
+        {
+            "id": _curie("MONDO", _seed(term, str(i)) % 1000000),
+            "name": f"{term} {i}",
+            "category": category or "biolink:Disease",
+            "description": f"A synthetic search result for {term}.",
+        }
+        for i in range(offset, min(offset + limit, total))
+    ]
+    return {"limit": limit, "offset": offset, "total": total, "items": items}
+
+
+def synthetic_entity(id: str) -> dict:
+    seed = _seed(id)
+    return {
+        "id": id,
+        "category": "biolink:Disease",
+        "name": f"name of {id}",
+        "description": f"A synthetic entity {id}.",
+        "symbol": None,
+        "synonym": [f"synonym of {id}"],
+        "in_taxon": None,
+        "association_counts": [
+            {"label": "Disease Phenotypes", "count": 20 + seed % 180, "category": "biolink:DiseaseToPhenotypicFeatureAssociation"},
+            {"label": "Causal Genes", "count": seed % 7, "category": "biolink:CausalGeneToDiseaseAssociation"},
+        ],
+    }
+
+
+def synthetic_sim_search(ids: List[str], limit: int) -> dict:
+    matches = [
+        {"id": _curie("MONDO", _seed(*ids, str(i)) % 1000000), "label": f"match {i}", "score": 100 - i,
+         "type": "disease", "taxon": {"id": "NCBITaxon:9606", "label": "Homo sapiens"}}
+        for i in range(limit)
+    ]
+    return {"query": {"ids": [{"id": id} for id in ids]}, "matches": matches}
+
+
+def synthetic_efetch(pmids: List[str]) -> str:
+    articles = "".join(
+        "<PubmedArticle><MedlineCitation>"
+        f"<PMID>{escape(pmid)}</PMID>"
+        "<Article>"
+        f"<Journal><ISOAbbreviation>J Synth Med</ISOAbbreviation><JournalIssue><Volume>{int(pmid) % 40}</Volume>"
+        f"<PubDate><Year>{1990 + int(pmid) % 34}</Year></PubDate></JournalIssue></Journal>"
+        f"<ArticleTitle>A synthetic article {escape(pmid)}</ArticleTitle>"
+        "<AuthorList><Author><LastName>Smith</LastName><Initials>J</Initials></Author>"
+        "<Author><LastName>Doe</LastName><Initials>A</Initials></Author></AuthorList>"
+        "</Article></MedlineCitation></PubmedArticle>"
+        for pmid in pmids
+        if pmid.isdigit()
+    )
+    return f'<?xml version="1.0" ?><PubmedArticleSet>{articles}</PubmedArticleSet>'
+
+
+class FakeUpstream:
+    """The fake Monarch and NCBI services, with injected latency and per-endpoint call counts."""
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        fixtures_dir: Optional[str] = FIXTURES_DIR,
+        record: bool = False,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.fixtures_dir = fixtures_dir
+        self.record = record
+        self.calls: Counter = Counter()
+        self.replayed = 0
+        self._lock = threading.Lock()
+        self.app = self._create_app()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.calls.clear()
+            self.replayed = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.calls)
+
+    def _count(self, endpoint: str) -> None:
+        with self._lock:
+            self.calls[endpoint] += 1
+
+    def _replay(self, key: str) -> Optional[Response]:
+        if not self.fixtures_dir:
+            return None
+        path = fixture_path(self.fixtures_dir, key)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            recorded = json.load(f)
+        with self._lock:
+            self.replayed += 1
+        return Response(recorded["body"], status_code=recorded["status"], media_type=recorded["content_type"])
+
+    async def _record(self, key: str, request: Request, path: str, params: List[Tuple[str, str]]) -> Response:
+        host = next(host for prefix, host in LIVE_HOSTS.items() if path.startswith(prefix))
+        async with httpx.AsyncClient(timeout=60) as client:
+            if request.method == "POST":
+                live = await client.post(host + path, data=dict(params))
+            else:
+                live = await client.get(host + path, params=params)
+
+        content_type = live.headers.get("content-type", "application/json").split(";")[0]
+        os.makedirs(self.fixtures_dir, exist_ok=True)
+        with open(fixture_path(self.fixtures_dir, key), "w") as f:
+            json.dump({"request": key, "status": live.status_code, "content_type": content_type, "body": live.text}, f)
+        return Response(live.text, status_code=live.status_code, media_type=content_type)
+
+    def _create_app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.get("/_stats")
+        async def stats():
+            return {"calls": self.stats(), "replayed": self.replayed}
+
+        @app.post("/_reset")
+        async def reset():
+            self.reset()
+            return {}
+
+        @app.api_route("/{path:path}", methods=["GET", "POST"])
+        async def upstream(path: str, request: Request):
+            params = list(request.query_params.multi_items())
+            if request.method == "POST":
+                params += parse_qsl((await request.body()).decode())
+            args = dict(params)
+
+            path = "/" + path
+            if path.startswith("/v3/api/association/all"):
+                endpoint = "association/all"
+            elif path.startswith("/v3/api/search"):
+                endpoint = "search"
+            elif path.startswith("/v3/api/entity/"):
+                endpoint = "entity"
+            elif path.startswith("/api/sim/search"):
+                endpoint = "sim/search"
+            elif path.startswith("/entrez/eutils/efetch.fcgi"):
+                endpoint = "efetch"
+            else:
+                return Response(status_code=404)
+
+            self._count(endpoint)
+            delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+            if delay:
+                await asyncio.sleep(delay)
+
+            # NCBI credentials and identification are not part of what a recording is keyed on
+            key_params = [(k, v) for k, v in params if k not in ("api_key", "tool", "email")]
+            key = request_key(request.method, path, key_params)
+            recorded = self._replay(key)
+            if recorded is not None:
+                return recorded
+            if self.record:
+                return await self._record(key, request, path, key_params)
+
+            limit = int(args.get("limit", 20))
+            offset = int(args.get("offset", 0))
+            if endpoint == "association/all":
+                return synthetic_associations(args.get("category", ""), args.get("entity", ""), limit, offset)
+            if endpoint == "search":
+                return synthetic_search(args.get("q", ""), args.get("category"), limit, offset)
+            if endpoint == "entity":
+                id = path.rsplit("/", 1)[-1]
+                if "missing" in id:
+                    return Response(json.dumps({"detail": f"Entity not found: {id}"}), status_code=404,
+                                    media_type="application/json")
+                return synthetic_entity(id)
+            if endpoint == "sim/search":
+                return synthetic_sim_search([v for k, v in params if k == "id"], limit)
+            return Response(synthetic_efetch(args.get("id", "").split(",")), media_type="text/xml")
+
+        return app
+
+    @contextmanager
+    def serve(self, host: str = "127.0.0.1", port: int = 0) -> Iterator[str]:
+        """Serve the fake from a background thread, yielding its base URL."""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        # accepted connections inherit this; without it Nagle and delayed ACKs add ~40 ms per keep-alive response
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.bind((host, port))
+        port = sock.getsockname()[1]
+
+        server = _ThreadedServer(uvicorn.Config(self.app, log_level="warning", lifespan="off"))
+        thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+        thread.start()
+        while not server.started:
+            if not thread.is_alive():
+                raise RuntimeError("fake upstream failed to start")
+            time.sleep(0.01)
+        try:
+            yield f"http://{host}:{port}"
+        finally:
+            server.should_exit = True
+            thread.join(timeout=5)
+            sock.close()
+
+
+class _ThreadedServer(uvicorn.Server):
+    # signal handlers can only be installed from the main thread
+    def install_signal_handlers(self) -> None:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many extra random seconds")
+    parser.add_argument("--fixtures", default=FIXTURES_DIR, help="directory of recorded payloads")
+    parser.add_argument("--record", action="store_true", help="proxy unrecorded requests to the live services and save them")
+    args = parser.parse_args()
+
+    upstream = FakeUpstream(latency=args.latency, jitter=args.jitter, fixtures_dir=args.fixtures, record=args.record)
+    uvicorn.run(upstream.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Wires the plugin to a FakeUpstream for the in-process benchmarks (loadgen.py and test_endpoints.py)."""
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from oai_monarch_plugin.main import app
+from oai_monarch_plugin.routers import publications
+from oai_monarch_plugin.routers.backends import MonarchClient, monarch_client, provide_monarch_client, set_backend
+from oai_monarch_plugin.routers.similarity import PhenotypeSimilarity, get_similarity_engine, np, set_similarity_engine
+
+from fake_upstream import FIXTURES_DIR, FakeUpstream
+
+# one request per router, "{i}" picks one of the distinct entities requests are spread over
+SCENARIOS: Dict[str, str] = {
+    "search": "/search?term=fibrosis%20{i}&limit=10",
+    "entity": "/entity?ids=MONDO:{i:07d}&ids=HP:{i:07d}&ids=HGNC:{i}",
+    "disease-genes": "/disease-genes?disease_id=MONDO:{i:07d}&limit=20",
+    "disease-phenotypes": "/disease-phenotypes?disease_id=MONDO:{i:07d}&limit=20",
+    "gene-diseases": "/gene-diseases?gene_id=HGNC:{i}&limit=20",
+    "gene-phenotypes": "/gene-phenotypes?gene_id=HGNC:{i}&limit=20",
+    "phenotype-diseases": "/phenotype-diseases?phenotype_id=HP:{i:07d}&limit=20",
+    "phenotype-genes": "/phenotype-genes?phenotype_id=HP:{i:07d}&limit=20",
+    "phenotype-profile-search": "/phenotype-profile-search?ids=HP:{i:07d}&ids=HP:0000002&limit=10",
+}
+
+
+def similarity_engine(terms: int = 64, diseases: int = 200) -> Optional[PhenotypeSimilarity]:
+    """A small synthetic similarity index for /phenotype-profile-search, None without numpy.
+
+    HP:0000001 to HP:{terms} form a binary tree (the parent of term k is term k // 2), so every term
+    the scenarios ask for exists; MONDO:0000001 to MONDO:{diseases} are each annotated with three of them.
+    """
+    if np is None:
+        return None
+    parents = {f"HP:{k:07d}": [f"HP:{k // 2:07d}"] for k in range(2, terms + 1)}
+    annotations = {
+        f"MONDO:{j:07d}": [f"HP:{(j * step) % terms + 1:07d}" for step in (7, 13, 29)] for j in range(1, diseases + 1)
+    }
+    entities = {id: {"label": f"disease {id}", "type": "disease", "taxon": {}} for id in annotations}
+    return PhenotypeSimilarity(parents, annotations, entities)
+
+
+def clear_caches() -> None:
+    """Empty the plugin's response and publication caches, so the next requests go upstream."""
+    monarch_client.response_cache.clear()
+    publications.publication_cache.clear()
+
+
+@contextmanager
+def fake_upstream_stack(
+    latency: float = 0.0,
+    jitter: float = 0.0,
+    ncbi_rps: float = 10.0,
+    fixtures_dir: str = FIXTURES_DIR,
+    record: bool = False,
+) -> Iterator[FakeUpstream]:
+    """Serve a FakeUpstream and point the plugin's Monarch backend and eutils client at it, and
+    install the synthetic similarity_engine.
+
+    ncbi_rps is the request rate the eutils client throttles itself to (NCBI allows 10/s with an
+    API key), 0 disables the throttle.
+    """
+
+    upstream = FakeUpstream(latency=latency, jitter=jitter, fixtures_dir=fixtures_dir, record=record)
+    with upstream.serve() as url:
+        client = MonarchClient(base_url=f"{url}/v3/api", v2_base_url=f"{url}/api")
+
+        async def provide_fake_monarch_client():
+            return client
+
+        eutils_url = publications.EUTILS_URL
+        publications.EUTILS_URL = f"{url}/entrez/eutils"
+        publications._eutils_client = None
+        publications._get_eutils_client()._qs.request_interval = 1.0 / ncbi_rps if ncbi_rps else 0.0
+
+        engine = get_similarity_engine()
+        set_similarity_engine(similarity_engine())
+        set_backend(client)
+        app.dependency_overrides[provide_monarch_client] = provide_fake_monarch_client
+        clear_caches()
+        try:
+            yield upstream
+        finally:
+            app.dependency_overrides.pop(provide_monarch_client, None)
+            set_backend(None)
+            set_similarity_engine(engine)
+            publications.EUTILS_URL = eutils_url
+            publications._eutils_client = None
+            clear_caches()
@@ -0,0 +1,109 @@
+"""Load generator running every router against a local fake Monarch API and NCBI.
+
+Sends --requests requests per endpoint, --concurrency at a time, spread over --distinct entities,
+to the plugin in-process, with the fake upstream (fake_upstream.py) answering after --latency
+seconds. Reports throughput, p50/p95/p99 latency and the upstream calls made per endpoint.
+
+    poetry run python benchmarks/loadgen.py --requests 200 --concurrency 16 --latency 0.05
+    poetry run python benchmarks/loadgen.py --cold --endpoint disease-phenotypes --endpoint entity
+
+By default the plugin's caches carry over between requests, as in production; --cold clears them
+before every request, so each one pays for its upstream calls.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Dict, List
+
+import httpx
+from loguru import logger
+
+from oai_monarch_plugin.main import app
+
+from harness import SCENARIOS, clear_caches, fake_upstream_stack
+
+
+def percentile(sorted_values: List[float], p: int) -> float:
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    return statistics.quantiles(sorted_values, n=100, method="inclusive")[p - 1]
+
+
+async def run_endpoint(path: str, requests: int, concurrency: int, distinct: int, cold: bool) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async with httpx.AsyncClient(app=app, base_url="http://plugin", timeout=None) as client:
+
+        async def one(n: int) -> None:
+            nonlocal errors
+            async with semaphore:
+                if cold:
+                    clear_caches()
+                start = time.perf_counter()
+                response = await client.get(path.format(i=n % distinct + 1))
+                latencies.append(time.perf_counter() - start)
+                if response.status_code >= 400:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(n) for n in range(requests)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "throughput": requests / elapsed,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+    }
+
+
+def format_calls(calls: Dict[str, int]) -> str:
+    return " ".join(f"{endpoint}={count}" for endpoint, count in sorted(calls.items())) or "-"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--requests", type=int, default=100, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--distinct", type=int, default=20, help="number of distinct entities requested")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds the fake upstream takes to answer")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many extra random seconds")
+    parser.add_argument("--ncbi-rps", type=float, default=10.0, help="eutils request rate, 0 for unthrottled")
+    parser.add_argument("--cold", action="store_true", help="clear the plugin's caches before every request")
+    parser.add_argument("--record", action="store_true", help="record live payloads for requests not yet recorded")
+    parser.add_argument("--endpoint", action="append", choices=sorted(SCENARIOS), help="endpoints to run (default all)")
+    parser.add_argument("--verbose", action="store_true", help="keep the plugin's log output")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logger.remove()
+
+    print(
+        f"{args.requests} requests per endpoint, concurrency {args.concurrency}, {args.distinct} distinct entities, "
+        f"upstream latency {args.latency * 1000:.0f} ms{' (cold caches)' if args.cold else ''}"
+    )
+    print(f"{'endpoint':<26}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}  upstream calls")
+
+    with fake_upstream_stack(
+        latency=args.latency, jitter=args.jitter, ncbi_rps=args.ncbi_rps, record=args.record
+    ) as upstream:
+        for name in args.endpoint or SCENARIOS:
+            clear_caches()
+            upstream.reset()
+            result = asyncio.run(
+                run_endpoint(SCENARIOS[name], args.requests, args.concurrency, args.distinct, args.cold)
+            )
+            print(
+                f"{name:<26}{result['throughput']:>9.1f}{result['p50'] * 1000:>9.1f}{result['p95'] * 1000:>9.1f}"
+                f"{result['p99'] * 1000:>9.1f}{result['errors']:>8}  {format_calls(upstream.stats())}"
+            )
+
+
+if __name__ == "__main__":
+    main()
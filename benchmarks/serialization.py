@@ -0,0 +1,81 @@
+"""Microbenchmark of response serialization for a large association page.
+
+Compares the CPU time per response of FastAPI's default path (response_model re-validation,
+jsonable_encoder and the standard JSON encoder) with the FAST_JSON path used by
+utils.model_response (model.dict() serialized by orjson).
+
+    poetry run python benchmarks/serialization.py --associations 500 --repeat 50
+"""
+import argparse
+import asyncio
+import time
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from oai_monarch_plugin.routers.models import Phenotype, PhenotypeAssociation, PhenotypeAssociations
+
+
+def build_response(n: int) -> PhenotypeAssociations:
+    associations = []
+    for i in range(n):
+        assoc = PhenotypeAssociation(
+            metadata={"frequency_qualifier": "HP:0040282", "onset_qualifier": None},
+            phenotype=Phenotype(phenotype_id=f"HP:{i:07d}", label=f"Phenotype {i}"),
+        )
+        for j in range(3):
+            assoc.publications.append({
+                "id": f"PMID:{i * 10 + j}",
+                "title": "A case report of a rare disease with a long and descriptive title",
+                "author(s)": "Smith J et al.",
+                "year": "2009",
+                "journal": "Med Princ Pract",
+                "url": f"https://pubmed.ncbi.nlm.nih.gov/{i * 10 + j}",
+                "status": "Success",
+            })
+        associations.append(assoc)
+
+    return PhenotypeAssociations(
+        associations=associations,
+        total=n,
+        phenotype_url_template="https://monarchinitiative.org/phenotype/{phenotype_id}",
+    )
+
+
+def default_path(field, content: PhenotypeAssociations) -> bytes:
+    serialized = asyncio.run(serialize_response(field=field, response_content=content))
+    return JSONResponse(serialized).body
+
+
+def fast_path(content: PhenotypeAssociations) -> bytes:
+    return ORJSONResponse(content.dict()).body
+
+
+def measure(fn, repeat: int) -> float:
+    start = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return (time.process_time() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--associations", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    content = build_response(args.associations)
+    field = create_response_field(name="response", type_=PhenotypeAssociations)
+
+    default = measure(lambda: default_path(field, content), args.repeat)
+    fast = measure(lambda: fast_path(content), args.repeat)
+
+    print(f"{args.associations} associations, {args.repeat} repetitions")
+    print(f"default (re-validate + jsonable_encoder + json): {default * 1000:8.2f} ms CPU per response")
+    print(f"fast    (model.dict() + orjson):                 {fast * 1000:8.2f} ms CPU per response")
+    print(f"speedup: {default / fast:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
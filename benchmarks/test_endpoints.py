@@ -0,0 +1,55 @@
+"""pytest-benchmark suite timing every router against the fake upstream.
+
+    poetry run pytest benchmarks --benchmark-columns=min,median,mean,max,rounds
+
+"warm" runs repeat one request, so after the first round it is served from the plugin's caches;
+"cold" runs clear the caches before every round, so each round includes its upstream calls
+(answered without added latency, which leaves the plugin's own overhead). The upstream calls
+made per round are stored in each benchmark's extra_info.
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+from oai_monarch_plugin.main import app
+from oai_monarch_plugin.routers.similarity import np
+
+from harness import SCENARIOS, clear_caches, fake_upstream_stack
+
+pytest.importorskip("pytest_benchmark")
+
+
+@pytest.fixture(scope="module")
+def upstream():
+    with fake_upstream_stack(latency=0.0, ncbi_rps=0) as upstream:
+        yield upstream
+
+
+@pytest.fixture(scope="module")
+def client(upstream):
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.mark.parametrize("cold", [False, True], ids=["warm", "cold"])
+@pytest.mark.parametrize("name", list(SCENARIOS))
+def test_endpoint(benchmark, upstream, client, name, cold):
+    if name == "phenotype-profile-search" and np is None:
+        pytest.skip("the phenotype profile search needs numpy, which the harness builds its similarity index with")
+    path = SCENARIOS[name].format(i=1)
+    clear_caches()
+    upstream.reset()
+
+    def setup():
+        if cold:
+            clear_caches()
+
+    def request():
+        return client.get(path)
+
+    response = benchmark.pedantic(request, setup=setup, rounds=20, warmup_rounds=1)
+    assert response.status_code == 200
+
+    rounds = 21 if cold else 1
+    benchmark.extra_info["upstream_calls"] = {
+        endpoint: count / rounds for endpoint, count in upstream.stats().items()
+    }
@@ -0,0 +1,7 @@
+# Loaded automatically by gunicorn when started from the repository root (see `make start-prod`).
+from prometheus_client import multiprocess
+
+
+def child_exit(server, worker):
+    # drop the live gauges of exited workers from the aggregated /metrics
+    multiprocess.mark_process_dead(worker.pid)
@@ -4,7 +4,8 @@ import logging
 import click
 
 from oai_monarch_plugin import __version__
-from oai_monarch_plugin.main import demo
+from oai_monarch_plugin.routers.backends import build_snapshot
+from oai_monarch_plugin.routers.search_index import build_search_index
 
 __all__ = [
     "main",
@@ -33,10 +34,30 @@ def main(verbose: int, quiet: bool):
         logger.setLevel(level=logging.ERROR)
 
 
-@main.command()
-def run():
-    """Run the oai-monarch-plugin's demo command."""
-    demo()
+@main.command("build-snapshot")
+@click.option("--nodes", "nodes_path", required=True, type=click.Path(exists=True, dir_okay=False), help="KGX nodes TSV.")
+@click.option("--edges", "edges_path", required=True, type=click.Path(exists=True, dir_okay=False), help="KGX edges TSV.")
+@click.option("--output", "db_path", required=True, type=click.Path(dir_okay=False), help="SQLite file to write.")
+def build_snapshot_command(nodes_path: str, edges_path: str, db_path: str):
+    """Build a local Monarch KG snapshot for DATA_BACKEND=snapshot.
+
+    :param nodes_path: Path to the KGX nodes TSV.
+    :param edges_path: Path to the KGX edges TSV.
+    :param db_path: Path of the SQLite snapshot to write.
+    """
+    build_snapshot(nodes_path, edges_path, db_path)
+
+
+@main.command("build-search-index")
+@click.option("--snapshot", "snapshot_path", required=True, type=click.Path(exists=True, dir_okay=False), help="KG snapshot.")
+@click.option("--output", "index_path", required=True, type=click.Path(dir_okay=False), help="Index file to write.")
+def build_search_index_command(snapshot_path: str, index_path: str):
+    """Build the local search index for SEARCH_INDEX_PATH from a KG snapshot.
+
+    :param snapshot_path: Path to the SQLite snapshot written by build-snapshot.
+    :param index_path: Path of the search index to write.
+    """
+    build_search_index(snapshot_path, index_path)
 
 
 if __name__ == "__main__":
@@ -1,17 +1,138 @@
 from loguru import logger
+import atexit
+import json
+import queue
+import random
 import sys
+import threading
+from typing import Dict, List, Optional, TextIO
+
+from .routers.config import settings
+
+# level number of WARNING; records at or above it go to stderr
+WARNING_LEVEL = 30
+
 
 def configure_logger():
     logger.remove()  # remove the default handler
 
+    sample_rates = parse_sample_rates(settings.log_sample_rates)
+
     # info goes to stdout, warning and above go to stderr
     def info_filter(record):
-        return record["level"].name == "INFO"
+        return record["level"].name == "INFO" and sampled(record["message"], sample_rates)
 
     def warning_filter(record):
         return record["level"].name in ["WARNING", "ERROR", "CRITICAL"]
 
-    logger.add(sys.stdout, format="{time} {level} {message}", filter=info_filter)
-    logger.add(sys.stderr, format="{time} {level} {message}", filter=warning_filter)
+    if settings.log_async:
+        # a single background writer for both streams, so logging never blocks the event loop
+        sink = BatchingSink(settings.log_queue_size, settings.log_batch_size, settings.log_flush_interval)
+        atexit.register(sink.stop)
+        logger.add(sink, format="{message}", filter=lambda record: info_filter(record) or warning_filter(record))
+    else:
+        logger.add(sys.stdout, format="{time} {level} {message} {extra}", filter=info_filter)
+        logger.add(sys.stderr, format="{time} {level} {message} {extra}", filter=warning_filter)
 
     logger.propagate = False  # don't propagate to the root logger
+
+
+def parse_sample_rates(value: str) -> Dict[str, float]:
+    """Parse LOG_SAMPLE_RATES, e.g. "monarch_api_call=0.1,pubmed_lookup=0.5", into {event: rate}."""
+    rates = {}
+    for entry in value.split(","):
+        if "=" in entry:
+            event, rate = entry.split("=", 1)
+            rates[event.strip()] = float(rate)
+    return rates
+
+
+def sampled(event: str, sample_rates: Dict[str, float]) -> bool:
+    """Whether to keep a log record of the given event, given per-event sample rates.
+    Events are logged with their name as the message, e.g. logger.info("monarch_api_call", url=url).
+    """
+    if not sample_rates:
+        return True
+    rate = sample_rates.get(event)
+    return rate is None or random.random() < rate
+
+
+class BatchingSink:
+    """Loguru sink writing records as JSON lines from a background thread.
+
+    Each line holds the time, level and event name (the message) of a record, followed by the
+    fields it was logged with, which loguru keeps in record["extra"].
+
+    The logging call only puts the record on a bounded queue; when the queue is full the record
+    is dropped rather than waiting, and the number of dropped records is reported in a
+    "log_records_dropped" line once there is room again. The writer thread takes up to batch_size
+    records at a time (waiting at most flush_interval for more) and writes each batch with a
+    single write and flush per stream.
+    """
+
+    def __init__(
+        self,
+        queue_size: int,
+        batch_size: int,
+        flush_interval: float,
+        stdout: Optional[TextIO] = None,
+        stderr: Optional[TextIO] = None,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.stdout = stdout or sys.stdout
+        self.stderr = stderr or sys.stderr
+        self.dropped = 0
+        self._reported_dropped = 0
+        self._queue: "queue.Queue[Optional[dict]]" = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def __call__(self, message) -> None:
+        try:
+            self._queue.put_nowait(message.record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self) -> None:
+        """Write out every queued record and stop the writer thread."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch: List[dict] = []
+            try:
+                batch.append(self._queue.get(timeout=self.flush_interval))
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            if None in batch:
+                stopping = True
+                batch.remove(None)
+            self._write(batch)
+
+    def _write(self, batch: List[dict]) -> None:
+        out, err = [], []
+        for record in batch:
+            (err if record["level"].no >= WARNING_LEVEL else out).append(_to_json_line(record))
+
+        dropped = self.dropped
+        if dropped > self._reported_dropped:
+            err.append(json.dumps({"level": "WARNING", "event": "log_records_dropped", "count": dropped - self._reported_dropped}) + "\n")
+            self._reported_dropped = dropped
+
+        for stream, lines in ((self.stdout, out), (self.stderr, err)):
+            if lines:
+                stream.write("".join(lines))
+                stream.flush()
+
+
+def _to_json_line(record: dict) -> str:
+    line = {"time": record["time"].isoformat(), "level": record["level"].name, "event": record["message"], **record["extra"]}
+    if record["exception"] is not None:
+        line["exception"] = repr(record["exception"].value)
+    return json.dumps(line, default=str) + "\n"
@@ -2,18 +2,32 @@
 # to provide a simple API for the OpenAI plugin to use. It uses FastAPI
 # and is run on port 3434 by default.
 
+import asyncio
+from contextlib import asynccontextmanager
 from os.path import abspath, dirname
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 import json
 import os
 
+from loguru import logger
+
 # local imports
 from .logger_config import configure_logger
-from .middlewares import LoggingMiddleware
+from .middlewares import LoggingMiddleware, MetricsMiddleware, RateLimitMiddleware
+from .routers.config import settings
+from .routers.utils import fast_json_enabled
+from .routers.circuit_breaker import CircuitOpenError
+from .routers.backends import close_backend, get_backend, get_monarch_client
+from .routers.backends.monarch_client import UpstreamError
+from .routers.search_index import load_search_index
+from .routers.similarity import load_similarity_engine
+from .routers.warmer import Warmer, read_seed_file
 
 from .routers import (
+    batch,
     disease_to_gene,
     phenotype_profile_search,
     disease_to_phenotype,
@@ -21,16 +35,60 @@ from .routers import (
     gene_to_phenotype,
     phenotype_to_disease,
     phenotype_to_gene,
+    publications,
     search,
-    entity
+    entity,
+    metrics
 )
 
+# one data backend, and with it one pooled upstream client, per worker, shared by all routers;
+# with WARM set (and the live API as backend), each worker also keeps its hot set warm in the background,
+# and with a KG snapshot each loads its phenotype similarity index and maps its search index
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.backend = get_backend()
+    await asyncio.to_thread(load_similarity_engine)
+    load_search_index()
+    warmer = None
+    if settings.warm and settings.data_backend == "api":
+        warmer = Warmer(get_monarch_client(), read_seed_file(settings.warm_seed_file) if settings.warm_seed_file else [])
+        warmer.start()
+    yield
+    if warmer is not None:
+        await warmer.stop()
+    await close_backend()
+
 # setup base app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse if fast_json_enabled() else JSONResponse)
 
 # setup logging
 configure_logger()
+if settings.fast_json and not fast_json_enabled():
+    logger.warning(
+        "fast_json_unavailable",
+        message="FAST_JSON is set but orjson is not installed, using the standard JSON encoder",
+    )
+# rate limiting runs innermost, so that rejected requests are still logged and counted
+app.middleware("http")(RateLimitMiddleware())
 app.middleware("http")(LoggingMiddleware())
+app.middleware("http")(MetricsMiddleware())
+
+# an upstream host's circuit is open and there was no stale response to serve: fail fast
+@app.exception_handler(CircuitOpenError)
+async def circuit_open_handler(request: Request, exc: CircuitOpenError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(max(1, round(exc.retry_after)))},
+    )
+
+# Monarch kept failing and there was no stale response to serve: a bad gateway, or unavailable if it said so
+@app.exception_handler(UpstreamError)
+async def upstream_error_handler(request: Request, exc: UpstreamError):
+    return JSONResponse(
+        status_code=503 if exc.status_code in (429, 503) else 502,
+        content={"detail": str(exc)},
+    )
 
 # setup CORS
 app.add_middleware(
@@ -67,3 +125,6 @@ app.include_router(gene_to_disease.router)
 app.include_router(gene_to_phenotype.router)
 app.include_router(phenotype_to_disease.router)
 app.include_router(phenotype_to_gene.router)
+app.include_router(publications.router)
+app.include_router(metrics.router)
+app.include_router(batch.router)
@@ -1,17 +1,113 @@
+import math
+import time
+from functools import partial
+from typing import Optional
+
 from fastapi import Request
+from fastapi.responses import JSONResponse
 from loguru import logger
 
+from .routers.config import settings
+from .routers.metrics import REQUEST_DURATION, REQUESTS_IN_PROGRESS, REQUESTS_REJECTED
+from .routers.rate_limit import AdmissionControl, TokenBuckets
+from .routers.tracing import finish_trace, request_trace
+
 class LoggingMiddleware:
     async def __call__(self, request: Request, call_next):
-        logger.info({
-            "event": "request",
-            "endpoint": str(request.url.path),
-            "origin": request.headers.get("origin", ""), 
-            "openai-conversation-id": request.headers.get("openai-conversation-id", ""),
-            "openai-ephemeral-user-id": request.headers.get("openai-ephemeral-user-id", ""),
-            "query_params": dict(request.query_params),
-            "path_params": dict(request.path_params),
-        })
+        logger.info(
+            "request",
+            endpoint=str(request.url.path),
+            origin=request.headers.get("origin", ""),
+            query_params=dict(request.query_params),
+            path_params=dict(request.path_params),
+            **{
+                "openai-conversation-id": request.headers.get("openai-conversation-id", ""),
+                "openai-ephemeral-user-id": request.headers.get("openai-ephemeral-user-id", ""),
+            },
+        )
         
-        response = await call_next(request)
+        with request_trace() as trace:
+            response = await call_next(request)
+            if trace is not None:
+                finish_trace(trace, {
+                    "endpoint": str(request.url.path),
+                    "status": response.status_code,
+                    "openai-conversation-id": request.headers.get("openai-conversation-id", ""),
+                })
+                response.headers["Server-Timing"] = trace.server_timing()
         return response
+
+
+class MetricsMiddleware:
+    async def __call__(self, request: Request, call_next):
+        start = time.perf_counter()
+        status = 500
+        REQUESTS_IN_PROGRESS.inc()
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            REQUESTS_IN_PROGRESS.dec()
+            # label by route template rather than path, so ids in paths don't create new series
+            route = request.scope.get("route")
+            REQUEST_DURATION.labels(
+                request.method, route.path if route is not None else "unmatched", str(status)
+            ).observe(time.perf_counter() - start)
+
+
+class RateLimitMiddleware:
+    """Rejects requests with a 429 when their conversation exceeds its rate limit, or when the worker
+    already serves its maximum of requests and its queue for more is full (or the wait times out).
+    Requests without a conversation or user id are only subject to the in-flight cap.
+
+    A request costs one token; endpoints doing the work of several requests (/batch) charge the rest
+    through request.state.rate_limit(cost), which returns the 429 response to send if the conversation
+    does not have the tokens, and None otherwise.
+    """
+
+    # never limited: metrics scrapes and the plugin manifest
+    EXEMPT_PATHS = ("/metrics", "/.well-known/", "/static/")
+
+    def __init__(self):
+        self.buckets = TokenBuckets(settings.rate_limit_rate, settings.rate_limit_burst, settings.rate_limit_max_keys)
+        self.admission = AdmissionControl(settings.max_in_flight, settings.max_queued, settings.queue_timeout)
+
+    async def __call__(self, request: Request, call_next):
+        if not settings.rate_limit or request.url.path.startswith(self.EXEMPT_PATHS):
+            return await call_next(request)
+
+        key = request.headers.get("openai-conversation-id") or request.headers.get("openai-ephemeral-user-id")
+        if key:
+            wait = self.buckets.take(key)
+            if wait > 0:
+                return _too_many_requests(request, "rate_limit", wait)
+            request.state.rate_limit = partial(self._charge, request, key)
+
+        if not await self.admission.acquire():
+            return _too_many_requests(request, "overloaded", 1)
+        try:
+            return await call_next(request)
+        finally:
+            self.admission.release()
+
+
+    def _charge(self, request: Request, key: str, cost: float) -> Optional[JSONResponse]:
+        wait = self.buckets.take(key, cost) if cost > 0 else 0
+        return _too_many_requests(request, "rate_limit", wait) if wait > 0 else None
+
+
+def _too_many_requests(request: Request, reason: str, retry_after: float) -> JSONResponse:
+    REQUESTS_REJECTED.labels(reason).inc()
+    logger.warning(
+        "request_rejected",
+        reason=reason,
+        endpoint=str(request.url.path),
+        retry_after=round(retry_after, 3),
+        **{"openai-conversation-id": request.headers.get("openai-conversation-id", "")},
+    )
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "Too many requests, please retry later."},
+        headers={"Retry-After": str(math.ceil(retry_after))},
+    )
@@ -0,0 +1,84 @@
+"""Data backends serving Monarch knowledge graph data to the routers.
+
+The backend is chosen with the DATA_BACKEND setting: "api" (the live Monarch API, default)
+or "snapshot" (a local SQLite snapshot of the KG at KG_SNAPSHOT_PATH, see build_snapshot).
+"""
+from typing import Optional
+
+from ..config import settings
+from .base import MonarchBackend
+from .monarch_client import MonarchClient
+from .snapshot import SnapshotBackend, build_snapshot
+
+__all__ = [
+    "MonarchBackend",
+    "MonarchClient",
+    "SnapshotBackend",
+    "build_snapshot",
+    "close_backend",
+    "create_backend",
+    "get_backend",
+    "get_monarch_client",
+    "provide_backend",
+    "provide_monarch_client",
+    "set_backend",
+]
+
+_backend: Optional[MonarchBackend] = None
+_monarch_client: Optional[MonarchClient] = None
+
+
+def create_backend() -> MonarchBackend:
+    """Create the backend selected by settings.data_backend."""
+    if settings.data_backend == "api":
+        return get_monarch_client()
+    if settings.data_backend == "snapshot":
+        if not settings.kg_snapshot_path:
+            raise ValueError("DATA_BACKEND=snapshot requires KG_SNAPSHOT_PATH to be set")
+        return SnapshotBackend(settings.kg_snapshot_path)
+    raise ValueError(f"Unknown DATA_BACKEND {settings.data_backend!r}, expected 'api' or 'snapshot'")
+
+
+def get_backend() -> MonarchBackend:
+    """Return the configured backend, creating it on first use."""
+    global _backend
+    if _backend is None:
+        _backend = create_backend()
+    return _backend
+
+
+def set_backend(backend: Optional[MonarchBackend]) -> None:
+    """Replace the backend; None resets it so that the next get_backend() recreates it from settings."""
+    global _backend
+    _backend = backend
+
+
+def get_monarch_client() -> MonarchClient:
+    """Return the worker's MonarchClient, which is also the backend when DATA_BACKEND=api.
+    Calls that only the live API supports, such as sim_search, go through it directly.
+    """
+    global _monarch_client
+    if _monarch_client is None:
+        _monarch_client = MonarchClient()
+    return _monarch_client
+
+
+async def close_backend() -> None:
+    """Close the backend and the MonarchClient's connection pool."""
+    global _backend, _monarch_client
+    if _backend is not None:
+        await _backend.close()
+        _backend = None
+    if _monarch_client is not None:
+        await _monarch_client.close()
+        _monarch_client = None
+
+
+async def provide_backend() -> MonarchBackend:
+    """FastAPI dependency injecting the configured backend into route handlers."""
+    return get_backend()
+
+
+async def provide_monarch_client() -> MonarchClient:
+    """FastAPI dependency injecting the MonarchClient into route handlers."""
+    return get_monarch_client()
@@ -0,0 +1,28 @@
+from typing import Optional
+
+
+class MonarchBackend:
+    """Source of Monarch knowledge graph data for the routers.
+
+    Every method returns a dictionary shaped like the corresponding Monarch v3 API response,
+    so routers work the same whichever backend is configured.
+    """
+
+    name = "base"
+
+    async def associations(self, category: str, entity: str, limit: int, offset: int) -> dict:
+        """Associations of a category in which entity is the subject or object, as returned by /association/all.
+        Every item has a (possibly empty) "publications" list.
+        """
+        raise NotImplementedError
+
+    async def search(self, term: str, category: Optional[str], limit: int, offset: int) -> dict:
+        """Entities matching a search term, as returned by /search."""
+        raise NotImplementedError
+
+    async def entity(self, id: str) -> dict:
+        """A single entity record with association counts, as returned by /entity/{id}."""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        """Release any resources held by the backend."""
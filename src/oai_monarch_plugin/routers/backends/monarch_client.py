@@ -0,0 +1,293 @@
+import asyncio
+import json
+import random
+from collections import Counter
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import httpx
+from loguru import logger
+
+from ..cache import LRUCache, SingleFlight, StaleCache, TieredCache, create_shared_cache
+from ..circuit_breaker import CircuitBreaker, CircuitOpenError, get_breaker
+from ..config import settings
+from ..http_client import create_http_client
+from ..metrics import STALE_RESPONSES, UPSTREAM_RETRIES, track_upstream
+from .base import MonarchBackend
+
+try:
+    import orjson
+except ImportError:  # optional, json is used instead
+    orjson = None
+
+# orjson decodes bytes several times faster than json when it is installed
+_json_loads = orjson.loads if orjson is not None else json.loads
+
+# upstream responses, keyed by full request URL and shared by all MonarchClient instances (and, with
+# CACHE_BACKEND set, by all workers); expired responses are kept in memory a while longer, to serve
+# when Monarch is failing
+response_cache = TieredCache(
+    LRUCache(
+        max_entries=settings.response_cache_size,
+        ttl=settings.response_cache_ttl,
+        max_bytes=settings.response_cache_max_bytes,
+        stale_ttl=settings.response_cache_stale_ttl,
+    ),
+    create_shared_cache("responses", ttl=settings.response_cache_ttl),
+)
+_single_flight = SingleFlight()
+
+# responses for the warmer's hot set of entities (see warmer.py); served from memory, stale or not,
+# and refreshed in the background once older than WARM_INTERVAL
+hot_responses = StaleCache(max_age=settings.warm_interval)
+# how often each entity was queried (other than by the warmer), from which the warmer learns the hot set;
+# only counted with WARM set
+entity_requests: Counter = Counter()
+# set by the warmer while it refreshes the hot set: calls made in this context skip the caches, and
+# their keys are collected in the given set and their responses stored in hot_responses
+warming: ContextVar[Optional[Set[str]]] = ContextVar("warming", default=None)
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+RETRY_EXCEPTIONS = (httpx.TransportError,)
+
+
+class UpstreamError(Exception):
+    """Raised when Monarch still answers with a 429/5xx status after the retries, and there is no stale
+    response to serve, or when its response is not JSON. The app turns it into a 502, or a 503 for 429 and 503.
+    """
+
+    def __init__(self, host: str, status_code: int, message: Optional[str] = None):
+        super().__init__(message or f"{host} returned status {status_code}")
+        self.host = host
+        self.status_code = status_code
+
+
+class MonarchClient(MonarchBackend):
+    """Async client for the Monarch API, and the "api" data backend.
+
+    Owns the worker's pooled HTTP connections to Monarch. Every call goes through get_json, which
+    applies the per-endpoint timeout, retries 429/5xx responses and transport errors with jittered
+    exponential backoff, serves and stores successful responses in response_cache, and coalesces
+    concurrent identical calls into one upstream request. Calls go through the Monarch host's circuit
+    breaker: when a call fails or its circuit is open, an expired cached response is served if there
+    is one, and otherwise the error (CircuitOpenError for an open circuit, UpstreamError for an error
+    status) is raised.
+    """
+
+    name = "api"
+
+    def __init__(
+        self,
+        base_url: str = settings.monarch_api_url,
+        v2_base_url: str = settings.monarch_api_v2_url,
+        client: Optional[httpx.AsyncClient] = None,
+    ):
+        self.base_url = base_url
+        self.v2_base_url = v2_base_url
+        # an injected client (e.g. in tests) is used as is and never closed here
+        self._client = client
+        self._owns_client = client is None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.timeouts: Dict[str, float] = {
+            "associations": settings.monarch_association_timeout,
+            "search": settings.monarch_search_timeout,
+            "entity": settings.monarch_entity_timeout,
+            "sim_search": settings.monarch_sim_search_timeout,
+        }
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        """The pooled HTTP client, created on first use.
+        It is recreated if used from a different event loop, since pooled connections cannot be shared across loops.
+        """
+        if not self._owns_client:
+            return self._client
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or loop is not self._client_loop:
+            self._client = create_http_client()
+            self._client_loop = loop
+        return self._client
+
+    async def close(self) -> None:
+        if self._owns_client and self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None if self._owns_client else self._client
+
+    async def associations(self, category: str, entity: str, limit: int, offset: int) -> dict:
+        if settings.warm and warming.get() is None:
+            entity_requests[entity] += 1
+        params = {"category": category, "entity": entity, "limit": limit, "offset": offset}
+        return await self.get_json(
+            "associations",
+            f"{self.base_url}/association/all",
+            params,
+            normalize=_normalize_association_response,
+            call=category,
+        )
+
+    async def search(self, term: str, category: Optional[str], limit: int, offset: int) -> dict:
+        params = {"q": term, "category": category, "limit": limit, "offset": offset}
+        return await self.get_json("search", f"{self.base_url}/search", params)
+
+    async def entity(self, id: str) -> dict:
+        if settings.warm and warming.get() is None:
+            entity_requests[id] += 1
+        return await self.get_json("entity", f"{self.base_url}/entity/{id}")
+
+    async def sim_search(self, ids: List[str], is_feature_set: bool, metric: str, limit: int) -> dict:
+        """Semantic similarity search against the (v2) Monarch /sim/search endpoint."""
+        params = {"id": ids, "is_feature_set": is_feature_set, "metric": metric, "limit": limit}
+        return await self.get_json("sim_search", f"{self.v2_base_url}/sim/search", params)
+
+    async def get_json(
+        self,
+        endpoint: str,
+        api_url: str,
+        params: Optional[dict] = None,
+        normalize: Optional[Callable[[dict], None]] = None,
+        call: Optional[str] = None,
+    ) -> dict:
+        """GET a Monarch API URL and return the decoded JSON response.
+        Returned dictionaries may be shared between callers and must not be modified;
+        `normalize` can be given to adjust a fresh response in place before it is cached.
+        `call` labels the upstream call in metrics, and defaults to `endpoint`.
+        Responses kept for the warmer's hot set are returned even when stale, and then refreshed in the background.
+        """
+
+        url = httpx.URL(api_url, params=params)
+        key = str(url)
+        call = call or endpoint
+
+        async def fetch() -> Tuple[bool, dict]:
+            logger.info("monarch_api_call", endpoint=endpoint, url=key, method="GET")
+
+            breaker = get_breaker(url.host)
+            failure = None
+            try:
+                if not breaker.allow():
+                    raise CircuitOpenError(url.host, breaker.retry_after())
+                with track_upstream("monarch", call) as tracked:
+                    status_code, body = await self._get_with_retries(endpoint, url, call, breaker)
+                    if status_code >= 400:
+                        tracked.outcome = "error"
+                if status_code in RETRY_STATUS_CODES:
+                    failure = UpstreamError(url.host, status_code)
+            except (CircuitOpenError,) + RETRY_EXCEPTIONS as e:
+                failure = e
+
+            if failure is not None:
+                stale = response_cache.get_stale(key)
+                if stale is not None:
+                    STALE_RESPONSES.labels("monarch", call).inc()
+                    logger.warning("monarch_api_stale_response", endpoint=endpoint, url=key, reason=repr(failure))
+                    return False, stale
+                # an error body (often an HTML page from a proxy) is not data
+                raise failure
+
+            try:
+                response_json = _json_loads(body)
+            except ValueError as e:
+                raise UpstreamError(
+                    url.host, status_code, f"{url.host} returned a response that is not JSON (status {status_code})"
+                ) from e
+            if normalize is not None:
+                normalize(response_json)
+
+            ok = 200 <= status_code < 300
+            if ok and settings.response_cache_ttl > 0:
+                await response_cache.set_async(key, response_json, size=len(body))
+            if ok and key in hot_responses:
+                hot_responses.set(key, response_json)
+
+            return ok, response_json
+
+        warm_keys = warming.get()
+        if warm_keys is not None:
+            # kept in the hot set even if this refresh fails, so the previous response is still served
+            warm_keys.add(key)
+            ok, response_json = await _single_flight.do(key, fetch)
+            if ok:
+                hot_responses.set(key, response_json)
+            return response_json
+
+        hot, stale = hot_responses.get(key)
+        if hot is not None:
+            if stale:
+                _revalidate(key, fetch)
+            return hot
+
+        cached = await response_cache.get_async(key)
+        if cached is not None:
+            return cached
+
+        return (await _single_flight.do(key, fetch))[1]
+
+    async def _get_with_retries(self, endpoint: str, url: httpx.URL, call: str, breaker: CircuitBreaker):
+        timeout = self.timeouts.get(endpoint, settings.http_read_timeout)
+        attempt = 0
+        while True:
+            retry_after = None
+            try:
+                async with self.http.stream("GET", url, timeout=timeout) as response:
+                    if response.status_code not in RETRY_STATUS_CODES or attempt >= settings.monarch_max_retries:
+                        # decode straight from the received bytes, without building an intermediate str
+                        body = b"".join([chunk async for chunk in response.aiter_bytes()])
+                        breaker.record(response.status_code not in RETRY_STATUS_CODES)
+                        return response.status_code, body
+                    breaker.record(False)
+                    retry_after = response.headers.get("retry-after")
+                    reason = f"status {response.status_code}"
+            except RETRY_EXCEPTIONS as e:
+                breaker.record(False)
+                if attempt >= settings.monarch_max_retries:
+                    raise
+                reason = repr(e)
+
+            delay = _backoff_delay(attempt, retry_after)
+            attempt += 1
+            UPSTREAM_RETRIES.labels("monarch", call).inc()
+            logger.warning(
+                "monarch_api_retry",
+                endpoint=endpoint,
+                url=str(url),
+                attempt=attempt,
+                reason=reason,
+                delay=round(delay, 3),
+            )
+            await asyncio.sleep(delay)
+
+
+def _revalidate(key: str, fetch: Callable) -> None:
+    """Refresh a stale hot response in the background, coalesced with any other fetch of it."""
+
+    def done(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("hot_response_refresh_failed", url=key, error=repr(task.exception()))
+
+    asyncio.ensure_future(_single_flight.do(key, fetch)).add_done_callback(done)
+
+
+def _backoff_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+    """Exponential backoff with full jitter, honouring a Retry-After header given in seconds."""
+    if retry_after is not None:
+        try:
+            return min(float(retry_after), settings.monarch_retry_backoff_max)
+        except ValueError:
+            pass
+    return random.uniform(0, min(settings.monarch_retry_backoff_max, settings.monarch_retry_backoff * 2 ** attempt))
+
+
+def _normalize_association_response(response_json: dict) -> None:
+    ## if items is None, we need it to be an empty list
+    if "items" in response_json:
+        if response_json["items"] is None:
+            response_json["items"] = []
+
+    ## if response_json has an "items" key, we need to make sure each entry of it has a "publications" key
+    ## that is not None - and if it is None, we need to set it to an empty list
+    if "items" in response_json:
+        for item in response_json["items"]:
+            if "publications" not in item:
+                item["publications"] = []
+            elif item["publications"] is None:
+                item["publications"] = []
@@ -0,0 +1,282 @@
+import asyncio
+import csv
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from loguru import logger
+
+from .base import MonarchBackend
+
+# KGX separates the values of multivalued fields with a pipe
+MULTIVALUED_DELIMITER = "|"
+
+BATCH_SIZE = 10000
+
+# labels for the association counts of /entity, by association category and the side the entity is on
+ASSOCIATION_COUNT_LABELS: Dict[Tuple[str, str], str] = {
+    ("biolink:DiseaseToPhenotypicFeatureAssociation", "subject"): "Disease Phenotypes",
+    ("biolink:DiseaseToPhenotypicFeatureAssociation", "object"): "Diseases with Phenotype",
+    ("biolink:GeneToPhenotypicFeatureAssociation", "subject"): "Gene Phenotypes",
+    ("biolink:GeneToPhenotypicFeatureAssociation", "object"): "Genes with Phenotype",
+    ("biolink:CausalGeneToDiseaseAssociation", "subject"): "Causal Diseases",
+    ("biolink:CausalGeneToDiseaseAssociation", "object"): "Causal Genes",
+    ("biolink:CorrelatedGeneToDiseaseAssociation", "subject"): "Correlated Diseases",
+    ("biolink:CorrelatedGeneToDiseaseAssociation", "object"): "Correlated Genes",
+}
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE nodes (
+    id TEXT PRIMARY KEY, category TEXT, name TEXT, description TEXT, symbol TEXT, synonym TEXT, in_taxon TEXT
+);
+CREATE TABLE edges (
+    id TEXT, category TEXT, subject TEXT, predicate TEXT, object TEXT,
+    publications TEXT, frequency_qualifier TEXT, onset_qualifier TEXT
+);
+CREATE TABLE association_counts (id TEXT, category TEXT, side TEXT, count INTEGER);
+"""
+
+INDEXES = """
+CREATE INDEX edges_subject_category ON edges (subject, category);
+CREATE INDEX edges_object_category ON edges (object, category);
+CREATE INDEX association_counts_id ON association_counts (id);
+CREATE INDEX nodes_category ON nodes (category);
+CREATE INDEX nodes_name ON nodes (name COLLATE NOCASE);
+"""
+
+
+def _read_tsv(path: str) -> Iterator[Dict[str, str]]:
+    csv.field_size_limit(sys.maxsize)
+    with open(path, newline="", encoding="utf-8") as f:
+        yield from csv.DictReader(f, delimiter="\t", quoting=csv.QUOTE_NONE)
+
+
+def _first(value: Optional[str]) -> Optional[str]:
+    return value.split(MULTIVALUED_DELIMITER)[0] if value else None
+
+
+def _json_list(value: Optional[str]) -> str:
+    return json.dumps(value.split(MULTIVALUED_DELIMITER) if value else [])
+
+
+def _batches(rows: Iterator[tuple]) -> Iterator[List[tuple]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def build_snapshot(nodes_path: str, edges_path: str, db_path: str) -> None:
+    """Build an indexed SQLite snapshot for SnapshotBackend from KGX node and edge TSV files.
+    Only the columns the routers use are kept (see SCHEMA); missing columns are left empty.
+    The snapshot is written next to db_path and moved into place once complete, so a running
+    server never sees a partial file.
+    """
+
+    tmp_path = db_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.executescript(SCHEMA)
+
+    logger.info("snapshot_build", step="nodes", path=nodes_path)
+    node_rows = (
+        (row["id"], _first(row.get("category")), row.get("name") or None, row.get("description") or None,
+         row.get("symbol") or None, _json_list(row.get("synonym")), _first(row.get("in_taxon")))
+        for row in _read_tsv(nodes_path)
+    )
+    for batch in _batches(node_rows):
+        conn.executemany("INSERT OR REPLACE INTO nodes VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+
+    logger.info("snapshot_build", step="edges", path=edges_path)
+    edge_rows = (
+        (row.get("id"), _first(row.get("category")), row["subject"], row.get("predicate"), row["object"],
+         _json_list(row.get("publications")), row.get("frequency_qualifier") or None, row.get("onset_qualifier") or None)
+        for row in _read_tsv(edges_path)
+    )
+    for batch in _batches(edge_rows):
+        conn.executemany("INSERT INTO edges VALUES (?, ?, ?, ?, ?, ?, ?, ?)", batch)
+
+    logger.info("snapshot_build", step="indexes")
+    conn.execute(
+        "INSERT INTO association_counts "
+        "SELECT subject, category, 'subject', COUNT(*) FROM edges GROUP BY subject, category "
+        "UNION ALL "
+        "SELECT object, category, 'object', COUNT(*) FROM edges GROUP BY object, category"
+    )
+    conn.executescript(INDEXES)
+
+    try:
+        conn.execute("CREATE VIRTUAL TABLE nodes_fts USING fts5(name, synonym, content='nodes', content_rowid='rowid')")
+        conn.execute("INSERT INTO nodes_fts (nodes_fts) VALUES ('rebuild')")
+        fts = "1"
+    except sqlite3.OperationalError:
+        # SQLite built without FTS5, search falls back to prefix matching on names
+        fts = "0"
+
+    conn.executemany(
+        "INSERT INTO meta VALUES (?, ?)",
+        [("format_version", "1"), ("built_at", str(time.time())), ("fts", fts)],
+    )
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+
+    os.replace(tmp_path, db_path)
+    logger.info("snapshot_build", step="done", path=db_path)
+
+
+class SnapshotBackend(MonarchBackend):
+    """Serves data from a local SQLite snapshot of the Monarch KG built by build_snapshot.
+
+    Lookups need no network and go through indexes: edges by entity and category, nodes by id, and search
+    through the full-text index (or, where SQLite lacks FTS5, the index of names, by prefix). They can still
+    take a while, e.g. the associations of a hub entity or a search matching many nodes, so queries run on
+    the backend's own thread rather than on the event loop, one at a time over a single read-only connection.
+    """
+
+    name = "snapshot"
+
+    def __init__(self, path: str):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Monarch KG snapshot not found at {path}")
+        self.path = path
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kg-snapshot")
+        meta = dict(self._conn.execute("SELECT key, value FROM meta").fetchall())
+        self._fts = meta.get("fts") == "1"
+
+    async def _query(self, sql: str, params: dict) -> List[tuple]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._fetchall, sql, params)
+
+    def _fetchall(self, sql: str, params: dict) -> List[tuple]:
+        return self._conn.execute(sql, params).fetchall()
+
+    async def associations(self, category: str, entity: str, limit: int, offset: int) -> dict:
+        params = {"category": category, "entity": entity, "limit": limit, "offset": offset}
+
+        rows = await self._query(
+            """
+            SELECT e.id, e.category, e.subject, s.name, e.predicate, e.object, o.name,
+                   e.publications, e.frequency_qualifier, e.onset_qualifier
+            FROM (
+                SELECT 0 AS side, rowid AS r, * FROM edges WHERE subject = :entity AND category = :category
+                UNION ALL
+                SELECT 1 AS side, rowid AS r, * FROM edges
+                WHERE object = :entity AND category = :category AND subject != :entity
+            ) AS e
+            LEFT JOIN nodes AS s ON s.id = e.subject
+            LEFT JOIN nodes AS o ON o.id = e.object
+            ORDER BY e.side, e.r
+            LIMIT :limit OFFSET :offset
+            """,
+            params,
+        )
+        total = (await self._query(
+            """
+            SELECT (SELECT COUNT(*) FROM edges WHERE subject = :entity AND category = :category)
+                 + (SELECT COUNT(*) FROM edges WHERE object = :entity AND category = :category AND subject != :entity)
+            """,
+            params,
+        ))[0][0]
+
+        items = [
+            {
+                "id": row[0],
+                "category": row[1],
+                "subject": row[2],
+                "subject_label": row[3],
+                "predicate": row[4],
+                "object": row[5],
+                "object_label": row[6],
+                "publications": json.loads(row[7]) if row[7] else [],
+                "frequency_qualifier": row[8],
+                "onset_qualifier": row[9],
+            }
+            for row in rows
+        ]
+        return {"limit": limit, "offset": offset, "total": total, "items": items}
+
+    async def search(self, term: str, category: Optional[str], limit: int, offset: int) -> dict:
+        tokens = re.findall(r"\w+", term)
+        if not tokens:
+            return {"limit": limit, "offset": offset, "total": 0, "items": []}
+
+        params = {"category": category, "limit": limit, "offset": offset}
+        category_filter = "AND n.category = :category" if category else ""
+
+        if self._fts:
+            # every token must match, as a prefix, in the name or a synonym; names weigh more
+            params["match"] = " ".join('"' + token + '"*' for token in tokens)
+            # CROSS JOIN keeps the full-text index as the outer loop, whatever the planner's statistics say
+            source = "nodes_fts AS f CROSS JOIN nodes AS n ON n.rowid = f.rowid"
+            where = f"nodes_fts MATCH :match {category_filter}"
+            order = "bm25(nodes_fts, 10.0, 1.0)"
+        else:
+            params["match"] = term.strip() + "%"
+            source = "nodes AS n"
+            where = f"n.name LIKE :match {category_filter}"
+            order = "length(n.name)"
+
+        # the total comes with the page, from the same pass over the matches
+        rows = await self._query(
+            f"SELECT id, name, category, description, COUNT(*) OVER () FROM ("
+            f"SELECT n.id, n.name, n.category, n.description, {order} AS score FROM {source} WHERE {where}"
+            f") ORDER BY score LIMIT :limit OFFSET :offset",
+            params,
+        )
+        if rows:
+            total = rows[0][4]
+        else:
+            total = (await self._query(f"SELECT COUNT(*) FROM {source} WHERE {where}", params))[0][0]
+
+        items = [{"id": row[0], "name": row[1], "category": row[2], "description": row[3]} for row in rows]
+        return {"limit": limit, "offset": offset, "total": total, "items": items}
+
+    async def entity(self, id: str) -> dict:
+        rows = await self._query(
+            "SELECT id, category, name, description, symbol, synonym, in_taxon FROM nodes WHERE id = :id", {"id": id}
+        )
+        if not rows:
+            return {"detail": f"Entity not found: {id}"}
+
+        row = rows[0]
+        counts = await self._query(
+            "SELECT category, side, count FROM association_counts WHERE id = :id ORDER BY category, side", {"id": id}
+        )
+
+        return {
+            "id": row[0],
+            "category": row[1],
+            "name": row[2],
+            "description": row[3],
+            "symbol": row[4],
+            "synonym": json.loads(row[5]) if row[5] else [],
+            "in_taxon": row[6],
+            "association_counts": [
+                {
+                    "label": ASSOCIATION_COUNT_LABELS.get((category, side), (category or "").replace("biolink:", "")),
+                    "count": count,
+                    "category": category,
+                }
+                for category, side, count in counts
+            ],
+        }
+
+    async def close(self) -> None:
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._conn.close)
+        self._executor.shutdown()
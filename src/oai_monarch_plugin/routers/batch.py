@@ -0,0 +1,174 @@
+"""/batch: run several plugin operations in one round trip.
+
+Each sub-request names the operation_id of a GET endpoint and its query parameters, and is
+dispatched in-process to that endpoint's route, with the same parameter validation, dependencies
+and error handling as a request of its own (but not the middlewares, which see the batch; it is
+charged one request of the rate limit per operation).
+Sub-requests run concurrently against the worker's one backend, so upstream calls that overlap
+within a batch are made once (see MonarchClient.get_json) and served from the shared caches.
+"""
+import asyncio
+import json
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+from fastapi import APIRouter, Body, HTTPException, Request, status
+from fastapi.routing import APIRoute
+from loguru import logger
+from pydantic import BaseModel, Field, ValidationError, parse_obj_as
+
+from .config import settings
+from .tracing import span
+from .utils import model_response
+
+router = APIRouter()
+
+# operations that cannot be part of a batch: the batch itself
+EXCLUDED_OPERATIONS = {"run_batch"}
+
+
+class BatchRequestItem(BaseModel):
+    operation_id: str = Field(
+        ..., description="The operation_id of the operation to run.", example="search_entity"
+    )
+    params: Dict[str, Any] = Field(
+        {},
+        description="The query parameters of the operation; a list gives a parameter several values.",
+        example={"term": "cystic fibrosis", "category": "biolink:Disease", "limit": 1},
+    )
+
+
+class BatchRequest(BaseModel):
+    requests: List[BatchRequestItem] = Field(..., description="The operations to run.")
+
+
+class BatchResponseItem(BaseModel):
+    operation_id: str = Field(..., description="The operation_id of the operation.")
+    status: int = Field(..., description="The HTTP status code of the operation's response.", example=200)
+    body: Any = Field(None, description="The response body of the operation.")
+
+
+class BatchResponse(BaseModel):
+    responses: List[BatchResponseItem] = Field(
+        ..., description="The responses to the operations, in the order of the requests."
+    )
+
+
+def _operations(request: Request) -> Dict[str, APIRoute]:
+    return {
+        route.operation_id: route
+        for route in request.app.routes
+        if isinstance(route, APIRoute) and route.operation_id and "GET" in route.methods
+        and route.operation_id not in EXCLUDED_OPERATIONS
+    }
+
+
+def _streamed(params: Dict[str, Any]) -> bool:
+    """Whether params ask for a streamed response, reading "stream" as FastAPI reads a bool query parameter
+    ("false", "0", "no" and so on are false; of several values, the last counts).
+    """
+    value = params.get("stream", False)
+    if isinstance(value, list):
+        value = value[-1] if value else False
+    try:
+        return parse_obj_as(bool, value)
+    except ValidationError:
+        # left to the operation, which rejects it with a 422
+        return False
+
+
+def _query_string(params: Dict[str, Any]) -> bytes:
+    pairs = []
+    for name, value in params.items():
+        for v in value if isinstance(value, list) else [value]:
+            pairs.append((name, str(v).lower() if isinstance(v, bool) else v))
+    return urlencode(pairs).encode("latin-1")
+
+
+async def _dispatch(request: Request, route: APIRoute, params: Dict[str, Any]) -> Tuple[int, Any]:
+    """Run a route as if it had been requested with params, and return its status code and body."""
+    scope = {
+        key: value for key, value in request.scope.items() if key not in ("endpoint", "route", "path_params")
+    }
+    scope.update({
+        "method": "GET",
+        "path": route.path,
+        "raw_path": route.path.encode("latin-1"),
+        "query_string": _query_string(params),
+    })
+    response: Dict[str, Any] = {"status": 500, "body": b""}
+
+    async def receive() -> dict:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: dict) -> None:
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            response["body"] += message.get("body", b"")
+
+    try:
+        await route.handle(scope, receive, send)
+    except Exception as e:
+        # the handlers the app would have used, such as FastAPI's for validation errors and HTTPException
+        handler = next(
+            (request.app.exception_handlers[cls] for cls in type(e).__mro__ if cls in request.app.exception_handlers),
+            None,
+        )
+        if handler is None:
+            logger.exception("batch_operation_error", operation_id=route.operation_id, error=str(e))
+            return status.HTTP_500_INTERNAL_SERVER_ERROR, {"detail": "Internal Server Error"}
+        handled = await handler(request, e)
+        return handled.status_code, json.loads(handled.body)
+
+    return response["status"], json.loads(response["body"]) if response["body"] else None
+
+
+@router.post(
+    "/batch",
+    response_model=BatchResponse,
+    description="Run several operations of this API in one request, for instance a search, then entity lookups and associations.",
+    summary="Run several operations at once",
+    response_description="The response of each operation, in the order of the requests.",
+    operation_id="run_batch",
+)
+async def run_batch(
+    request: Request,
+    batch: BatchRequest = Body(...),
+) -> BatchResponse:
+    if len(batch.requests) > settings.batch_max_requests:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"A batch can have at most {settings.batch_max_requests} requests.",
+        )
+    # each operation costs its conversation a request of its rate limit, the batch itself being the first
+    rate_limit = getattr(request.state, "rate_limit", None)
+    if rate_limit is not None:
+        rejected = rate_limit(len(batch.requests) - 1)
+        if rejected is not None:
+            return rejected
+    operations = _operations(request)
+    semaphore = asyncio.Semaphore(settings.batch_concurrency)
+
+    async def run(item: BatchRequestItem) -> BatchResponseItem:
+        route: Optional[APIRoute] = operations.get(item.operation_id)
+        if route is None:
+            return BatchResponseItem(
+                operation_id=item.operation_id,
+                status=status.HTTP_404_NOT_FOUND,
+                body={"detail": f"Unknown operation_id: {item.operation_id}"},
+            )
+        if _streamed(item.params):
+            return BatchResponseItem(
+                operation_id=item.operation_id,
+                status=status.HTTP_400_BAD_REQUEST,
+                body={"detail": "Streamed responses cannot be part of a batch."},
+            )
+        async with semaphore:
+            with span("operation", operation_id=item.operation_id):
+                code, body = await _dispatch(request, route, item.params)
+        return BatchResponseItem(operation_id=item.operation_id, status=code, body=body)
+
+    with span("batch"):
+        responses = await asyncio.gather(*(run(item) for item in batch.requests))
+    return model_response(BatchResponse(responses=responses))
@@ -0,0 +1,543 @@
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Collection, Dict, List, Optional, Tuple, Union
+from urllib.parse import unquote, urlsplit
+
+from loguru import logger
+
+from .config import settings
+
+try:
+    import msgpack
+except ImportError:  # optional, values are serialized as JSON instead
+    msgpack = None
+
+
+def serialize(value: Any) -> bytes:
+    """Serialize a JSON-compatible value for a shared cache tier: msgpack if installed, else JSON.
+    The first byte records the format, so that values written by either can be read by both.
+    """
+    if msgpack is not None:
+        return b"m" + msgpack.packb(value, use_bin_type=True)
+    return b"j" + json.dumps(value, separators=(",", ":")).encode()
+
+
+def deserialize(data: Union[bytes, str]) -> Any:
+    if isinstance(data, str):  # written as JSON text before values were serialized
+        return json.loads(data)
+    if data[:1] == b"m":
+        if msgpack is None:
+            raise ValueError("value was serialized with msgpack, which is not installed")
+        return msgpack.unpackb(data[1:], raw=False)
+    return json.loads(data[1:])
+
+
+class LRUCache:
+    """In-process, thread-safe LRU cache with per-entry TTLs and hit/miss counters.
+
+    If max_bytes is given, entries are also evicted once the sum of the sizes passed to set()
+    exceeds it. Expired entries are kept for stale_ttl more seconds (unless evicted), during which
+    get_stale() still returns them.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, max_bytes: Optional[int] = None, stale_ttl: float = 0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.hits = 0
+        self.misses = 0
+        self._bytes = 0
+        self._entries: "OrderedDict[str, Tuple[float, Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            now = time.time()
+            if entry is None or entry[0] < now:
+                if entry is not None and entry[0] + self.stale_ttl < now:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def get_stale(self, key: str) -> Optional[Any]:
+        """Return the cached value even if it expired, as long as it did so less than stale_ttl seconds ago."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] + self.stale_ttl < time.time():
+                return None
+            return entry[1]
+
+    def set(
+        self, key: str, value: Any, ttl: Optional[float] = None, expires_at: Optional[float] = None, size: int = 0
+    ) -> None:
+        if expires_at is None:
+            expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires_at, value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or (
+                self.max_bytes is not None and self._bytes > self.max_bytes
+            ):
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str) -> None:
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "bytes": self._bytes}
+
+
+class SQLiteCache:
+    """On-disk cache of JSON-serializable values with per-entry TTLs.
+
+    A single SQLite file (in WAL mode, and memory-mapped) can be shared by every worker process
+    on a host, and its contents survive restarts.
+    """
+
+    tier = "disk"
+
+    # expired rows are purged every this many writes
+    PURGE_INTERVAL = 1000
+    # keys per query of get_many_with_expiry, within SQLite's limit on query parameters
+    MAX_VARIABLES = 500
+
+    def __init__(self, path: str, ttl: float):
+        self.path = path
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA mmap_size=268435456")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def get_with_expiry(self, key: str) -> Tuple[Optional[Any], float]:
+        """Return the cached value and its expiry time, or (None, 0) on a miss."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ? AND expires_at >= ?", (key, time.time())
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None, 0.0
+            self.hits += 1
+        return deserialize(row[0]), row[1]
+
+    def get_many_with_expiry(self, keys: List[str]) -> Dict[str, Tuple[Any, float]]:
+        """Return the cached values among keys, with their expiry times."""
+        rows = []
+        with self._lock:
+            for i in range(0, len(keys), self.MAX_VARIABLES):
+                chunk = keys[i:i + self.MAX_VARIABLES]
+                placeholders = ",".join("?" * len(chunk))
+                rows += self._conn.execute(
+                    f"SELECT key, value, expires_at FROM cache WHERE key IN ({placeholders}) AND expires_at >= ?",
+                    (*chunk, time.time()),
+                ).fetchall()
+            self.hits += len(rows)
+            self.misses += len(keys) - len(rows)
+        return {key: (deserialize(value), expires_at) for key, value, expires_at in rows}
+
+    def get(self, key: str) -> Optional[Any]:
+        return self.get_with_expiry(key)[0]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None, expires_at: Optional[float] = None) -> None:
+        if expires_at is None:
+            expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        self.set_many([(key, value, expires_at)])
+
+    def set_many(self, entries: List[Tuple[str, Any, float]]) -> None:
+        """Store (key, value, expires_at) entries, in a single transaction."""
+        rows = [(key, serialize(value), expires_at) for key, value, expires_at in entries]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany("INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)", rows)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            purge = self._writes // self.PURGE_INTERVAL != (self._writes + len(rows)) // self.PURGE_INTERVAL
+            self._writes += len(rows)
+            if purge:
+                self._conn.execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM cache")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+class RedisCache:
+    """Cache on a Redis-protocol server (Redis, Valkey, KeyDB, ...) with per-entry TTLs, shared by
+    every worker on every host pointing at it.
+
+    Speaks RESP over a plain, blocking socket, so no client library is needed; from async code it is
+    called through TieredCache's *_async methods, which run it in a worker thread. Keys are namespaced
+    under `prefix`. The cache must never fail a request: server errors count as misses (and are logged),
+    and after one the server is left alone for RETRY_INTERVAL seconds.
+    """
+
+    tier = "redis"
+
+    RETRY_INTERVAL = 5.0
+
+    def __init__(self, url: str, ttl: float, prefix: str = "oai-monarch-plugin:", timeout: float = 0.5):
+        self.url = url
+        self.ttl = ttl
+        self.prefix = prefix
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._sock: Optional[socket.socket] = None
+        self._reader = None
+        self._down_until = 0.0
+        self._lock = threading.Lock()
+
+    def get_with_expiry(self, key: str) -> Tuple[Optional[Any], float]:
+        """Return the cached value and its expiry time, or (None, 0) on a miss."""
+        return self.get_many_with_expiry([key]).get(key, (None, 0.0))
+
+    def get_many_with_expiry(self, keys: List[str]) -> Dict[str, Tuple[Any, float]]:
+        """Return the cached values among keys, with their expiry times, in a single round trip (MGET)."""
+        if not keys:
+            return {}
+        prefixed = [self.prefix + key for key in keys]
+        replies = self._execute([("MGET", *prefixed)] + [("PTTL", key) for key in prefixed])
+        if replies is None:
+            self.misses += len(keys)
+            return {}
+        found = {}
+        now = time.time()
+        for key, value, pttl in zip(keys, replies[0], replies[1:]):
+            if value is None:
+                continue
+            try:
+                found[key] = (deserialize(value), now + (pttl / 1000 if pttl > 0 else self.ttl))
+            except ValueError:
+                pass
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def get(self, key: str) -> Optional[Any]:
+        return self.get_with_expiry(key)[0]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None, expires_at: Optional[float] = None) -> None:
+        if expires_at is None:
+            expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        self.set_many([(key, value, expires_at)])
+
+    def set_many(self, entries: List[Tuple[str, Any, float]]) -> None:
+        """Store (key, value, expires_at) entries, pipelined in a single round trip."""
+        now = time.time()
+        commands = [
+            ("SET", self.prefix + key, serialize(value), "PX", int((expires_at - now) * 1000))
+            for key, value, expires_at in entries
+            if expires_at - now >= 0.001
+        ]
+        if commands:
+            self._execute(commands)
+
+    def clear(self) -> None:
+        cursor = b"0"
+        while True:
+            replies = self._execute([("SCAN", cursor, "MATCH", self.prefix + "*", "COUNT", 1000)])
+            if replies is None:
+                return
+            cursor, keys = replies[0]
+            if keys:
+                self._execute([("DEL", *keys)])
+            if cursor == b"0":
+                return
+
+    def close(self) -> None:
+        with self._lock:
+            self._disconnect()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "errors": self.errors}
+
+    def _execute(self, commands: List[tuple]) -> Optional[List[Any]]:
+        """Send the commands in a single round trip and return their replies, or None on error."""
+        if time.monotonic() < self._down_until:
+            return None
+        with self._lock:
+            # calls that waited for the lock while the server failed give up without trying again
+            if time.monotonic() < self._down_until:
+                return None
+            try:
+                if self._sock is None:
+                    self._connect()
+                self._sock.sendall(b"".join(_encode_command(command) for command in commands))
+                replies = [self._read_reply() for _ in commands]
+            except (OSError, ValueError) as e:
+                self._disconnect()
+                self.errors += 1
+                self._down_until = time.monotonic() + self.RETRY_INTERVAL
+                logger.warning("cache_server_error", url=self.url, error=repr(e))
+                return None
+        return replies
+
+    def _connect(self) -> None:
+        url = urlsplit(self.url)
+        self._sock = socket.create_connection((url.hostname or "localhost", url.port or 6379), timeout=self.timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._reader = self._sock.makefile("rb")
+        setup = []
+        if url.password:
+            setup.append(("AUTH", unquote(url.username), unquote(url.password)) if url.username else ("AUTH", unquote(url.password)))
+        if url.path.strip("/"):
+            setup.append(("SELECT", url.path.strip("/")))
+        if setup:
+            self._sock.sendall(b"".join(_encode_command(command) for command in setup))
+            for _ in setup:
+                self._read_reply()
+
+    def _disconnect(self) -> None:
+        if self._sock is not None:
+            try:
+                self._reader.close()
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._reader = None
+
+    def _read_reply(self) -> Any:
+        line = self._reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("connection closed by the cache server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest
+        if kind == b"-":
+            raise ValueError(rest.decode(errors="replace"))
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self._reader.read(length + 2)
+            if len(data) != length + 2:
+                raise ConnectionError("connection closed by the cache server")
+            return data[:-2]
+        if kind == b"*":
+            length = int(rest)
+            return None if length < 0 else [self._read_reply() for _ in range(length)]
+        raise ValueError(f"unexpected reply from the cache server: {line!r}")
+
+
+def _encode_command(command: tuple) -> bytes:
+    parts = [arg if isinstance(arg, bytes) else str(arg).encode() for arg in command]
+    return b"*%d\r\n" % len(parts) + b"".join(b"$%d\r\n%s\r\n" % (len(part), part) for part in parts)
+
+
+SharedCache = Union[SQLiteCache, RedisCache]
+
+
+def create_shared_cache(name: str, ttl: float) -> Optional[SharedCache]:
+    """Create the shared cache tier selected by settings.cache_backend for the cache called `name`,
+    or None if there is none ("none", the default).
+    """
+    if settings.cache_backend == "none":
+        return None
+    if settings.cache_backend == "sqlite":
+        if not settings.cache_dir:
+            raise ValueError("CACHE_BACKEND=sqlite requires CACHE_DIR to be set")
+        return SQLiteCache(os.path.join(settings.cache_dir, f"{name}.sqlite"), ttl=ttl)
+    if settings.cache_backend == "redis":
+        return RedisCache(
+            settings.cache_redis_url, ttl=ttl, prefix=f"oai-monarch-plugin:{name}:", timeout=settings.cache_redis_timeout
+        )
+    raise ValueError(f"Unknown CACHE_BACKEND {settings.cache_backend!r}, expected 'none', 'sqlite' or 'redis'")
+
+
+class TieredCache:
+    """An in-process LRU in front of an optional shared tier (SQLiteCache or RedisCache).
+
+    Values found in the shared tier are promoted to memory for the remainder of their TTL.
+    The shared tier blocks on disk or network I/O, so async code uses the *_async methods, which
+    only leave the event loop (for a worker thread) when the shared tier has to be consulted.
+    """
+
+    def __init__(self, memory: LRUCache, shared: Optional[SharedCache] = None):
+        self.memory = memory
+        self.shared = shared
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.memory.get(key)
+        if value is not None or self.shared is None:
+            return value
+
+        value, expires_at = self.shared.get_with_expiry(key)
+        if value is not None:
+            self.memory.set(key, value, expires_at=expires_at)
+        return value
+
+    async def get_async(self, key: str) -> Optional[Any]:
+        return (await self.get_many_async([key])).get(key)
+
+    async def get_many_async(self, keys: Collection[str]) -> Dict[str, Any]:
+        """Return the cached values among keys, looking up those missing from memory in one call to the shared tier."""
+        found = {}
+        missing = []
+        for key in keys:
+            value = self.memory.get(key)
+            if value is not None:
+                found[key] = value
+            else:
+                missing.append(key)
+        if missing and self.shared is not None:
+            for key, (value, expires_at) in (await asyncio.to_thread(self.shared.get_many_with_expiry, missing)).items():
+                self.memory.set(key, value, expires_at=expires_at)
+                found[key] = value
+        return found
+
+    def get_stale(self, key: str) -> Optional[Any]:
+        """Return a value even if it expired, as long as the memory tier still has it; see LRUCache.get_stale."""
+        return self.memory.get_stale(key)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None, size: int = 0) -> None:
+        expires_at = time.time() + (self.memory.ttl if ttl is None else ttl)
+        self.memory.set(key, value, expires_at=expires_at, size=size)
+        if self.shared is not None:
+            self.shared.set(key, value, expires_at=expires_at)
+
+    async def set_async(self, key: str, value: Any, ttl: Optional[float] = None, size: int = 0) -> None:
+        await self.set_many_async({key: value}, ttl=ttl, sizes={key: size})
+
+    async def set_many_async(
+        self, values: Dict[str, Any], ttl: Optional[float] = None, sizes: Optional[Dict[str, int]] = None
+    ) -> None:
+        """Store several values with the same TTL, in one call to the shared tier."""
+        expires_at = time.time() + (self.memory.ttl if ttl is None else ttl)
+        for key, value in values.items():
+            self.memory.set(key, value, expires_at=expires_at, size=sizes.get(key, 0) if sizes else 0)
+        if values and self.shared is not None:
+            await asyncio.to_thread(
+                self.shared.set_many, [(key, value, expires_at) for key, value in values.items()]
+            )
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        stats = {"memory": self.memory.stats()}
+        if self.shared is not None:
+            stats[self.shared.tier] = self.shared.stats()
+        return stats
+
+
+class StaleCache:
+    """In-process cache whose entries never expire, but go stale max_age seconds after they were set.
+
+    Meant for stale-while-revalidate: callers serve stale values and refresh them in the background.
+    Entries are only removed explicitly, with retain().
+    """
+
+    def __init__(self, max_age: float):
+        self.max_age = max_age
+        self.hits = 0
+        self.stale_hits = 0
+        self._entries: Dict[str, Tuple[float, Any]] = {}
+
+    def get(self, key: str) -> Tuple[Optional[Any], bool]:
+        """Return the cached value and whether it is stale, or (None, False) if there is none."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None, False
+        stale = time.time() - entry[0] > self.max_age
+        self.hits += 1
+        self.stale_hits += stale
+        return entry[1], stale
+
+    def set(self, key: str, value: Any) -> None:
+        self._entries[key] = (time.time(), value)
+
+    def retain(self, keys: Collection[str]) -> None:
+        """Remove every entry whose key is not in `keys`."""
+        for key in [key for key in self._entries if key not in keys]:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "stale_hits": self.stale_hits, "size": len(self._entries)}
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into a single execution.
+
+    While a call for a key is in flight, further callers with that key await its result instead
+    of starting their own. The call runs as its own task, so a cancelled caller does not cancel
+    it for the others.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._in_flight: Dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._in_flight.get(key)
+        if task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop():
+            self.coalesced += 1
+        else:
+            self.calls += 1
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
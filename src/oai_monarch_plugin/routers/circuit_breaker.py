@@ -0,0 +1,132 @@
+"""Circuit breakers for upstream hosts.
+
+Each upstream host (Monarch, NCBI, OpenLibrary) has a CircuitBreaker tracking the outcome of the
+calls made to it. Once too many of them fail, the circuit opens and further calls are rejected
+immediately, instead of each one waiting for its timeout, until a probe call succeeds again.
+While a circuit is open, MonarchClient serves expired cached responses where it has them, and
+otherwise fails fast with CircuitOpenError, which the app turns into a 503 with a Retry-After header.
+"""
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from loguru import logger
+
+from .config import settings
+from .metrics import CIRCUIT_OPENED, CIRCUIT_REJECTIONS
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream host whose circuit is open."""
+
+    def __init__(self, host: str, retry_after: float):
+        super().__init__(f"{host} is unavailable, retry in {retry_after:.0f}s")
+        self.host = host
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Failure-rate circuit breaker for one upstream host.
+
+    Closed, it records the outcome of every call; when at least min_calls calls made in the last
+    `window` seconds failed at a rate of failure_rate or more, it opens. Open, it rejects every call
+    for open_duration seconds, then turns half-open and lets a single probe call through: the circuit
+    closes if the probe succeeds and opens again if it fails. Thread-safe, as publication lookups
+    run in worker threads.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        failure_rate: float = settings.circuit_failure_rate,
+        min_calls: int = settings.circuit_min_calls,
+        window: float = settings.circuit_window,
+        open_duration: float = settings.circuit_open_duration,
+    ):
+        self.host = host
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.open_duration = open_duration
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._probe_started: Optional[float] = None
+        self._outcomes: Deque[Tuple[float, bool]] = deque()
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may be made now; a rejected call is counted in CIRCUIT_REJECTIONS."""
+        if not settings.circuit_breaker:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN and now - self._opened_at >= self.open_duration:
+                self.state = HALF_OPEN
+                self._probe_started = None
+            # a probe that never reported back (e.g. cancelled) is replaced after open_duration
+            if self.state == HALF_OPEN and (
+                self._probe_started is None or now - self._probe_started >= self.open_duration
+            ):
+                self._probe_started = now
+                return True
+            if self.state == CLOSED:
+                return True
+        CIRCUIT_REJECTIONS.labels(self.host).inc()
+        return False
+
+    def record(self, success: bool) -> None:
+        """Record the outcome of a call that allow() let through."""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == HALF_OPEN:
+                if success:
+                    self.state = CLOSED
+                    self._outcomes.clear()
+                    logger.info("circuit_closed", host=self.host)
+                else:
+                    self._open(now)
+                return
+            if self.state == OPEN:
+                return
+
+            self._outcomes.append((now, success))
+            while self._outcomes[0][0] < now - self.window:
+                self._outcomes.popleft()
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            if len(self._outcomes) >= self.min_calls and failures >= self.failure_rate * len(self._outcomes):
+                self._open(now)
+
+    def retry_after(self) -> float:
+        """Seconds until the circuit lets a probe call through."""
+        return max(0.0, self.open_duration - (time.monotonic() - self._opened_at))
+
+    def _open(self, now: float) -> None:
+        self.state = OPEN
+        self._opened_at = now
+        self._outcomes.clear()
+        CIRCUIT_OPENED.labels(self.host).inc()
+        logger.warning("circuit_opened", host=self.host, open_duration=self.open_duration)
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(host: str) -> CircuitBreaker:
+    """Return the circuit breaker of an upstream host, shared by all its callers in the process."""
+    breaker = _breakers.get(host)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(host, CircuitBreaker(host))
+    return breaker
+
+
+def reset_breakers() -> None:
+    """Forget every breaker's state, closing all circuits."""
+    with _breakers_lock:
+        _breakers.clear()
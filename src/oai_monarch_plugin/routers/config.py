@@ -30,4 +30,157 @@ class Settings(BaseSettings):
         else None
     )
 
+    # where knowledge graph data comes from: "api" (live Monarch API) or "snapshot" (local SQLite KG snapshot)
+    data_backend: str = os.getenv("DATA_BACKEND", "api").lower()
+    kg_snapshot_path: str = (
+        os.getenv("KG_SNAPSHOT_PATH")
+        if os.getenv("KG_SNAPSHOT_PATH")
+        else None
+    )
+
+    # local phenotype similarity search (/phenotype-profile-search), built at startup from the HPO hierarchy
+    # and phenotype annotations of the KG snapshot at SIMILARITY_SNAPSHOT_PATH; requires the optional numpy package
+    similarity_snapshot_path: str = (
+        os.getenv("SIMILARITY_SNAPSHOT_PATH")
+        if os.getenv("SIMILARITY_SNAPSHOT_PATH")
+        else os.getenv("KG_SNAPSHOT_PATH")
+    )
+
+    # local label and synonym search index serving /search, built from a KG snapshot with build-search-index
+    search_index_path: str = (
+        os.getenv("SEARCH_INDEX_PATH")
+        if os.getenv("SEARCH_INDEX_PATH")
+        else None
+    )
+
+    # serialize responses with orjson (requires the optional orjson package) and skip re-validation of built models
+    fast_json: bool = os.getenv("FAST_JSON", "false").lower() in ("1", "true", "yes")
+
+    # per-request tracing: Server-Timing headers and a "request_trace" log line per request,
+    # optionally exported through OpenTelemetry (requires the optional opentelemetry packages)
+    tracing: bool = os.getenv("TRACING", "false").lower() in ("1", "true", "yes")
+    otel_tracing: bool = os.getenv("OTEL_TRACING", "false").lower() in ("1", "true", "yes")
+
+    # logging: LOG_ASYNC writes JSON lines in batches from a background thread through a bounded queue
+    # (records are dropped, and counted, when it is full); LOG_SAMPLE_RATES keeps only a fraction of
+    # high-volume info events, e.g. "monarch_api_call=0.1,pubmed_lookup=0.5"
+    log_async: bool = os.getenv("LOG_ASYNC", "false").lower() in ("1", "true", "yes")
+    log_queue_size: int = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+    log_batch_size: int = int(os.getenv("LOG_BATCH_SIZE", 500))
+    log_flush_interval: float = float(os.getenv("LOG_FLUSH_INTERVAL", 0.2))
+    log_sample_rates: str = os.getenv("LOG_SAMPLE_RATES", "")
+
+    # admission control (off unless RATE_LIMIT is set): a token bucket per conversation (openai-conversation-id, else openai-ephemeral-user-id)
+    # refilled at RATE_LIMIT_RATE requests per second up to RATE_LIMIT_BURST, and at most MAX_IN_FLIGHT
+    # requests served at once per worker, with up to MAX_QUEUED more waiting at most QUEUE_TIMEOUT seconds
+    # for a slot; rejected requests get a 429 with a Retry-After header
+    rate_limit: bool = os.getenv("RATE_LIMIT", "false").lower() in ("1", "true", "yes")
+    rate_limit_rate: float = float(os.getenv("RATE_LIMIT_RATE", 5.0))
+    rate_limit_burst: int = int(os.getenv("RATE_LIMIT_BURST", 30))
+    rate_limit_max_keys: int = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000))
+    max_in_flight: int = int(os.getenv("MAX_IN_FLIGHT", 64))
+    max_queued: int = int(os.getenv("MAX_QUEUED", 256))
+    queue_timeout: float = float(os.getenv("QUEUE_TIMEOUT", 5.0))
+
+    # /batch: at most BATCH_MAX_REQUESTS operations per batch, BATCH_CONCURRENCY of them running at once;
+    # each operation counts as one request for the rate limit
+    batch_max_requests: int = int(os.getenv("BATCH_MAX_REQUESTS", 20))
+    batch_concurrency: int = int(os.getenv("BATCH_CONCURRENCY", 8))
+
+    # shared upstream HTTP client: connection pool, keep-alive and timeouts
+    http2: bool = os.getenv("HTTP2", "true").lower() in ("1", "true", "yes")
+    http_max_connections: int = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+    http_max_keepalive_connections: int = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20))
+    http_keepalive_expiry: float = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 30.0))
+    http_connect_timeout: float = float(os.getenv("HTTP_CONNECT_TIMEOUT", 5.0))
+    http_read_timeout: float = float(os.getenv("HTTP_READ_TIMEOUT", 30.0))
+    http_pool_timeout: float = float(os.getenv("HTTP_POOL_TIMEOUT", 5.0))
+
+    # Monarch API calls: read timeouts per endpoint, and retries of 429/5xx responses with jittered backoff
+    monarch_association_timeout: float = float(os.getenv("MONARCH_ASSOCIATION_TIMEOUT", 30.0))
+    monarch_search_timeout: float = float(os.getenv("MONARCH_SEARCH_TIMEOUT", 10.0))
+    monarch_entity_timeout: float = float(os.getenv("MONARCH_ENTITY_TIMEOUT", 10.0))
+    monarch_sim_search_timeout: float = float(os.getenv("MONARCH_SIM_SEARCH_TIMEOUT", 60.0))
+    monarch_max_retries: int = int(os.getenv("MONARCH_MAX_RETRIES", 2))
+    monarch_retry_backoff: float = float(os.getenv("MONARCH_RETRY_BACKOFF", 0.2))
+    monarch_retry_backoff_max: float = float(os.getenv("MONARCH_RETRY_BACKOFF_MAX", 2.0))
+
+    # publication lookups (PubMed, OpenLibrary), on a pool of PUB_LOOKUP_CONCURRENCY threads; PUB_LOOKUP_TIMEOUT
+    # bounds both the wait for a lookup and its upstream requests
+    pub_lookup_concurrency: int = int(os.getenv("PUB_LOOKUP_CONCURRENCY", 10))
+    pub_lookup_timeout: float = float(os.getenv("PUB_LOOKUP_TIMEOUT", 10.0))
+    pubmed_batch_size: int = int(os.getenv("PUBMED_BATCH_SIZE", 200))
+
+    # maximum number of publications looked up by a single /publications request
+    max_publication_ids: int = int(os.getenv("MAX_PUBLICATION_IDS", 500))
+
+    # publication metadata cache; PUB_CACHE_DIR adds an on-disk tier shared by all workers (taking
+    # precedence over CACHE_BACKEND for publications); permanent failures (invalid IDs, PMIDs that PubMed
+    # does not have) are cached for PUB_CACHE_NEGATIVE_TTL, and failures that may be transient not at all
+    pub_cache_size: int = int(os.getenv("PUB_CACHE_SIZE", 10000))
+    pub_cache_ttl: float = float(os.getenv("PUB_CACHE_TTL", 30 * 24 * 3600))
+    pub_cache_negative_ttl: float = float(os.getenv("PUB_CACHE_NEGATIVE_TTL", 3600))
+    pub_cache_dir: str = (
+        os.getenv("PUB_CACHE_DIR")
+        if os.getenv("PUB_CACHE_DIR")
+        else None
+    )
+
+    # shared tier behind the in-process caches of Monarch responses and publication metadata, so that every
+    # worker benefits from what any of them fetched: "none", "sqlite" (files in CACHE_DIR, shared by the
+    # workers of a host) or "redis" (the Redis-protocol server at CACHE_REDIS_URL, shared across hosts);
+    # values are serialized with msgpack if it is installed, JSON otherwise
+    cache_backend: str = os.getenv("CACHE_BACKEND", "none").lower()
+    cache_dir: str = (
+        os.getenv("CACHE_DIR")
+        if os.getenv("CACHE_DIR")
+        else None
+    )
+    cache_redis_url: str = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+    cache_redis_timeout: float = float(os.getenv("CACHE_REDIS_TIMEOUT", 0.5))
+
+    # cache of Monarch API responses (association, search and entity calls); a TTL of 0 disables it
+    response_cache_ttl: float = float(os.getenv("RESPONSE_CACHE_TTL", 300))
+    response_cache_size: int = int(os.getenv("RESPONSE_CACHE_SIZE", 10000))
+    response_cache_max_bytes: int = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", 128 * 1024 * 1024))
+
+    # background warmer: keeps the entity records and first association pages of a hot set of entities
+    # in memory, refreshed every WARM_INTERVAL seconds and served stale while being revalidated; the hot
+    # set is the ids in WARM_SEED_FILE (one per line) plus the WARM_LEARNED_SIZE most requested entities
+    warm: bool = os.getenv("WARM", "false").lower() in ("1", "true", "yes")
+    warm_interval: float = float(os.getenv("WARM_INTERVAL", 300))
+    warm_seed_file: str = (
+        os.getenv("WARM_SEED_FILE")
+        if os.getenv("WARM_SEED_FILE")
+        else None
+    )
+    warm_learned_size: int = int(os.getenv("WARM_LEARNED_SIZE", 1000))
+    warm_concurrency: int = int(os.getenv("WARM_CONCURRENCY", 8))
+
+    # circuit breaker per upstream host: opens once at least CIRCUIT_MIN_CALLS calls in the last CIRCUIT_WINDOW
+    # seconds failed at a rate of CIRCUIT_FAILURE_RATE or more, then rejects calls for CIRCUIT_OPEN_DURATION
+    # seconds before letting a probe through; meanwhile Monarch responses that expired less than
+    # RESPONSE_CACHE_STALE_TTL seconds ago are served instead
+    circuit_breaker: bool = os.getenv("CIRCUIT_BREAKER", "true").lower() in ("1", "true", "yes")
+    circuit_failure_rate: float = float(os.getenv("CIRCUIT_FAILURE_RATE", 0.5))
+    circuit_min_calls: int = int(os.getenv("CIRCUIT_MIN_CALLS", 10))
+    circuit_window: float = float(os.getenv("CIRCUIT_WINDOW", 30.0))
+    circuit_open_duration: float = float(os.getenv("CIRCUIT_OPEN_DURATION", 15.0))
+    response_cache_stale_ttl: float = float(os.getenv("RESPONSE_CACHE_STALE_TTL", 24 * 3600))
+
+    # per-category timeout when several association categories are queried concurrently
+    association_category_timeout: float = float(os.getenv("ASSOCIATION_CATEGORY_TIMEOUT", 30.0))
+
+    # larger association requests (limit, max_results, all=true and stream=true) are split into upstream
+    # pages of this size, fetched a few at a time concurrently; limit, max_results and all=true are capped
+    association_page_size: int = int(os.getenv("ASSOCIATION_PAGE_SIZE", 500))
+    association_page_concurrency: int = int(os.getenv("ASSOCIATION_PAGE_CONCURRENCY", 4))
+    max_association_results: int = int(os.getenv("MAX_ASSOCIATION_RESULTS", 10000))
+
+    # maximum number of identifiers in a single association request, whose associations are fetched concurrently
+    max_association_entities: int = int(os.getenv("MAX_ASSOCIATION_ENTITIES", 20))
+
+    # maximum number of concurrent upstream lookups for a single /entity request
+    entity_lookup_concurrency: int = int(os.getenv("ENTITY_LOOKUP_CONCURRENCY", 8))
+
 settings = Settings()
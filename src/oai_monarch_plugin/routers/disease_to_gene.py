@@ -1,14 +1,22 @@
 from typing import Any, Dict, List, Optional
 
-import httpx
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Depends, Query
 from pydantic import BaseModel, Field
 
 from .config import settings
 from .models import *
-from .utils import get_association_all, get_pub_info
-
-BASE_API_URL = settings.monarch_api_url
+from .tracing import span
+from .utils import (
+    AssociationOptions,
+    association_errors,
+    associations_response,
+    effective_limit,
+    get_associations_for_entities,
+    model_response,
+    publication_info,
+    stream_associations,
+    unique_entities,
+)
 
 router = APIRouter()
 
@@ -26,51 +34,89 @@ router = APIRouter()
     operation_id="get_disease_gene_associations",
 )
 async def get_disease_gene_associations(
-    disease_id: str = Query(
-        ..., description="The ontology identifier of the disease.", example="MONDO:0009061"
+    disease_id: List[str] = Query(
+        ...,
+        description="The ontology identifier of the disease; repeat the parameter to query several diseases at once.",
+        example=["MONDO:0009061"],
     ),
     limit: Optional[int] = Query(10, description="The maximum number of associations to return."),
     offset: Optional[int] = Query(0, description="Offset for pagination of results"),
+    options: AssociationOptions = Depends(),
 ) -> GeneAssociations:
-    
-    causalAssociations = await get_association_all(
-        category="biolink:CausalGeneToDiseaseAssociation",
-        entity=disease_id,
+    entities = unique_entities(disease_id, options.stream)
+    limit = effective_limit(limit, options.fetch_all, options.max_results)
+
+    if options.stream:
+        return await stream_associations(
+            {
+                "biolink:CausalGeneToDiseaseAssociation": _causal_gene_association,
+                "biolink:CorrelatedGeneToDiseaseAssociation": _correlated_gene_association,
+            },
+            entities[0],
+            limit,
+            offset,
+            with_publications=["biolink:CorrelatedGeneToDiseaseAssociation"],
+            include_publications=options.include_publications,
+        )
+
+    results = await get_associations_for_entities(
+        categories=[
+            "biolink:CausalGeneToDiseaseAssociation",
+            "biolink:CorrelatedGeneToDiseaseAssociation",
+        ],
+        entities=entities,
         limit=limit,
         offset=offset,
     )
 
-    correlatedAssociations = await get_association_all(
-        category="biolink:CorrelatedGeneToDiseaseAssociation",
-        entity=disease_id,
-        limit=limit,
-        offset=offset,
+    pub_info = await publication_info(
+        (
+            pub
+            for result in results.values()
+            for item in result["biolink:CorrelatedGeneToDiseaseAssociation"].get("items", [])
+            for pub in item.get("publications", [])
+        ),
+        options.include_publications,
     )
 
-    associations = []
+    with span("build"):
+        groups = []
+        for entity, result in results.items():
+            causalAssociations = result["biolink:CausalGeneToDiseaseAssociation"]
+            correlatedAssociations = result["biolink:CorrelatedGeneToDiseaseAssociation"]
+            associations = [_causal_gene_association(item, pub_info) for item in causalAssociations.get("items", [])]
+            associations += [_correlated_gene_association(item, pub_info) for item in correlatedAssociations.get("items", [])]
+            groups.append(GeneAssociationGroup(
+                id=entity,
+                associations=associations,
+                total=causalAssociations.get("total", 0) + correlatedAssociations.get("total", 0),
+                error=association_errors(result),
+            ))
 
-    for item in causalAssociations.get("items", []):
-        gene = Gene(
-            # in a GeneToDiseaseAssociation, the gene is the subject
-            gene_id=item.get("subject"),
-            label=item.get("subject_label"),
-        )
-        assoc = GeneAssociation(gene=gene, metadata={"relationship": "causal"})
-        associations.append(assoc)
-
-    for item in correlatedAssociations.get("items", []):
-        gene = Gene(
-            # in a GeneToDiseaseAssociation, the gene is the subject
-            gene_id=item.get("subject"),
-            label=item.get("subject_label"),
-        )
-        assoc = GeneAssociation(gene=gene, metadata={"relationship": "correlated"})
+        response = associations_response(GeneAssociations, groups, gene_url_template=settings.monarch_ui_url + "/gene/{gene_id}")
+
+    return model_response(response)
 
-        for pub in item.get("publications", []):
-            assoc.publications.append(get_pub_info(pub))
 
-        associations.append(assoc)
+def _causal_gene_association(item: dict, pub_info: Dict[str, dict]) -> GeneAssociation:
+    gene = Gene(
+        # in a GeneToDiseaseAssociation, the gene is the subject
+        gene_id=item.get("subject"),
+        label=item.get("subject_label"),
+    )
+    return GeneAssociation(gene=gene, metadata={"relationship": "causal"})
+
+
+def _correlated_gene_association(item: dict, pub_info: Dict[str, dict]) -> GeneAssociation:
+    gene = Gene(
+        # in a GeneToDiseaseAssociation, the gene is the subject
+        gene_id=item.get("subject"),
+        label=item.get("subject_label"),
+    )
+    assoc = GeneAssociation(gene=gene, metadata={"relationship": "correlated"})
+
+    for pub in item.get("publications", []):
+        if pub in pub_info:
+            assoc.publications.append(pub_info[pub])
 
-    return GeneAssociations(associations = associations, 
-                            total = causalAssociations.get("total", 0) + correlatedAssociations.get("total", 0),
-                            gene_url_template = settings.monarch_ui_url + "/gene/{gene_id}")
+    return assoc
@@ -1,14 +1,22 @@
 from typing import Any, Dict, List, Optional
 
-import httpx
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Depends, Query
 from pydantic import BaseModel, Field
 
 from .config import settings
 from .models import *
-from .utils import get_association_all, get_pub_info
-
-BASE_API_URL = settings.monarch_api_url
+from .tracing import span
+from .utils import (
+    AssociationOptions,
+    association_errors,
+    associations_response,
+    effective_limit,
+    get_associations_for_entities,
+    model_response,
+    publication_info,
+    stream_associations,
+    unique_entities,
+)
 
 router = APIRouter()
 
@@ -26,41 +34,58 @@ router = APIRouter()
     operation_id="get_disease_phenotype_associations",
 )
 async def get_disease_phenotype_associations(
-    disease_id: str = Query(
-        ..., description="The ontology identifier of the disease.", example="MONDO:0009061"
+    disease_id: List[str] = Query(
+        ...,
+        description="The ontology identifier of the disease; repeat the parameter to query several diseases at once.",
+        example=["MONDO:0009061"],
     ),
     limit: Optional[int] = Query(10, description="The maximum number of associations to return."),
     offset: Optional[int] = Query(0, description="Offset for pagination of results."),
+    options: AssociationOptions = Depends(),
 ) -> PhenotypeAssociations:
-    genericAssociations = await get_association_all(
-        category="biolink:DiseaseToPhenotypicFeatureAssociation",
-        entity=disease_id,
-        limit=limit,
-        offset=offset,
-    )
+    entities = unique_entities(disease_id, options.stream)
+    limit = effective_limit(limit, options.fetch_all, options.max_results)
+    category = "biolink:DiseaseToPhenotypicFeatureAssociation"
 
-    associations = []
-    for item in genericAssociations.get("items", []):
-        phenotype = Phenotype(phenotype_id=item.get("object"), label=item.get("object_label"))
-        
-        assoc = PhenotypeAssociation(
-            metadata = {"frequency_qualifier": item.get("frequency_qualifier"), "onset_qualifier": item.get("onset_qualifier")},
-            phenotype=phenotype,
-            publications = []
+    if options.stream:
+        return await stream_associations(
+            {category: _phenotype_association}, entities[0], limit, offset, include_publications=options.include_publications
         )
 
-        for pub in item.get("publications", []):
-            assoc.publications.append(get_pub_info(pub))
-            
-        associations.append(assoc)
+    results = await get_associations_for_entities([category], entities, limit, offset)
+
+    pub_info = await publication_info(
+        (pub for result in results.values() for item in result[category].get("items", []) for pub in item.get("publications", [])),
+        options.include_publications,
+    )
 
-    import pprint
-    pp = pprint.PrettyPrinter(indent=4)
-    pp.pprint(associations)
+    with span("build"):
+        groups = [
+            PhenotypeAssociationGroup(
+                id=entity,
+                associations=[_phenotype_association(item, pub_info) for item in result[category].get("items", [])],
+                total=result[category].get("total", 0),
+                error=association_errors(result),
+            )
+            for entity, result in results.items()
+        ]
 
+        response = associations_response(PhenotypeAssociations, groups, phenotype_url_template=settings.monarch_ui_url + "/phenotype/{phenotype_id}")
 
-    return PhenotypeAssociations(
-        associations = associations, 
-        total = genericAssociations.get("total", 0),
-        phenotype_url_template = settings.monarch_ui_url + "/phenotype/{phenotype_id}"
+    return model_response(response)
+
+
+def _phenotype_association(item: dict, pub_info: Dict[str, dict]) -> PhenotypeAssociation:
+    phenotype = Phenotype(phenotype_id=item.get("object"), label=item.get("object_label"))
+    
+    assoc = PhenotypeAssociation(
+        metadata = {"frequency_qualifier": item.get("frequency_qualifier"), "onset_qualifier": item.get("onset_qualifier")},
+        phenotype=phenotype,
+        publications = []
     )
+
+    for pub in item.get("publications", []):
+        if pub in pub_info:
+            assoc.publications.append(pub_info[pub])
+
+    return assoc
@@ -1,13 +1,13 @@
+import asyncio
 from typing import List
 
-import httpx
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Depends, Query
 from loguru import logger
 
 from .config import settings
+from .backends import MonarchBackend, provide_backend
 from .models import *
-
-BASE_API_URL = settings.monarch_api_url
+from .utils import model_response
 
 router = APIRouter()
 
@@ -19,37 +19,41 @@ router = APIRouter()
     response_description="A JSON array of entity descriptors.",
     operation_id="get_entities",
 )
-async def get_entities(ids: List[str] = Query(..., description="List of entity ids")) -> List[Entity]:
-    entities = []
-    async with httpx.AsyncClient() as client:
-        for id in ids:
-            api_url = f"{BASE_API_URL}/entity/{id}"
-            logger.info({
-                "event": "monarch_api_call",
-                "url": str(client.build_request("GET", api_url).url),
-                "api_url": api_url,
-                "method": "GET"
-            })
-
-            response = await client.get(api_url)
-
-            response_json = response.json()
-
-            id = response_json.get("id")
-            category = response_json.get("category")
-            name = response_json.get("name")
-            description = response_json.get("description")
-            symbol = response_json.get("symbol")
-            synonym = response_json.get("synonym")
-
-            association_counts_json = response_json.get("association_counts")
-            association_counts = []
-            for association_count_json in association_counts_json:
-                association_count: AssociationCount = AssociationCount(label = association_count_json.get("label"), 
-                                                                       count = association_count_json.get("count"))
-                association_counts.append(association_count)
-
-            
-            entities.append(Entity(id=id, category=[category], name=name, description=description, symbol=symbol, synonym=synonym, association_counts=association_counts))
-            
-    return entities
+async def get_entities(
+    ids: List[str] = Query(..., description="List of entity ids"),
+    backend: MonarchBackend = Depends(provide_backend),
+) -> List[Entity]:
+    # fetch each distinct id once, concurrently, keeping the order in which ids were given
+    unique_ids = list(dict.fromkeys(ids))
+    semaphore = asyncio.Semaphore(settings.entity_lookup_concurrency)
+
+    async def fetch(id: str) -> Entity:
+        async with semaphore:
+            try:
+                return _entity_from_json(await backend.entity(id))
+            except Exception as e:
+                logger.warning("entity_lookup_failed", id=id, error=repr(e))
+                return Entity(id=id, category=[], synonym=[], association_counts=[], error=f"Error fetching entity {id}: {e}")
+
+    return model_response(list(await asyncio.gather(*(fetch(id) for id in unique_ids))))
+
+
+def _entity_from_json(response_json: dict) -> Entity:
+    if "detail" in response_json and "id" not in response_json:
+        raise ValueError(response_json["detail"])
+
+    id = response_json.get("id")
+    category = response_json.get("category")
+    name = response_json.get("name")
+    description = response_json.get("description")
+    symbol = response_json.get("symbol")
+    synonym = response_json.get("synonym")
+
+    association_counts_json = response_json.get("association_counts")
+    association_counts = []
+    for association_count_json in association_counts_json:
+        association_count: AssociationCount = AssociationCount(label = association_count_json.get("label"), 
+                                                               count = association_count_json.get("count"))
+        association_counts.append(association_count)
+
+    return Entity(id=id, category=[category], name=name, description=description, symbol=symbol, synonym=synonym, association_counts=association_counts)
@@ -1,14 +1,22 @@
 from typing import Any, Dict, List, Optional
 
-import httpx
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Depends, Query
 from pydantic import BaseModel, Field
 
 from .config import settings
 from .models import *
-from .utils import get_association_all, get_pub_info
-
-BASE_API_URL = settings.monarch_api_url
+from .tracing import span
+from .utils import (
+    AssociationOptions,
+    association_errors,
+    associations_response,
+    effective_limit,
+    get_associations_for_entities,
+    model_response,
+    publication_info,
+    stream_associations,
+    unique_entities,
+)
 
 router = APIRouter()
 
@@ -26,42 +34,79 @@ router = APIRouter()
     operation_id="get_gene_disease_associations",
 )
 async def get_gene_disease_associations(
-    gene_id: str = Query(..., description="The identifier of the gene.", example="HGNC:1884"),
+    gene_id: List[str] = Query(
+        ..., description="The identifier of the gene; repeat the parameter to query several genes at once.", example=["HGNC:1884"]
+    ),
     limit: Optional[int] = Query(10, description="The maximum number of associations to return."),
     offset: Optional[int] = Query(0, description="Offset for pagination of results"),
+    options: AssociationOptions = Depends(),
 ) -> DiseaseAssociations:
-    
-    causalAssociations = await get_association_all(
-        category="biolink:CausalGeneToDiseaseAssociation",
-        entity=gene_id,
+    entities = unique_entities(gene_id, options.stream)
+    limit = effective_limit(limit, options.fetch_all, options.max_results)
+
+    if options.stream:
+        return await stream_associations(
+            {
+                "biolink:CausalGeneToDiseaseAssociation": _causal_disease_association,
+                "biolink:CorrelatedGeneToDiseaseAssociation": _correlated_disease_association,
+            },
+            entities[0],
+            limit,
+            offset,
+            with_publications=["biolink:CorrelatedGeneToDiseaseAssociation"],
+            include_publications=options.include_publications,
+        )
+
+    results = await get_associations_for_entities(
+        categories=[
+            "biolink:CausalGeneToDiseaseAssociation",
+            "biolink:CorrelatedGeneToDiseaseAssociation",
+        ],
+        entities=entities,
         limit=limit,
         offset=offset,
     )
 
-    correlatedAssociations = await get_association_all(
-        category="biolink:CorrelatedGeneToDiseaseAssociation",
-        entity=gene_id,
-        limit=limit,
-        offset=offset,
+    pub_info = await publication_info(
+        (
+            pub
+            for result in results.values()
+            for item in result["biolink:CorrelatedGeneToDiseaseAssociation"].get("items", [])
+            for pub in item.get("publications", [])
+        ),
+        options.include_publications,
     )
 
+    with span("build"):
+        groups = []
+        for entity, result in results.items():
+            causalAssociations = result["biolink:CausalGeneToDiseaseAssociation"]
+            correlatedAssociations = result["biolink:CorrelatedGeneToDiseaseAssociation"]
+            associations = [_causal_disease_association(item, pub_info) for item in causalAssociations.get("items", [])]
+            associations += [_correlated_disease_association(item, pub_info) for item in correlatedAssociations.get("items", [])]
+            groups.append(DiseaseAssociationGroup(
+                id=entity,
+                associations=associations,
+                total=causalAssociations.get("total", 0) + correlatedAssociations.get("total", 0),
+                error=association_errors(result),
+            ))
+
+        response = associations_response(DiseaseAssociations, groups, disease_url_template=settings.monarch_ui_url + "/disease/{disease_id}")
+
+    return model_response(response)
+
 
-    associations = []
-    for item in causalAssociations.get("items", []):
-        disease = Disease(disease_id=item.get("object"), label=item.get("object_label"), type="causal")
-        assoc = DiseaseAssociation(disease=disease, metadata={"relationship": "causal"})
-        associations.append(assoc)
+def _causal_disease_association(item: dict, pub_info: Dict[str, dict]) -> DiseaseAssociation:
+    disease = Disease(disease_id=item.get("object"), label=item.get("object_label"), type="causal")
+    return DiseaseAssociation(disease=disease, metadata={"relationship": "causal"})
 
-    for item in correlatedAssociations.get("items", []):
-        disease = Disease(disease_id=item.get("object"), label=item.get("object_label"))
-        assoc = DiseaseAssociation(disease=disease, metadata={"relationship": "correlated"})
 
-        for pub in item.get("publications", []):
-            assoc.publications.append(get_pub_info(pub))
-            
-        associations.append(assoc)
+def _correlated_disease_association(item: dict, pub_info: Dict[str, dict]) -> DiseaseAssociation:
+    disease = Disease(disease_id=item.get("object"), label=item.get("object_label"))
+    assoc = DiseaseAssociation(disease=disease, metadata={"relationship": "correlated"})
 
+    for pub in item.get("publications", []):
+        if pub in pub_info:
+            assoc.publications.append(pub_info[pub])
 
-    return DiseaseAssociations(associations=associations, 
-                               total=causalAssociations.get("total", 0) + correlatedAssociations.get("total", 0),
-                               disease_url_template = settings.monarch_ui_url + "/disease/{disease_id}")
+    return assoc
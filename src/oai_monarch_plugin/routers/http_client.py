@@ -0,0 +1,31 @@
+import importlib.util
+
+import httpx
+from loguru import logger
+
+from .config import settings
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """Create a pooled, keep-alive (and HTTP/2 if available) client configured from settings.
+    Used by MonarchClient, which keeps one such client per worker process.
+    """
+
+    http2 = settings.http2
+    if http2 and importlib.util.find_spec("h2") is None:
+        logger.warning("http2_unavailable", message="the h2 package is not installed, falling back to HTTP/1.1")
+        http2 = False
+
+    limits = httpx.Limits(
+        max_connections=settings.http_max_connections,
+        max_keepalive_connections=settings.http_max_keepalive_connections,
+        keepalive_expiry=settings.http_keepalive_expiry,
+    )
+    timeout = httpx.Timeout(
+        connect=settings.http_connect_timeout,
+        read=settings.http_read_timeout,
+        write=settings.http_read_timeout,
+        pool=settings.http_pool_timeout,
+    )
+
+    return httpx.AsyncClient(http2=http2, limits=limits, timeout=timeout)
@@ -0,0 +1,121 @@
+"""Prometheus metrics for requests to the plugin and for the upstream calls made to serve them.
+
+Served at /metrics. Under gunicorn every worker is a separate process; when PROMETHEUS_MULTIPROC_DIR
+is set (see gunicorn.conf.py), workers write their samples to files in that directory and /metrics
+aggregates them across all workers.
+"""
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from fastapi import APIRouter, Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+from .tracing import span
+
+NAMESPACE = "monarch_plugin"
+
+# upstream calls range from cached-in-the-CDN to multi-second association queries
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+REQUEST_DURATION = Histogram(
+    "request_duration_seconds",
+    "Time to serve a request, by route and response status.",
+    ["method", "route", "status"],
+    namespace=NAMESPACE,
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "requests_in_progress",
+    "Requests currently being served.",
+    namespace=NAMESPACE,
+    multiprocess_mode="livesum",
+)
+UPSTREAM_DURATION = Histogram(
+    "upstream_request_duration_seconds",
+    "Time taken by calls to upstream services (including retries), by upstream, call type and outcome.",
+    ["upstream", "call", "outcome"],
+    namespace=NAMESPACE,
+    buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_RETRIES = Counter(
+    "upstream_retries_total",
+    "Retried upstream requests, by upstream and call type.",
+    ["upstream", "call"],
+    namespace=NAMESPACE,
+)
+UPSTREAM_TIMEOUTS = Counter(
+    "upstream_timeouts_total",
+    "Upstream calls abandoned after the plugin's own timeout, by upstream and call type.",
+    ["upstream", "call"],
+    namespace=NAMESPACE,
+)
+STALE_RESPONSES = Counter(
+    "upstream_stale_responses_total",
+    "Expired cached responses served because the upstream call failed or its circuit was open.",
+    ["upstream", "call"],
+    namespace=NAMESPACE,
+)
+CIRCUIT_OPENED = Counter(
+    "circuit_opened_total",
+    "Times the circuit breaker of an upstream host opened.",
+    ["host"],
+    namespace=NAMESPACE,
+)
+CIRCUIT_REJECTIONS = Counter(
+    "circuit_rejected_calls_total",
+    "Upstream calls rejected without being made because the host's circuit was open.",
+    ["host"],
+    namespace=NAMESPACE,
+)
+REQUESTS_REJECTED = Counter(
+    "requests_rejected_total",
+    "Requests rejected with a 429, by reason: the conversation's rate limit, or too many requests in flight.",
+    ["reason"],
+    namespace=NAMESPACE,
+)
+
+router = APIRouter()
+
+
+class UpstreamCall:
+    """Handle yielded by track_upstream; set outcome to "error" for calls that failed without raising."""
+
+    outcome = "success"
+
+
+@contextmanager
+def track_upstream(upstream: str, call: str) -> Iterator[UpstreamCall]:
+    """Time an upstream call into UPSTREAM_DURATION, and trace it as a span named after the upstream.
+    The outcome is "error" if the block raises.
+    """
+    tracked = UpstreamCall()
+    start = time.perf_counter()
+    try:
+        with span(upstream, call=call):
+            yield tracked
+    except BaseException:
+        tracked.outcome = "error"
+        raise
+    finally:
+        UPSTREAM_DURATION.labels(upstream, call, tracked.outcome).observe(time.perf_counter() - start)
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
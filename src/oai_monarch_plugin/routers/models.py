@@ -1,9 +1,13 @@
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Literal, Optional
 
 from fastapi import APIRouter, Query
 from pydantic import BaseModel, Field
 
 
+# how association responses include publications: not at all, as their identifiers, or with their metadata
+IncludePublications = Literal["none", "ids", "full"]
+
+
 class PublicationBacked(BaseModel):
     publications: List[Dict[str, str]] = Field([], description="List of related publications and associated metadata.")
 
@@ -30,11 +34,21 @@ class PhenotypeAssociation(PublicationBacked, HasMetadata):
     phenotype: Phenotype
 
 
+class PhenotypeAssociationGroup(BaseModel):
+    id: str = Field(..., description="The identifier these associations are for.", example="MONDO:0009061")
+    associations: List[PhenotypeAssociation] = Field(
+        ..., description="The list of PhenotypeAssociation objects."
+    )
+    total: int = Field(..., description="The total number of phenotype associations available for this identifier.")
+    error: Optional[str] = Field(None, description="Set if associations for this identifier could not be retrieved.")
+
+
 class PhenotypeAssociations(BaseModel):
     associations: List[PhenotypeAssociation] = Field(
         ..., description="The list of PhenotypeAssociation objects."
     )
     total: int = Field(..., description="The total number of phenotype associations available.")
+    groups: Optional[List[PhenotypeAssociationGroup]] = Field(None, description="Set when several identifiers are queried: their associations, grouped by identifier in the order given. associations is then empty, and total the sum of their totals.")
     phenotype_url_template: str = Field(..., description="URL template for constructing links to the Monarch Initiative website.", example="https://monarchinitiative.org/phenotype/{phenotype_id}")
 
 
@@ -54,11 +68,21 @@ class DiseaseAssociation(PublicationBacked, HasMetadata):
     )
 
 
+class DiseaseAssociationGroup(BaseModel):
+    id: str = Field(..., description="The identifier these associations are for.", example="HGNC:1884")
+    associations: List[DiseaseAssociation] = Field(
+        ..., description="The list of DiseaseAssociation objects."
+    )
+    total: int = Field(..., description="The total number of disease associations available for this identifier.")
+    error: Optional[str] = Field(None, description="Set if associations for this identifier could not be retrieved.")
+
+
 class DiseaseAssociations(BaseModel):
     associations: List[DiseaseAssociation] = Field(
         ..., description="The list of DiseaseAssociation objects."
     )
     total: int = Field(..., description="The total number of disease associations available.")
+    groups: Optional[List[DiseaseAssociationGroup]] = Field(None, description="Set when several identifiers are queried: their associations, grouped by identifier in the order given. associations is then empty, and total the sum of their totals.")
     disease_url_template: str = Field(..., description="URL template for constructing links to the Monarch Initiative website.", example="https://monarchinitiative.org/disease/{disease_id}")
 
 
@@ -71,11 +95,21 @@ class GeneAssociation(PublicationBacked, HasMetadata):
     gene: Gene
 
 
+class GeneAssociationGroup(BaseModel):
+    id: str = Field(..., description="The identifier these associations are for.", example="MONDO:0009061")
+    associations: List[GeneAssociation] = Field(
+        ..., description="The list of GeneAssociation objects."
+    )
+    total: int = Field(..., description="The total number of gene associations available for this identifier.")
+    error: Optional[str] = Field(None, description="Set if associations for this identifier could not be retrieved.")
+
+
 class GeneAssociations(BaseModel):
     associations: List[GeneAssociation] = Field(
         ..., description="The list of GeneAssociation objects."
     )
     total: int = Field(..., description="The total number of gene associations available.")
+    groups: Optional[List[GeneAssociationGroup]] = Field(None, description="Set when several identifiers are queried: their associations, grouped by identifier in the order given. associations is then empty, and total the sum of their totals.")
     gene_url_template: str = Field(..., description="URL template for constructing links to the Monarch Initiative website.", example="https://monarchinitiative.org/gene/{gene_id}")
 
 
@@ -92,3 +126,4 @@ class Entity(PublicationBacked, HasMetadata):
     symbol: Optional[str] = Field(None, description="The symbol of the entity, usually a short name like FBN1.")
     synonym: List[str] = Field(..., description="The synonyms of the entity.")
     association_counts: List[AssociationCount] = Field(..., description="Counts of associations between this entity and other entities of different types.")
+    error: Optional[str] = Field(None, description="Set if information for this identifier could not be retrieved.")
@@ -1,13 +1,12 @@
+import asyncio
 from typing import List, Optional
 
-import httpx
 from fastapi import APIRouter, Query, HTTPException, status
 from pydantic import BaseModel, Field
-from loguru import logger
 
-from .config import settings
-
-BASE_API_URL = settings.monarch_api_v2_url
+from .similarity import get_similarity_engine
+from .tracing import span
+from .utils import model_response
 
 router = APIRouter()
 
@@ -41,39 +40,22 @@ async def search_phenotype_profiles(
     ),
     limit: Optional[int] = Query(10, description="The maximum number of search results to return."),
 ) -> MatchItems:
-    
-    raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Endpoint temporarily disabled.")
-
-    api_url = f"{BASE_API_URL}/sim/search"
-    
-    is_feature_set = all('HP:' in id for id in ids)
-
-    params = {"id": ids, "is_feature_set": is_feature_set, "metric": "phenodigm", "limit": limit}
+    engine = get_similarity_engine()
+    if engine is None:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Phenotype similarity search is not configured on this server."
+        )
 
-    async with httpx.AsyncClient() as client:
-        logger.info({
-            "event": "monarch_api_call_v2",
-            "url": str(client.build_request("GET", api_url, params=params).url),
-            "params": params,
-            "api_url": api_url,
-            "method": "GET"
-        })
-        logger.info(f"params: {params}, url: {str(client.build_request('GET', api_url, params=params).url)}")
-        response = await client.get(api_url, params=params)
+    # phenotypes (HP terms) are matched as given, genes and diseases by their phenotypes, unioned
+    profile = engine.profile(ids)
+    if not profile:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No phenotypes found for {', '.join(ids)}")
 
-    response_json = response.json()
+    # scoring is CPU-bound (vectorized, tens of milliseconds), so it runs off the event loop
+    with span("similarity", terms=str(len(profile))):
+        matches = await asyncio.to_thread(engine.search, profile, limit, exclude=ids)
 
-    matches = []
-    for item in response_json.get("matches", []):
-        matches.append(
-            MatchItem(
-                rank=item.get("rank"),
-                score=item.get("score"),
-                type=item.get("type"),
-                taxon=item.get("taxon"),
-                id=item.get("id"),
-                label=item.get("label"),
-            )
-        )
+    with span("build"):
+        response = MatchItems(matches=[MatchItem(**match) for match in matches], max_max_ic=engine.max_ic)
 
-    return MatchItems(matches=matches, max_max_ic=response_json.get("metadata", {}).get("max_max_ic"))
+    return model_response(response)
@@ -1,14 +1,22 @@
 from typing import Any, Dict, List, Optional
 
-import httpx
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Depends, Query
 from pydantic import BaseModel, Field
 
 from .config import settings
 from .models import *
-from .utils import get_association_all, get_pub_info
-
-BASE_API_URL = settings.monarch_api_url
+from .tracing import span
+from .utils import (
+    AssociationOptions,
+    association_errors,
+    associations_response,
+    effective_limit,
+    get_associations_for_entities,
+    model_response,
+    publication_info,
+    stream_associations,
+    unique_entities,
+)
 
 router = APIRouter()
 
@@ -26,33 +34,57 @@ router = APIRouter()
     operation_id="get_phenotype_gene_associations",
 )
 async def get_phenotype_gene_associations(
-    phenotype_id: str = Query(
-        ..., description="The ontology identifier of the phenotype.", example="HP:0002721"
+    phenotype_id: List[str] = Query(
+        ...,
+        description="The ontology identifier of the phenotype; repeat the parameter to query several phenotypes at once.",
+        example=["HP:0002721"],
     ),
     limit: Optional[int] = Query(10, description="The maximum number of associations to return."),
     offset: Optional[int] = Query(1, description="Offset for pagination of results"),
+    options: AssociationOptions = Depends(),
 ) -> GeneAssociations:
-    genericAssociations = await get_association_all(
-        category="biolink:GeneToPhenotypicFeatureAssociation",
-        entity=phenotype_id,
-        limit=limit,
-        offset=offset,
-    )
+    entities = unique_entities(phenotype_id, options.stream)
+    limit = effective_limit(limit, options.fetch_all, options.max_results)
+    category = "biolink:GeneToPhenotypicFeatureAssociation"
 
-    associations = []
-    for item in genericAssociations.get("items", []):
-        gene = Gene(
-            # in a GeneToPhenotypicFeatureAssociation, the gene is the subject
-            gene_id=item.get("subject"),
-            label=item.get("subject_label"),
+    if options.stream:
+        return await stream_associations(
+            {category: _gene_association}, entities[0], limit, offset, include_publications=options.include_publications
         )
-        assoc = GeneAssociation(gene=gene)
 
-        for pub in item.get("publications", []):
-            assoc.publications.append(get_pub_info(pub))
+    results = await get_associations_for_entities([category], entities, limit, offset)
+
+    pub_info = await publication_info(
+        (pub for result in results.values() for item in result[category].get("items", []) for pub in item.get("publications", [])),
+        options.include_publications,
+    )
+
+    with span("build"):
+        groups = [
+            GeneAssociationGroup(
+                id=entity,
+                associations=[_gene_association(item, pub_info) for item in result[category].get("items", [])],
+                total=result[category].get("total", 0),
+                error=association_errors(result),
+            )
+            for entity, result in results.items()
+        ]
+
+        response = associations_response(GeneAssociations, groups, gene_url_template=settings.monarch_ui_url + "/gene/{gene_id}")
+
+    return model_response(response)
+
+
+def _gene_association(item: dict, pub_info: Dict[str, dict]) -> GeneAssociation:
+    gene = Gene(
+        # in a GeneToPhenotypicFeatureAssociation, the gene is the subject
+        gene_id=item.get("subject"),
+        label=item.get("subject_label"),
+    )
+    assoc = GeneAssociation(gene=gene)
 
-        associations.append(assoc)
+    for pub in item.get("publications", []):
+        if pub in pub_info:
+            assoc.publications.append(pub_info[pub])
 
-    return GeneAssociations(associations=associations, 
-                            total=genericAssociations.get("total", 0),
-                            gene_url_template = settings.monarch_ui_url + "/gene/{gene_id}")
+    return assoc
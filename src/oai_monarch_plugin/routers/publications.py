@@ -0,0 +1,382 @@
+import asyncio
+import contextvars
+import functools
+import os
+import re
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, TypeVar
+
+import eutils
+import httpx
+from fastapi import APIRouter, HTTPException, Query, status
+from isbnlib import canonical, config as isbnlib_config, meta
+from loguru import logger
+
+from .cache import LRUCache, SQLiteCache, TieredCache, create_shared_cache
+from .circuit_breaker import get_breaker
+from .config import settings
+from .metrics import UPSTREAM_TIMEOUTS, track_upstream
+from .tracing import span
+
+T = TypeVar("T")
+
+router = APIRouter()
+
+# lookups hitting NCBI or OpenLibrary run on their own worker threads, so that slow lookups never hold up
+# the work sharing the default executor (shared cache I/O, search index queries); bounded per event loop
+_lookup_executor = ThreadPoolExecutor(max_workers=settings.pub_lookup_concurrency, thread_name_prefix="publication-lookup")
+_lookup_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+# a single eutils client per process; its built-in throttle keeps us within NCBI's rate limit
+# (3 req/s, or 10 req/s with an API key) as long as requests go through it one at a time
+_eutils_client: Optional[eutils.Client] = None
+_eutils_lock = threading.Lock()
+
+# upstream hosts, for their circuit breakers; while a circuit is open lookups fail without being made
+NCBI_HOST = "eutils.ncbi.nlm.nih.gov"
+OPENLIBRARY_HOST = "openlibrary.org"
+EUTILS_URL = f"https://{NCBI_HOST}/entrez/eutils"
+
+# isbnlib's requests to OpenLibrary give up after the lookup timeout as well
+isbnlib_config.seturlopentimeout(settings.pub_lookup_timeout)
+
+# the status of a PMID that PubMed does not have
+NOT_FOUND_STATUS = "No publication info found for PMID "
+
+
+# publication metadata is effectively immutable, so results are cached for a long time;
+# permanent failures are cached too, but only briefly (see _cache_ttl)
+publication_cache = TieredCache(
+    LRUCache(max_entries=settings.pub_cache_size, ttl=settings.pub_cache_ttl),
+    SQLiteCache(os.path.join(settings.pub_cache_dir, "publications.sqlite"), ttl=settings.pub_cache_ttl)
+    if settings.pub_cache_dir
+    else create_shared_cache("publications", ttl=settings.pub_cache_ttl),
+)
+
+
+def normalize_pub_id(pub: str) -> str:
+    """Normalize a publication ID for use as a cache key, e.g. " pmid:123" -> "PMID:123",
+    "ISBN-13:978-0721606156" -> "ISBN:9780721606156".
+    """
+    prefix, _, local = pub.strip().partition(":")
+    prefix = prefix.strip().upper()
+    local = local.strip()
+    if prefix.startswith("ISBN"):
+        prefix = "ISBN"
+        local = re.sub(r"[^0-9X]", "", local.upper())
+    return f"{prefix}:{local}"
+
+
+class _EfetchService(eutils.QueryService):
+    """eutils QueryService sending efetch requests through httpx with a timeout.
+    eutils' own requests have none, so a hung NCBI connection would block the lookup thread, and every
+    lookup waiting for the client behind it, for good.
+    """
+
+    def __init__(self, url: str, timeout: float, api_key: Optional[str] = None):
+        super().__init__(api_key=api_key)
+        self.url = url
+        self._http = httpx.Client(timeout=timeout)
+        self._last_request = 0.0
+
+    def efetch(self, args: dict) -> bytes:
+        delay = self.request_interval - (time.monotonic() - self._last_request)
+        if delay > 0:
+            time.sleep(delay)
+        try:
+            response = self._http.post(
+                f"{self.url}/efetch.fcgi",
+                params={"api_key": self.api_key} if self.api_key else None,
+                data={"tool": self.tool, "email": self.email, **self.default_args, **args},
+            )
+        finally:
+            self._last_request = time.monotonic()
+        if response.is_error or b"<ERROR>" in response.content or b"<error>" in response.content:
+            raise eutils.EutilsRequestError(f"efetch failed ({response.status_code})")
+        return response.content
+
+
+def _get_eutils_client() -> eutils.Client:
+    global _eutils_client
+    if _eutils_client is None:
+        _eutils_client = eutils.Client(api_key = settings.ncbi_api_key)
+        _eutils_client._qs = _EfetchService(EUTILS_URL, settings.pub_lookup_timeout, api_key = settings.ncbi_api_key)
+    return _eutils_client
+
+
+def _is_pmid(pub: str) -> bool:
+    return re.match(r"^PMID:.+", pub) is not None
+
+
+def _pubmed_article_to_dict(pub: str, data) -> dict:
+    pmid = pub.split(':')[1]
+
+    authors = data.authors
+    author = None
+    if len(authors) == 1:
+        author = authors[0]
+    elif len(authors) > 1:
+        author = authors[0] + " et al."
+
+    return {
+        "id": pub,
+        "title": data.title,
+        "author(s)": author,
+        "year": data.year,
+        "journal": data.jrnl,
+        "url": f"https://pubmed.ncbi.nlm.nih.gov/{pmid}",
+        "status": "Success",
+    }
+
+
+def fetch_pubmed(pubs: List[str]) -> Dict[str, dict]:
+    """Fetch several PubMed publications (e.g. PMID:19204439) with a single multi-ID efetch request.
+    The response will be a dictionary mapping each publication ID to the same dictionary get_pub_info returns.
+    """
+
+    pmid_to_pubs: Dict[str, List[str]] = {}
+    for pub in pubs:
+        pmid_to_pubs.setdefault(pub.split(':')[1], []).append(pub)
+
+    logger.info("pubmed_lookup", ids=list(pmid_to_pubs))
+
+    results = {}
+    breaker = get_breaker(NCBI_HOST)
+    articles = []
+    efetch_ok = False
+    # behind other lookups, wait no longer than a lookup may take; the request itself times out too
+    if _eutils_lock.acquire(timeout=settings.pub_lookup_timeout):
+        try:
+            if breaker.allow():
+                with track_upstream("ncbi", "pubmed"):
+                    articles = list(_get_eutils_client().efetch(db='pubmed', id = ",".join(pmid_to_pubs)))
+                breaker.record(True)
+                efetch_ok = True
+        except:
+            breaker.record(False)
+        finally:
+            _eutils_lock.release()
+
+    for data in articles:
+        for pub in pmid_to_pubs.get(data.pmid, []):
+            try:
+                results[pub] = _pubmed_article_to_dict(pub, data)
+            except:
+                pass
+
+    # PMIDs missing from a successful efetch response are not in PubMed
+    returned_pmids = {data.pmid for data in articles}
+    for pmid, pmid_pubs in pmid_to_pubs.items():
+        not_found = efetch_ok and pmid not in returned_pmids
+        for pub in pmid_pubs:
+            if pub not in results:
+                results[pub] = {
+                    "id": pub,
+                    "status": (NOT_FOUND_STATUS if not_found else "Error fetching publication info for PMID ") + pmid,
+                }
+
+    return results
+
+
+def get_pub_info(pub: str) -> dict:
+    """Get publication information for a given publication ID.
+    The response will be a dictionary with entries for id, url, and title.
+    """
+
+    pub_dict = {"id": pub}
+
+    ## check the publication string is well-formatted, at least matching (ISBN|OMIM|PMID):[0-9]+
+    ## pub_dict with a status of "invalid" and return it
+    if not re.match(r"^(ISBN|OMIM|PMID):.+", pub):
+        pub_dict["status"] = "invalid"
+        return pub_dict
+
+    if pub.startswith("ISBN"):
+        logger.info("isbn_lookup", id=pub)
+
+        breaker = get_breaker(OPENLIBRARY_HOST)
+        if not breaker.allow():
+            pub_dict["status"] = "Error fetching publication info for ISBN " + pub
+            return pub_dict
+        canonical_isbn = canonical(pub.split(':')[1])
+        if not canonical_isbn:
+            pub_dict["status"] = "invalid"
+            return pub_dict
+        try:
+            with track_upstream("openlibrary", "isbn"):
+                data = meta(canonical_isbn)
+            breaker.record(True)
+        except:
+            breaker.record(False)
+            pub_dict["status"] = "Error fetching publication info for ISBN " + pub
+            return pub_dict
+
+        authors = data.get("Authors", [None])
+        author = None
+        if len(authors) == 1:
+            author = authors[0]
+        else:
+            author = authors[0] + " et al."
+
+        pub_dict.update({
+            "title": data.get("Title", None),
+            "author(s)": author,
+            "year": data.get("Year", None),
+            "publisher": data.get("Publisher", None),
+            "url": f"https://openlibrary.org/isbn/{canonical_isbn}"
+        })
+
+
+    elif pub.startswith("OMIM"):
+        pub_dict["url"] = f"https://www.omim.org/entry/{pub.split(':')[1]}"
+        pub_dict["title"] = "OMIM Record"
+
+
+    elif pub.startswith("PMID"):
+        return fetch_pubmed([pub])[pub]
+
+    pub_dict["status"] = "Success"
+    return pub_dict
+
+
+async def _run_lookup(fn: Callable[..., T], *args) -> T:
+    """Run a blocking lookup on the lookup threads, in the caller's context (as asyncio.to_thread would)."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_lookup_executor, functools.partial(contextvars.copy_context().run, fn, *args))
+
+
+def _lookup_semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    semaphore = _lookup_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(settings.pub_lookup_concurrency)
+        _lookup_semaphores[loop] = semaphore
+    return semaphore
+
+
+async def get_pub_info_async(pub: str) -> dict:
+    """Non-blocking version of get_pub_info.
+    Network lookups run on the lookup threads under a shared concurrency cap and a per-lookup timeout,
+    which their requests are sent with as well; a failed or timed-out lookup yields the usual dictionary
+    with an error "status".
+    """
+
+    ## OMIM and malformed IDs need no network access
+    if not pub.startswith(("PMID", "ISBN")):
+        return get_pub_info(pub)
+
+    async with _lookup_semaphore():
+        try:
+            return await asyncio.wait_for(_run_lookup(get_pub_info, pub), timeout=settings.pub_lookup_timeout)
+        except asyncio.TimeoutError:
+            UPSTREAM_TIMEOUTS.labels(*(("ncbi", "pubmed") if _is_pmid(pub) else ("openlibrary", "isbn"))).inc()
+            logger.warning("publication_lookup_timeout", id=pub, timeout=settings.pub_lookup_timeout)
+            return {"id": pub, "status": "Timed out fetching publication info for " + pub}
+        except Exception:
+            return {"id": pub, "status": "Error fetching publication info for " + pub}
+
+
+async def fetch_pubmed_async(pubs: List[str]) -> Dict[str, dict]:
+    """Non-blocking version of fetch_pubmed, with the same cap and timeout as get_pub_info_async."""
+
+    async with _lookup_semaphore():
+        try:
+            return await asyncio.wait_for(_run_lookup(fetch_pubmed, pubs), timeout=settings.pub_lookup_timeout)
+        except asyncio.TimeoutError:
+            UPSTREAM_TIMEOUTS.labels("ncbi", "pubmed").inc()
+            logger.warning("publication_lookup_timeout", ids=pubs, timeout=settings.pub_lookup_timeout)
+            return {pub: {"id": pub, "status": "Timed out fetching publication info for " + pub} for pub in pubs}
+        except Exception:
+            return {pub: {"id": pub, "status": "Error fetching publication info for " + pub} for pub in pubs}
+
+
+def _cache_ttl(pub_dict: dict) -> Optional[float]:
+    """How long to cache a lookup result: long when it succeeded, briefly when it failed for good (an invalid ID,
+    a PMID that PubMed does not have), and not at all when the failure may be transient (a timeout, an open
+    circuit, an upstream error), so that it does not outlive an upstream blip.
+    """
+    status = pub_dict.get("status", "")
+    if status == "Success":
+        return settings.pub_cache_ttl
+    if status == "invalid" or status.startswith(NOT_FOUND_STATUS):
+        return settings.pub_cache_negative_ttl
+    return None
+
+
+async def resolve_publications(pubs: Iterable[str]) -> Dict[str, dict]:
+    """Resolve many publication IDs concurrently.
+    PMIDs are de-duplicated and fetched in batches of settings.pubmed_batch_size per efetch request;
+    everything else is looked up individually.
+    Results are served from and stored in publication_cache.
+    Returns a dictionary mapping each distinct publication ID to its get_pub_info result.
+    """
+
+    unique_pubs = list(dict.fromkeys(pubs))
+
+    keys = {pub: normalize_pub_id(pub) for pub in unique_pubs}
+    cached = await publication_cache.get_many_async(set(keys.values()))
+    resolved = {pub: {**cached[key], "id": pub} for pub, key in keys.items() if key in cached}
+
+    missing = [pub for pub in unique_pubs if pub not in resolved]
+    pmids = [pub for pub in missing if _is_pmid(pub)]
+    others = [pub for pub in missing if not _is_pmid(pub)]
+
+    batch_size = settings.pubmed_batch_size
+    batches = [pmids[i:i + batch_size] for i in range(0, len(pmids), batch_size)]
+
+    with span("publications", ids=str(len(unique_pubs)), cached=str(len(resolved))):
+        batch_results, other_results = await asyncio.gather(
+            asyncio.gather(*(fetch_pubmed_async(batch) for batch in batches)),
+            asyncio.gather(*(get_pub_info_async(pub) for pub in others)),
+        )
+
+    fetched = dict(zip(others, other_results))
+    for batch_result in batch_results:
+        fetched.update(batch_result)
+
+    by_ttl: Dict[float, Dict[str, dict]] = {}
+    for pub, pub_dict in fetched.items():
+        ttl = _cache_ttl(pub_dict)
+        if ttl is not None:
+            by_ttl.setdefault(ttl, {})[keys[pub]] = pub_dict
+    for ttl, pub_dicts in by_ttl.items():
+        await publication_cache.set_many_async(pub_dicts, ttl=ttl)
+
+    resolved.update(fetched)
+    return {pub: resolved[pub] for pub in unique_pubs}
+
+
+async def publication_info(pubs: Iterable[str], include_publications: str = "full") -> Dict[str, dict]:
+    """The publications of an association response, as include_publications asks: with "full" resolved
+    as by resolve_publications, with "ids" only their IDs ({"id": pub}, without any lookup), and with
+    "none" not at all (an empty dictionary).
+    """
+    if include_publications == "full":
+        return await resolve_publications(pubs)
+    if include_publications == "ids":
+        return {pub: {"id": pub} for pub in pubs}
+    return {}
+
+
+@router.get(
+    "/publications",
+    response_model=List[Dict[str, Optional[str]]],
+    description="Get information about publications (title, authors, year, journal or publisher and url) by their identifiers, e.g. as returned by the association endpoints with include_publications=ids",
+    summary="Get information about publications by their identifiers",
+    response_description="A list of publications, in the order of the identifiers, each with a status of Success or an error",
+    operation_id="get_publications",
+)
+async def get_publications(
+    ids: List[str] = Query(
+        ..., description="List of publication identifiers (PMID, ISBN or OMIM).", example=["PMID:19204439"]
+    ),
+) -> List[Dict[str, Optional[str]]]:
+    if len(ids) > settings.max_publication_ids:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"At most {settings.max_publication_ids} publications can be looked up at once.",
+        )
+    return list((await resolve_publications(ids)).values())
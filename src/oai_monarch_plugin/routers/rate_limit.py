@@ -0,0 +1,101 @@
+"""Admission control for incoming requests, used by RateLimitMiddleware.
+
+TokenBuckets limits the request rate of each conversation, so a single runaway conversation can't
+starve the others, and AdmissionControl caps the number of requests served at once, queueing a
+bounded number of further requests for a slot. Both take O(1) time per request.
+"""
+import asyncio
+import time
+import weakref
+from collections import OrderedDict
+from typing import Tuple
+
+
+class TokenBuckets:
+    """Token buckets refilled at `rate` tokens per second up to `burst`, one per key.
+
+    Buckets are kept in least recently used order. A bucket left idle for burst / rate seconds is
+    full again, so it is indistinguishable from a new one and is dropped; at most max_keys buckets
+    are kept in any case, evicting the least recently used.
+    """
+
+    def __init__(self, rate: float, burst: int, max_keys: int):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._refill_time = burst / rate
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def take(self, key: str, cost: float = 1) -> float:
+        """Take `cost` tokens from the key's bucket, returning 0 if it had them, or else the number of
+        seconds until it will (no token is taken then). A cost above burst takes a full bucket.
+        """
+        now = time.monotonic()
+        self._expire(now)
+
+        cost = min(cost, self.burst)
+        bucket = self._buckets.pop(key, None)
+        tokens = self.burst if bucket is None else min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        wait = 0.0
+        if tokens >= cost:
+            tokens -= cost
+        else:
+            wait = (cost - tokens) / self.rate
+        self._buckets[key] = (tokens, now)
+        return wait
+
+    def _expire(self, now: float) -> None:
+        while self._buckets:
+            key, (_, last) = next(iter(self._buckets.items()))
+            if now - last < self._refill_time and len(self._buckets) < self.max_keys:
+                return
+            del self._buckets[key]
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class AdmissionControl:
+    """Caps the number of requests in flight at max_in_flight.
+
+    Requests beyond the cap wait for a slot, up to max_queued of them and for at most queue_timeout
+    seconds each; acquire() returns False for requests that are not admitted.
+    """
+
+    def __init__(self, max_in_flight: int, max_queued: int, queue_timeout: float):
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.queued = 0
+        # asyncio primitives are bound to the event loop they're used from
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_in_flight)
+            self._semaphores[loop] = semaphore
+        return semaphore
+
+    async def acquire(self) -> bool:
+        semaphore = self._semaphore()
+        if not semaphore.locked():
+            await semaphore.acquire()
+            return True
+        if self.queued >= self.max_queued:
+            return False
+
+        self.queued += 1
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=self.queue_timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.queued -= 1
+
+    def release(self) -> None:
+        self._semaphore().release()
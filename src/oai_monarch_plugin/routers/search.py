@@ -1,13 +1,13 @@
+import asyncio
 from typing import List, Optional
 
-import httpx
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Depends, Query
 from pydantic import BaseModel, Field
 from loguru import logger
 
-from .config import settings
-
-BASE_API_URL = settings.monarch_api_url
+from .backends import MonarchBackend, provide_backend
+from .search_index import get_search_index
+from .utils import model_response
 
 router = APIRouter()
 
@@ -54,23 +54,14 @@ async def search_entity(
     ),
     limit: Optional[int] = Query(10, description="The maximum number of search results to return."),
     offset: Optional[int] = Query(0, description="Offset for pagination of results"),
+    backend: MonarchBackend = Depends(provide_backend),
 ) -> SearchResultItems:
-    api_url = f"{BASE_API_URL}/search"
-
-    params = {"q": term, "category": category, "limit": limit, "offset": offset}
-
-    async with httpx.AsyncClient() as client:
-        logger.info({
-            "event": "monarch_api_call",
-            "url": str(client.build_request("GET", api_url, params=params).url),
-            "params": params,
-            "api_url": api_url,
-            "method": "GET"
-        })
-
-        response = await client.get(api_url, params=params)
-
-    response_json = response.json()
+    index = get_search_index()
+    if index is not None:
+        # merging postings can take tens of milliseconds, which must not hold up the event loop
+        response_json = await asyncio.to_thread(index.search, term, category, limit, offset)
+    else:
+        response_json = await backend.search(term, category, limit, offset)
 
     search_results = []
     for item in response_json.get("items", []):
@@ -83,4 +74,4 @@ async def search_entity(
             )
         )
 
-    return SearchResultItems(results=search_results, total=response_json.get("total", 0))
+    return model_response(SearchResultItems(results=search_results, total=response_json.get("total", 0)))
@@ -0,0 +1,315 @@
+"""Local label and synonym search index, serving /search without a round trip to Monarch.
+
+build_search_index writes the index from the nodes of a KG snapshot (see backends.build_snapshot)
+into a single file that SearchIndex memory-maps, so that loading it in a worker takes no time
+and the pages are shared between the workers of a host. The file holds, in native byte order:
+- the vocabulary, the sorted distinct tokens of all names and synonyms; being sorted, the
+  tokens starting with a given prefix are a contiguous range found by binary search;
+- for each token, its postings: the documents containing it, each with its precomputed BM25
+  impact, the name and synonym fields weighted as in the snapshot's full text search;
+- for each document, its name length, and its id, name and description. Documents are numbered
+  by category, so that each category is a range of document numbers, and a category filter
+  a binary search in each postings list.
+
+Like the snapshot's full text search, every token of a query must match, as a prefix, a token
+of the name or of a synonym; tokens shorter than MIN_PREFIX_LENGTH must match a whole token, as
+they would otherwise expand to much of the vocabulary. Results are ranked by the sum of the
+impacts of their tokens, then by the length of their name.
+"""
+import bisect
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import sqlite3
+import struct
+import sys
+import unicodedata
+from array import array
+from collections import Counter
+from itertools import compress
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from .config import settings
+
+MAGIC = b"OMSI"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sII")  # magic, format version, length of the JSON metadata that follows
+
+# BM25 parameters, and the weights of the fields (as bm25(nodes_fts, 10.0, 1.0) in the snapshot backend)
+K1 = 1.2
+B = 0.75
+NAME_WEIGHT = 10.0
+SYNONYM_WEIGHT = 1.0
+
+# a prefix matching more tokens than this only expands to the most frequent of them
+MAX_PREFIX_EXPANSIONS = 256
+# query tokens shorter than this only match whole tokens
+MIN_PREFIX_LENGTH = 3
+
+# separates the id, name and description of a document
+FIELD_SEPARATOR = "\x1f"
+
+# (name, array typecode) of the sections of the file, in order
+SECTIONS = [
+    ("term_offsets", "Q"),
+    ("terms", "B"),
+    ("postings_indptr", "Q"),
+    ("postings_docs", "I"),
+    ("postings_impacts", "f"),
+    ("doc_name_lengths", "H"),
+    ("doc_offsets", "Q"),
+    ("docs", "B"),
+]
+
+_index: Optional["SearchIndex"] = None
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lowercased words of text, with accents removed."""
+    if not text:
+        return []
+    text = "".join(c for c in unicodedata.normalize("NFKD", text.lower()) if not unicodedata.combining(c))
+    return re.findall(r"\w+", text)
+
+
+def _field_score(tf: int, length: int, average_length: float) -> float:
+    return tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / average_length)) if tf else 0.0
+
+
+def build_search_index(snapshot_path: str, index_path: str) -> None:
+    """Build the search index of the nodes of a KG snapshot. Like build_snapshot, the index is
+    written next to index_path and moved into place once complete.
+    """
+    conn = sqlite3.connect(f"file:{snapshot_path}?mode=ro", uri=True)
+
+    def documents():
+        for id, category, name, description, synonym in conn.execute(
+            "SELECT id, category, name, description, synonym FROM nodes ORDER BY category, rowid"
+        ):
+            synonyms = json.loads(synonym) if synonym else []
+            if name or synonyms:
+                yield id, category, name or "", description or "", tokenize(name), tokenize(" ".join(synonyms))
+
+    # first pass: document frequencies and average field lengths
+    logger.info("search_index_build", step="statistics", path=snapshot_path)
+    document_frequencies: Counter = Counter()
+    count = name_total = synonym_total = 0
+    for _, _, _, _, name_tokens, synonym_tokens in documents():
+        document_frequencies.update(set(name_tokens) | set(synonym_tokens))
+        count += 1
+        name_total += len(name_tokens)
+        synonym_total += len(synonym_tokens)
+    average_name = max(name_total / max(count, 1), 1.0)
+    average_synonym = max(synonym_total / max(count, 1), 1.0)
+    vocabulary = sorted(document_frequencies)
+    token_index = {token: i for i, token in enumerate(vocabulary)}
+    idf = [
+        math.log(1 + (count - document_frequencies[token] + 0.5) / (document_frequencies[token] + 0.5))
+        for token in vocabulary
+    ]
+
+    # second pass: postings, and the documents themselves
+    logger.info("search_index_build", step="postings", tokens=len(vocabulary), documents=count)
+    postings_docs: List[array] = [array("I") for _ in vocabulary]
+    postings_impacts: List[array] = [array("f") for _ in vocabulary]
+    category_starts: Dict[str, int] = {}
+    doc_name_lengths, doc_offsets = array("H"), array("Q", [0])
+    docs = bytearray()
+    for doc, (id, category, name, description, name_tokens, synonym_tokens) in enumerate(documents()):
+        name_counts, synonym_counts = Counter(name_tokens), Counter(synonym_tokens)
+        for token in name_counts.keys() | synonym_counts.keys():
+            i = token_index[token]
+            postings_docs[i].append(doc)
+            postings_impacts[i].append(idf[i] * (
+                NAME_WEIGHT * _field_score(name_counts[token], len(name_tokens), average_name)
+                + SYNONYM_WEIGHT * _field_score(synonym_counts[token], len(synonym_tokens), average_synonym)
+            ))
+        category_starts.setdefault(category or "", doc)
+        doc_name_lengths.append(min(len(name), 0xFFFF))
+        docs += FIELD_SEPARATOR.join((id, name, description)).encode("utf-8")
+        doc_offsets.append(len(docs))
+    conn.close()
+
+    terms = bytearray()
+    term_offsets = array("Q", [0])
+    for token in vocabulary:
+        terms += token.encode("utf-8")
+        term_offsets.append(len(terms))
+    postings_indptr = array("Q", [0])
+    for docs_of_token in postings_docs:
+        postings_indptr.append(postings_indptr[-1] + len(docs_of_token))
+
+    sections = {
+        "term_offsets": term_offsets.tobytes(),
+        "terms": bytes(terms),
+        "postings_indptr": postings_indptr.tobytes(),
+        "postings_docs": b"".join(p.tobytes() for p in postings_docs),
+        "postings_impacts": b"".join(p.tobytes() for p in postings_impacts),
+        "doc_name_lengths": doc_name_lengths.tobytes(),
+        "doc_offsets": doc_offsets.tobytes(),
+        "docs": bytes(docs),
+    }
+    meta = {
+        "byteorder": sys.byteorder,
+        "documents": count,
+        "tokens": len(vocabulary),
+        "categories": list(category_starts.items()),
+        "sections": {},
+    }
+    # sections start at multiples of 8 bytes after the header, which is padded to a multiple of 8 too
+    offset = 0
+    for name, _ in SECTIONS:
+        meta["sections"][name] = [offset, len(sections[name])]
+        offset += -(-len(sections[name]) // 8) * 8
+    meta_bytes = json.dumps(meta).encode("utf-8")
+    meta_bytes += b" " * (-(HEADER.size + len(meta_bytes)) % 8)
+
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(meta_bytes)))
+        f.write(meta_bytes)
+        for name, _ in SECTIONS:
+            f.write(sections[name])
+            f.write(b"\0" * (-len(sections[name]) % 8))
+    os.replace(tmp_path, index_path)
+    logger.info("search_index_build", step="done", path=index_path)
+
+
+class _Terms:
+    """The sorted vocabulary as a sequence of str, for bisect."""
+
+    def __init__(self, offsets: memoryview, blob: memoryview):
+        self._offsets = offsets
+        self._blob = blob
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return bytes(self._blob[self._offsets[i]:self._offsets[i + 1]]).decode("utf-8")
+
+
+class SearchIndex:
+    """A memory-mapped search index written by build_search_index."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, meta_length = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} search index, rebuild it with build-search-index")
+        meta = json.loads(self._mmap[HEADER.size:HEADER.size + meta_length])
+        if meta["byteorder"] != sys.byteorder:
+            raise ValueError(f"{path} was built on a {meta['byteorder']}-endian machine, rebuild it with build-search-index")
+
+        self._data = memoryview(self._mmap)[HEADER.size + meta_length:]
+        for name, typecode in SECTIONS:
+            start, length = meta["sections"][name]
+            setattr(self, "_" + name, self._data[start:start + length].cast(typecode))
+        self.documents = meta["documents"]
+        # the range of document numbers of each category
+        starts = [start for _, start in meta["categories"]] + [self.documents]
+        self.categories = {category: (start, end) for (category, start), end in zip(meta["categories"], starts[1:])}
+        self._category_names = [category for category, _ in meta["categories"]]
+        self._category_starts = starts[:-1]
+        self._vocabulary = _Terms(self._term_offsets, self._terms)
+
+    def _postings(self, token: int, documents: Tuple[int, int]) -> Tuple[List[int], List[float]]:
+        """The postings of a token within a range of document numbers."""
+        start, end = self._postings_indptr[token], self._postings_indptr[token + 1]
+        docs = self._postings_docs
+        if documents != (0, self.documents):
+            start, end = bisect.bisect_left(docs, documents[0], start, end), bisect.bisect_left(docs, documents[1], start, end)
+        return docs[start:end].tolist(), self._postings_impacts[start:end].tolist()
+
+    def _matches(self, prefix: str, documents: Tuple[int, int]) -> Dict[int, float]:
+        """The documents in a range with a token starting with prefix, with the impact of their best such token."""
+        lo = bisect.bisect_left(self._vocabulary, prefix)
+        if len(prefix) < MIN_PREFIX_LENGTH:
+            hi = lo + 1 if lo < len(self._vocabulary) and self._vocabulary[lo] == prefix else lo
+        else:
+            hi = bisect.bisect_left(self._vocabulary, prefix[:-1] + chr(ord(prefix[-1]) + 1), lo)
+        tokens = range(lo, hi)
+        if len(tokens) > MAX_PREFIX_EXPANSIONS:
+            indptr = self._postings_indptr
+            tokens = heapq.nlargest(MAX_PREFIX_EXPANSIONS, tokens, key=lambda t: indptr[t + 1] - indptr[t])
+        # the longest postings list is taken as a whole, the others merged into it
+        postings = sorted((self._postings(token, documents) for token in tokens), key=lambda p: len(p[0]), reverse=True)
+        if not postings:
+            return {}
+        matches: Dict[int, float] = dict(zip(*postings[0]))
+        get = matches.get
+        for docs, impacts in postings[1:]:
+            for doc, impact in zip(docs, impacts):
+                if impact > get(doc, 0.0):
+                    matches[doc] = impact
+        return matches
+
+    def _document(self, doc: int) -> Dict[str, Optional[str]]:
+        raw = bytes(self._docs[self._doc_offsets[doc]:self._doc_offsets[doc + 1]]).decode("utf-8")
+        id, name, description = raw.split(FIELD_SEPARATOR)
+        return {"id": id, "name": name, "description": description or None}
+
+    def _category(self, doc: int) -> Optional[str]:
+        return self._category_names[bisect.bisect_right(self._category_starts, doc) - 1] or None
+
+    def search(self, term: str, category: Optional[str], limit: int, offset: int) -> dict:
+        """Search names and synonyms, in the shape of the Monarch API /search response.
+        CPU-bound, so async code runs it in a worker thread.
+        """
+        empty = {"limit": limit, "offset": offset, "total": 0, "items": []}
+        tokens = list(dict.fromkeys(tokenize(term)))
+        if not tokens or (category and category not in self.categories):
+            return empty
+
+        # intersect the matches of each token, the most selective first
+        documents = self.categories[category] if category else (0, self.documents)
+        scores: Optional[Dict[int, float]] = None
+        for matches in sorted((self._matches(token, documents) for token in tokens), key=len):
+            if scores is None:
+                scores = matches
+            else:
+                scores = {doc: score + matches[doc] for doc, score in scores.items() if doc in matches}
+            if not scores:
+                return empty
+
+        # only documents scoring at least the k-th best score can make the page, which leaves few to sort
+        candidates = scores
+        if len(scores) > offset + limit:
+            threshold = heapq.nlargest(offset + limit, scores.values())[-1]
+            candidates = list(compress(scores, map(threshold.__le__, scores.values())))
+        name_lengths = self._doc_name_lengths
+        top = sorted(candidates, key=lambda doc: (-scores[doc], name_lengths[doc], doc))[offset:offset + limit]
+        items = [{**self._document(doc), "category": self._category(doc)} for doc in top]
+        return {"limit": limit, "offset": offset, "total": len(scores), "items": items}
+
+    def close(self) -> None:
+        for name, _ in SECTIONS:
+            getattr(self, "_" + name).release()
+        self._data.release()
+        self._mmap.close()
+
+
+def load_search_index() -> Optional[SearchIndex]:
+    """Open the index at settings.search_index_path, if set, and make it the one get_search_index returns."""
+    global _index
+    if not settings.search_index_path:
+        return None
+    _index = SearchIndex(settings.search_index_path)
+    logger.info("search_index_loaded", path=_index.path, documents=_index.documents)
+    return _index
+
+
+def get_search_index() -> Optional[SearchIndex]:
+    return _index
+
+
+def set_search_index(index: Optional[SearchIndex]) -> None:
+    global _index
+    _index = index
@@ -0,0 +1,263 @@
+"""Local phenotype similarity search, serving /phenotype-profile-search.
+
+PhenotypeSimilarity is built from the HPO subclass hierarchy and the disease and gene phenotype
+annotations of a KG snapshot (see backends.build_snapshot), and holds them as NumPy arrays:
+- the information content (IC) of each HPO term, -log2 of the fraction of annotated entities
+  annotated with the term or one of its descendants;
+- the ancestor closure of each term (the term included), in CSR form;
+- the phenotype profile of each disease and gene, in CSR form.
+
+A query profile is scored against every entity at once, phenodigm style: two terms are as similar
+as the geometric mean of the Jaccard index of their ancestor sets and the IC of their most
+informative common ancestor. An entity's score averages its best-match average similarity (in both
+directions) and its highest common-ancestor IC, each relative to the query matched against itself,
+on a scale of 0 to 100.
+"""
+import math
+import sqlite3
+from typing import Dict, List, Optional, Sequence
+
+from loguru import logger
+
+from .config import settings
+
+try:
+    import numpy as np
+except ImportError:  # optional, only needed for the similarity search
+    np = None
+
+SUBCLASS_PREDICATE = "biolink:subclass_of"
+ANNOTATION_CATEGORIES = (
+    "biolink:DiseaseToPhenotypicFeatureAssociation",
+    "biolink:GeneToPhenotypicFeatureAssociation",
+)
+
+_engine: Optional["PhenotypeSimilarity"] = None
+
+
+class PhenotypeSimilarity:
+    """In-memory phenodigm-style similarity between phenotype profiles and every annotated entity."""
+
+    def __init__(
+        self,
+        parents: Dict[str, List[str]],
+        annotations: Dict[str, List[str]],
+        entities: Dict[str, dict],
+    ):
+        """`parents` maps HPO terms to their direct superclasses, `annotations` diseases and genes to
+        their phenotypes, and `entities` diseases and genes to their "label", "type" and "taxon" (a dict
+        with id and label).
+        """
+        if np is None:
+            raise RuntimeError("numpy is required for the phenotype similarity search")
+
+        self.terms = sorted(
+            set(parents) | {p for ps in parents.values() for p in ps} | {t for ts in annotations.values() for t in ts}
+        )
+        self.term_index = {term: i for i, term in enumerate(self.terms)}
+        n = len(self.terms)
+
+        # ancestor closure (CSR)
+        closure = self._closure([[self.term_index[p] for p in parents.get(term, [])] for term in self.terms])
+        self.anc_counts = np.array([len(ancestors) for ancestors in closure], dtype=np.int32)
+        self.anc_indptr = np.concatenate(([0], np.cumsum(self.anc_counts))).astype(np.int64)
+        self.anc_indices = np.concatenate(closure).astype(np.int32) if n else np.zeros(0, dtype=np.int32)
+
+        # phenotype profiles (CSR) of the entities with at least one phenotype
+        self.entity_ids = sorted(id for id, terms in annotations.items() if terms)
+        self.entity_index = {id: i for i, id in enumerate(self.entity_ids)}
+        profiles = [np.unique([self.term_index[t] for t in annotations[id]]).astype(np.int32) for id in self.entity_ids]
+        self.profile_counts = np.array([len(profile) for profile in profiles], dtype=np.int32)
+        self.profile_indptr = np.concatenate(([0], np.cumsum(self.profile_counts))).astype(np.int64)
+        self.profile_indices = np.concatenate(profiles) if profiles else np.zeros(0, dtype=np.int32)
+        self.entities = [entities.get(id, {}) for id in self.entity_ids]
+
+        # the terms used in some profile, with their ancestors concatenated: query terms are only
+        # ever compared to these, and profiles point into them
+        self.annotated_terms = np.unique(self.profile_indices).astype(np.int32)
+        self.profile_positions = np.searchsorted(self.annotated_terms, self.profile_indices).astype(np.int32)
+        self.annotated_ancestors = (
+            np.concatenate([self._ancestors(t) for t in self.annotated_terms])
+            if len(self.annotated_terms) else np.zeros(0, dtype=np.int32)
+        )
+        self.annotated_ancestor_starts = np.concatenate(([0], np.cumsum(self.anc_counts[self.annotated_terms])[:-1])).astype(np.int64)
+
+        # information content, from the number of entities annotated with each term or a descendant
+        annotated = np.zeros(n, dtype=np.int64)
+        for profile in profiles:
+            annotated[np.unique(np.concatenate([self._ancestors(t) for t in profile]))] += 1
+        total = max(len(profiles), 1)
+        self.max_ic = math.log2(total)
+        self.ic = np.where(annotated > 0, -np.log2(np.maximum(annotated, 1) / total), self.max_ic).astype(np.float32)
+
+    @staticmethod
+    def _closure(parent_indices: List[List[int]]) -> List["np.ndarray"]:
+        # iterative depth-first traversal; an edge closing a cycle is ignored
+        n = len(parent_indices)
+        closure: List[Optional["np.ndarray"]] = [None] * n
+        state = [0] * n  # 0 unvisited, 1 in progress, 2 done
+        for start in range(n):
+            stack = [start]
+            while stack:
+                j = stack[-1]
+                if state[j] == 2:
+                    stack.pop()
+                    continue
+                state[j] = 1
+                pending = [p for p in parent_indices[j] if state[p] == 0]
+                if pending:
+                    stack.extend(pending)
+                    continue
+                closure[j] = np.unique(np.concatenate(
+                    [np.array([j], dtype=np.int32)] + [closure[p] for p in parent_indices[j] if state[p] == 2]
+                )).astype(np.int32)
+                state[j] = 2
+                stack.pop()
+        return closure
+
+    def _ancestors(self, term: int) -> "np.ndarray":
+        return self.anc_indices[self.anc_indptr[term]:self.anc_indptr[term + 1]]
+
+    def profile(self, ids: Sequence[str]) -> List[str]:
+        """The phenotype profile of a query: HPO terms as given, diseases and genes replaced by their phenotypes.
+        Unknown ids are left out.
+        """
+        terms = []
+        for id in ids:
+            if id in self.term_index:
+                terms.append(id)
+            elif id in self.entity_index:
+                i = self.entity_index[id]
+                terms.extend(self.terms[t] for t in self.profile_indices[self.profile_indptr[i]:self.profile_indptr[i + 1]])
+        return list(dict.fromkeys(terms))
+
+    def search(self, profile: Sequence[str], limit: int, exclude: Sequence[str] = ()) -> List[dict]:
+        """Score a phenotype profile against every entity, and return the `limit` best matches (leaving
+        out those in `exclude`) as dicts with the fields of MatchItem.
+        """
+        query = np.array(sorted({self.term_index[t] for t in profile if t in self.term_index}), dtype=np.int32)
+        if len(query) == 0 or len(self.entity_ids) == 0:
+            return []
+
+        # for each query term, its similarity to every annotated term: count the ancestors the two
+        # share and take the highest IC among them, with reductions over the concatenated ancestors
+        # of the annotated terms. Then the best match within each entity's profile (forward), and
+        # the best match of each annotated term to any query term (reverse), and best common IC.
+        starts = self.profile_indptr[:-1]
+        ancestor_starts = self.annotated_ancestor_starts
+        annotated_counts = self.anc_counts[self.annotated_terms]
+        forward = np.zeros(len(self.entity_ids), dtype=np.float32)
+        best_similarity = np.zeros(len(self.annotated_terms), dtype=np.float32)
+        best_mica = np.zeros(len(self.annotated_terms), dtype=np.float32)
+        shared_ic = np.empty(len(self.terms), dtype=np.float32)
+        shared = np.empty(len(self.terms), dtype=np.float32)
+        for term in query:
+            ancestors = self._ancestors(term)
+            shared[:] = 0
+            shared[ancestors] = 1
+            shared_ic[:] = 0
+            shared_ic[ancestors] = self.ic[ancestors]
+            common = np.add.reduceat(shared[self.annotated_ancestors], ancestor_starts)
+            mica = np.maximum.reduceat(shared_ic[self.annotated_ancestors], ancestor_starts)
+            similarity = np.sqrt(common / (len(ancestors) + annotated_counts - common) * mica)
+            forward += np.maximum.reduceat(similarity[self.profile_positions], starts)
+            np.maximum(best_similarity, similarity, out=best_similarity)
+            np.maximum(best_mica, mica, out=best_mica)
+        forward /= len(query)
+        reverse = np.add.reduceat(best_similarity[self.profile_positions], starts) / self.profile_counts
+        best_ic = np.maximum.reduceat(best_mica[self.profile_positions], starts)
+
+        # relative to the query matched against itself, where each term's similarity is sqrt(IC)
+        optimal_average = float(np.sqrt(self.ic[query]).mean())
+        optimal_ic = float(self.ic[query].max())
+        scores = (
+            ((forward + reverse) / 2 / optimal_average if optimal_average > 0 else 0)
+            + (best_ic / optimal_ic if optimal_ic > 0 else 0)
+        ) * 50
+        for id in exclude:
+            if id in self.entity_index:
+                scores[self.entity_index[id]] = -1
+
+        limit = min(limit, len(scores))
+        top = np.argpartition(-scores, limit - 1)[:limit] if limit > 0 else np.zeros(0, dtype=np.int64)
+        top = [i for i in top[np.argsort(-scores[top], kind="stable")] if scores[i] >= 0]
+        return [
+            {
+                "rank": str(rank),
+                "score": int(round(float(scores[i]))),
+                "type": self.entities[i].get("type", ""),
+                "taxon": self.entities[i].get("taxon", {}),
+                "id": self.entity_ids[i],
+                "label": self.entities[i].get("label") or self.entity_ids[i],
+            }
+            for rank, i in enumerate(top, start=1)
+        ]
+
+    @classmethod
+    def from_snapshot(cls, path: str) -> "PhenotypeSimilarity":
+        """Build the engine from the HPO hierarchy and phenotype annotations of a KG snapshot."""
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            parents: Dict[str, List[str]] = {}
+            for subject, object in conn.execute(
+                "SELECT subject, object FROM edges WHERE predicate = ? AND subject LIKE 'HP:%' AND object LIKE 'HP:%'",
+                (SUBCLASS_PREDICATE,),
+            ):
+                parents.setdefault(subject, []).append(object)
+
+            annotations: Dict[str, List[str]] = {}
+            for subject, object in conn.execute(
+                "SELECT subject, object FROM edges WHERE category IN (?, ?)", ANNOTATION_CATEGORIES
+            ):
+                annotations.setdefault(subject, []).append(object)
+
+            entities = {
+                id: {
+                    "label": name,
+                    "type": _entity_type(category),
+                    "taxon": {"id": taxon, "label": taxon_label} if taxon else {},
+                }
+                for id, name, category, taxon, taxon_label in conn.execute(
+                    "SELECT n.id, n.name, n.category, n.in_taxon, t.name FROM nodes AS n "
+                    "LEFT JOIN nodes AS t ON t.id = n.in_taxon "
+                    "WHERE n.id IN (SELECT subject FROM edges WHERE category IN (?, ?))",
+                    ANNOTATION_CATEGORIES,
+                )
+            }
+        finally:
+            conn.close()
+        return cls(parents, annotations, entities)
+
+
+def _entity_type(category: Optional[str]) -> str:
+    return (category or "").replace("biolink:", "").lower()
+
+
+def load_similarity_engine() -> Optional[PhenotypeSimilarity]:
+    """Build the engine from settings.similarity_snapshot_path, if set, and make it the one get_similarity_engine returns."""
+    global _engine
+    if not settings.similarity_snapshot_path:
+        return None
+    if np is None:
+        logger.warning(
+            "similarity_unavailable",
+            message="SIMILARITY_SNAPSHOT_PATH is set but numpy is not installed, /phenotype-profile-search is disabled",
+        )
+        return None
+    _engine = PhenotypeSimilarity.from_snapshot(settings.similarity_snapshot_path)
+    logger.info(
+        "similarity_loaded",
+        terms=len(_engine.terms),
+        entities=len(_engine.entity_ids),
+        annotations=int(len(_engine.profile_indices)),
+    )
+    return _engine
+
+
+def get_similarity_engine() -> Optional[PhenotypeSimilarity]:
+    return _engine
+
+
+def set_similarity_engine(engine: Optional[PhenotypeSimilarity]) -> None:
+    global _engine
+    _engine = engine
@@ -0,0 +1,193 @@
+"""Lightweight per-request tracing.
+
+With settings.tracing enabled, LoggingMiddleware starts a Trace for every request, and span()
+records the time spent in each upstream call and enrichment step (association queries,
+publication lookups, model building) into it, including from tasks and worker threads spawned
+by the request. The finished trace is returned to the client as a Server-Timing header, logged as
+a single "request_trace" line and, with settings.otel_tracing, exported through OpenTelemetry.
+
+With tracing disabled, span() is a context variable lookup returning a shared no-op context manager.
+"""
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+from loguru import logger
+
+from .config import settings
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # optional, only needed for settings.otel_tracing
+    otel_trace = None
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+_NO_SPAN = nullcontext()
+
+_otel_tracer = None
+_otel_unavailable = False
+
+
+class Span:
+    __slots__ = ("name", "attributes", "parent", "start", "end")
+
+    def __init__(self, name: str, attributes: Dict[str, str], parent: Optional["Span"]):
+        self.name = name
+        self.attributes = attributes
+        self.parent = parent
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.perf_counter()) - self.start
+
+
+class Trace:
+    """The spans recorded while serving one request."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.start_ns = time.time_ns()
+        self.end: Optional[float] = None
+        self.spans: List[Span] = []
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.perf_counter()) - self.start
+
+    def server_timing(self) -> str:
+        """Format the trace as a Server-Timing header value.
+        Spans with the same name (e.g. one per upstream call) are summed into one metric.
+        """
+        totals: Dict[str, List[float]] = {}
+        for span in self.spans:
+            total = totals.setdefault(span.name, [0.0, 0])
+            total[0] += span.duration
+            total[1] += 1
+
+        metrics = [
+            f'{name};dur={duration * 1000:.1f}' + (f';desc="{count} calls"' if count > 1 else "")
+            for name, (duration, count) in totals.items()
+        ]
+        metrics.append(f"total;dur={self.duration * 1000:.1f}")
+        return ", ".join(metrics)
+
+    def to_log(self) -> List[dict]:
+        return [
+            {
+                "name": span.name,
+                "start_ms": round((span.start - self.start) * 1000, 1),
+                "duration_ms": round(span.duration * 1000, 1),
+                **span.attributes,
+            }
+            for span in self.spans
+        ]
+
+
+@contextmanager
+def request_trace() -> Iterator[Optional[Trace]]:
+    """Trace the request served within the block, yielding its Trace, or None if tracing is disabled."""
+    if not settings.tracing:
+        yield None
+        return
+    trace = Trace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def span(name: str, **attributes: str):
+    """Context manager recording a span named `name` in the current request's trace, if any."""
+    trace = _current_trace.get()
+    if trace is None:
+        return _NO_SPAN
+    return _record_span(trace, name, attributes)
+
+
+@contextmanager
+def _record_span(trace: Trace, name: str, attributes: Dict[str, str]) -> Iterator[Span]:
+    recorded = Span(name, attributes, _current_span.get())
+    trace.spans.append(recorded)
+    token = _current_span.set(recorded)
+    try:
+        yield recorded
+    finally:
+        recorded.end = time.perf_counter()
+        _current_span.reset(token)
+
+
+def finish_trace(trace: Trace, request_attributes: Dict[str, Any]) -> None:
+    """Log the finished trace, and export it through OpenTelemetry if enabled."""
+    trace.end = time.perf_counter()
+    logger.info(
+        "request_trace",
+        **request_attributes,
+        duration_ms=round(trace.duration * 1000, 1),
+        spans=trace.to_log(),
+    )
+    if settings.otel_tracing:
+        _export(trace, request_attributes)
+
+
+def _get_otel_tracer():
+    global _otel_tracer, _otel_unavailable
+    if _otel_tracer is None and not _otel_unavailable:
+        if otel_trace is None:
+            logger.warning(
+                "otel_unavailable",
+                message="OTEL_TRACING is set but opentelemetry is not installed, traces are only logged",
+            )
+            _otel_unavailable = True
+            return None
+        _configure_otel_provider()
+        _otel_tracer = otel_trace.get_tracer("oai_monarch_plugin")
+    return _otel_tracer
+
+
+def _configure_otel_provider() -> None:
+    # keep a provider configured elsewhere (e.g. by opentelemetry-instrument), otherwise export
+    # over OTLP, configured by the standard OTEL_EXPORTER_OTLP_* environment variables
+    if not isinstance(otel_trace.get_tracer_provider(), otel_trace.ProxyTracerProvider):
+        return
+    try:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError:
+        logger.warning(
+            "otel_exporter_unavailable",
+            message="opentelemetry-sdk and opentelemetry-exporter-otlp are needed to export traces",
+        )
+        return
+    provider = TracerProvider(resource=Resource.create({"service.name": "oai-monarch-plugin"}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    otel_trace.set_tracer_provider(provider)
+
+
+def _export(trace: Trace, request_attributes: Dict[str, Any]) -> None:
+    tracer = _get_otel_tracer()
+    if tracer is None:
+        return
+
+    def ns(t: float) -> int:
+        return trace.start_ns + int((t - trace.start) * 1e9)
+
+    root = tracer.start_span("request", start_time=trace.start_ns, attributes=request_attributes)
+    exported = {None: root}
+    for recorded in trace.spans:
+        parent = exported.get(recorded.parent, root)
+        exported[recorded] = tracer.start_span(
+            recorded.name,
+            context=otel_trace.set_span_in_context(parent),
+            start_time=ns(recorded.start),
+            attributes=recorded.attributes,
+        )
+        exported[recorded].end(end_time=ns(recorded.end or trace.end))
+    root.end(end_time=ns(trace.end))
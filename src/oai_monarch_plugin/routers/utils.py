@@ -1,130 +1,287 @@
-import httpx
+import asyncio
+import json
+from collections import deque
+from typing import AsyncIterator, Callable, Collection, Deque, Dict, List, Optional, Sequence, Type, Union
+
+from fastapi import HTTPException, Query, status
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from loguru import logger
-import eutils
-from isbnlib import canonical, meta
-import re
+from pydantic import BaseModel
 
-from .config import settings
+try:
+    import orjson
+except ImportError:  # optional, only needed for settings.fast_json
+    orjson = None
 
-BASE_API_URL = settings.monarch_api_url
+from .backends import MonarchBackend, get_backend
+from .config import settings
+from .metrics import UPSTREAM_TIMEOUTS
+from .models import IncludePublications
+from .tracing import span
+from .publications import get_pub_info, publication_info, resolve_publications
 
 
-async def get_association_all(category: str, entity: str, limit: int, offset: int) -> dict:
-    """Get associations for a given category and entity.
+async def get_association_all(category: str, entity: str, limit: int, offset: int, backend: Optional[MonarchBackend] = None) -> dict:
+    """Get associations for a given category and entity from the configured backend.
     The response will be a list of dictionaries with entries for id, subject, subject_label, predicate, object, object_label, relation_label, frequency_qualifier, and onset_qualifier.
+    A limit above settings.association_page_size is fetched as several pages, concurrently, see iter_association_pages.
     """
 
-    api_url = f"{BASE_API_URL}/association/all"
+    backend = backend or get_backend()
+    page_size = settings.association_page_size
+    with span("associations", category=category):
+        if limit <= page_size:
+            return await backend.associations(category=category, entity=entity, limit=limit, offset=offset)
 
-    params = {"category": category, "entity": entity, "limit": limit, "offset": offset}
+        first_page = await backend.associations(category=category, entity=entity, limit=page_size, offset=offset)
+        items = []
+        async for page in iter_association_pages(category, entity, limit, offset, first_page, backend):
+            items.extend(page.get("items", []))
+        return {**first_page, "limit": limit, "items": items[:limit]}
 
-    async with httpx.AsyncClient() as client:
-        logger.info({
-            "event": "monarch_api_call",
-            "url": str(client.build_request("GET", api_url, params=params).url),
-            "params": params,
-            "api_url": api_url,
-            "method": "GET"
-        })
-        
-        response = await client.get(api_url, params=params)
 
-    response_json = response.json()
+async def iter_association_pages(
+    category: str, entity: str, limit: int, offset: int, first_page: dict, backend: Optional[MonarchBackend] = None
+) -> AsyncIterator[dict]:
+    """Yield, in order, the upstream pages holding up to `limit` associations from `offset` on, starting with
+    the already fetched `first_page`. The remaining pages are known from the first page's total and fetched
+    concurrently, up to settings.association_page_concurrency at a time, so a large result set costs about
+    two round trips rather than one per page.
+    """
+
+    backend = backend or get_backend()
+    yield first_page
 
-    ## if items is None, we need it to be an empty list
-    if "items" in response_json:
-        if response_json["items"] is None:
-            response_json["items"] = []
+    page_size = settings.association_page_size
+    end = min(offset + limit, first_page.get("total", 0))
+    offsets = iter(range(offset + len(first_page.get("items", [])), end, page_size))
+    pending: Deque[asyncio.Task] = deque()
 
-    ## if response_json has an "items" key, we need to make sure each entry of it has a "publications" key
-    ## that is not None - and if it is None, we need to set it to an empty list
-    if "items" in response_json:
-        for item in response_json["items"]:
-            if "publications" not in item:
-                item["publications"] = []
-            elif item["publications"] is None:
-                item["publications"] = []
-            
+    def fetch_next() -> None:
+        page_offset = next(offsets, None)
+        if page_offset is not None:
+            pending.append(asyncio.ensure_future(backend.associations(
+                category=category, entity=entity, limit=min(page_size, end - page_offset), offset=page_offset
+            )))
 
-    return response_json
+    for _ in range(settings.association_page_concurrency):
+        fetch_next()
+    try:
+        while pending:
+            page = await pending.popleft()
+            fetch_next()
+            yield page
+    finally:
+        for task in pending:
+            task.cancel()
 
 
-def get_pub_info(pub: str) -> dict:
-    """Get publication information for a given publication ID.
-    The response will be a dictionary with entries for id, url, and title.
+class AssociationOptions:
+    """The query parameters every association endpoint takes besides its identifiers, limit and offset,
+    as a FastAPI dependency: `options: AssociationOptions = Depends()`.
     """
 
-    pub_dict = {"id": pub}
+    def __init__(
+        self,
+        fetch_all: bool = Query(
+            False,
+            alias="all",
+            description="Return every association (up to a server-side cap) instead of the first `limit`, fetching the upstream pages in parallel.",
+        ),
+        max_results: Optional[int] = Query(
+            None, ge=1, description="Return up to this many associations (up to a server-side cap), overriding `limit`."
+        ),
+        stream: bool = Query(
+            False,
+            description="Stream the associations as newline-delimited JSON, one per line, with the total in the X-Total-Count header.",
+        ),
+        include_publications: IncludePublications = Query(
+            "full",
+            description="How to include the publications of each association: not at all (none), as their identifiers (ids), or with their metadata (full). Identifiers can be resolved later with /publications.",
+        ),
+    ):
+        self.fetch_all = fetch_all
+        self.max_results = max_results
+        self.stream = stream
+        self.include_publications = include_publications
 
-    ## check the publication string is well-formatted, at least matching (ISBN|OMIM|PMID):[0-9]+
-    ## pub_dict with a status of "invalid" and return it
-    if not re.match(r"^(ISBN|OMIM|PMID):.+", pub):
-        pub_dict["status"] = "invalid"
-        return pub_dict
 
-    if pub.startswith("ISBN"):
-        logger.info({
-            "event": "isbn_lookup",
-            "id": pub
-        })
+def effective_limit(limit: int, fetch_all: bool = False, max_results: Optional[int] = None) -> int:
+    """The number of associations a router should return: `max_results` if given, every association
+    if `fetch_all`, else `limit`; capped at settings.max_association_results either way.
+    """
+    if max_results is not None:
+        return min(max_results, settings.max_association_results)
+    if fetch_all:
+        return settings.max_association_results
+    return min(limit, settings.max_association_results)
 
-        try:
-            canonical_isbn = canonical(pub.split(':')[1])
-            data = meta(canonical_isbn)
-        except:
-            pub_dict["status"] = "Error fetching publication info for ISBN " + pub
-            return pub_dict
-
-        authors = data.get("Authors", [None])
-        author = None
-        if len(authors) == 1:
-            author = authors[0]
-        else:
-            author = authors[0] + " et al."
-
-        pub_dict.update({
-            "title": data.get("Title", None),
-            "author(s)": author,
-            "year": data.get("Year", None),
-            "publisher": data.get("Publisher", None),
-            "url": f"https://openlibrary.org/isbn/{canonical_isbn}"
-        })
-
-
-    elif pub.startswith("OMIM"):
-        pub_dict["url"] = f"https://www.omim.org/entry/{pub.split(':')[1]}"
-        pub_dict["title"] = "OMIM Record"
-
-
-    elif pub.startswith("PMID"):
-        logger.info({
-            "event": "pubmed_lookup",
-            "id": pub
-        })
-
-        ec = eutils.Client(api_key = settings.ncbi_api_key)
-        pmid = pub.split(':')[1]
 
+async def get_associations_by_category(
+    categories: List[str],
+    entity: str,
+    limit: int,
+    offset: int,
+    timeouts: Optional[Dict[str, float]] = None,
+    backend: Optional[MonarchBackend] = None,
+) -> Dict[str, dict]:
+    """Get associations for several categories of a single entity, querying all categories concurrently.
+    The response will be a dictionary mapping each category, in the order given, to its get_association_all result.
+    A category that fails or exceeds its timeout (from `timeouts`, else settings.association_category_timeout)
+    contributes an empty result with an "error" entry instead of failing the others.
+    """
+
+    timeouts = timeouts or {}
+
+    async def fetch(category: str) -> dict:
+        timeout = timeouts.get(category, settings.association_category_timeout)
         try:
-            data = next(iter(ec.efetch(db='pubmed', id = pmid)))
-        except:
-            pub_dict["status"] = "Error fetching publication info for PMID " + pmid
-            return pub_dict
-
-        authors = data.authors
-        author = None
-        if len(authors) == 1:
-            author = authors[0]
-        else:
-            author = authors[0] + " et al."
-
-        pub_dict.update({
-            "title": data.title,
-            "author(s)": author,
-            "year": data.year,
-            "journal": data.jrnl,
-            "url": f"https://pubmed.ncbi.nlm.nih.gov/{pmid}"
-        })
-        
-    pub_dict["status"] = "Success"
-    return pub_dict
\ No newline at end of file
+            return await asyncio.wait_for(
+                get_association_all(category=category, entity=entity, limit=limit, offset=offset, backend=backend),
+                timeout=timeout,
+            )
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError):
+                UPSTREAM_TIMEOUTS.labels("monarch", category).inc()
+                error = f"timed out after {timeout}s"
+            else:
+                error = repr(e)
+            logger.warning("association_category_failed", category=category, entity=entity, error=error)
+            return {"items": [], "total": 0, "error": error}
+
+    results = await asyncio.gather(*(fetch(category) for category in categories))
+    return dict(zip(categories, results))
+
+
+def unique_entities(ids: List[str], stream: bool = False) -> List[str]:
+    """The distinct entity ids of an association query, in order. Raises an HTTPException if there are more
+    than settings.max_association_entities, or several of them with stream set.
+    """
+    entities = list(dict.fromkeys(ids))
+    if len(entities) > settings.max_association_entities:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"At most {settings.max_association_entities} identifiers can be queried at once.",
+        )
+    if stream and len(entities) > 1:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Only a single identifier can be streamed.")
+    return entities
+
+
+async def get_associations_for_entities(
+    categories: List[str],
+    entities: List[str],
+    limit: int,
+    offset: int,
+    backend: Optional[MonarchBackend] = None,
+) -> Dict[str, Dict[str, dict]]:
+    """Get associations for one or more categories of several entities, querying all entities and categories concurrently.
+    The response will be a dictionary mapping each entity, in the order given, to a dictionary mapping each category
+    to its get_association_all result.
+    For a single entity and category, errors are raised as from get_association_all; otherwise a category that fails
+    contributes an empty result with an "error" entry, as with get_associations_by_category.
+    """
+    if len(entities) == 1 and len(categories) == 1:
+        result = await get_association_all(category=categories[0], entity=entities[0], limit=limit, offset=offset, backend=backend)
+        return {entities[0]: {categories[0]: result}}
+
+    results = await asyncio.gather(*(
+        get_associations_by_category(categories=categories, entity=entity, limit=limit, offset=offset, backend=backend)
+        for entity in entities
+    ))
+    return dict(zip(entities, results))
+
+
+def associations_response(response_model: Type[BaseModel], groups: List[BaseModel], **fields) -> BaseModel:
+    """Build an association router's response from the association groups of the entities queried: the
+    associations and total of a single entity, or with several, their groups and the sum of their totals.
+    """
+    if len(groups) == 1:
+        return response_model(associations=groups[0].associations, total=groups[0].total, **fields)
+    return response_model(associations=[], total=sum(group.total for group in groups), groups=groups, **fields)
+
+
+def association_errors(results: Dict[str, dict]) -> Optional[str]:
+    """The errors of an entity's results from get_associations_for_entities, if any, as one message."""
+    errors = [f"{category}: {result['error']}" for category, result in results.items() if result.get("error")]
+    return "; ".join(errors) or None
+
+
+# builds one response model from an association item and the resolved publications
+AssociationBuilder = Callable[[dict, Dict[str, dict]], BaseModel]
+
+
+async def stream_associations(
+    builders: Dict[str, AssociationBuilder],
+    entity: str,
+    limit: int,
+    offset: int,
+    with_publications: Optional[Collection[str]] = None,
+    backend: Optional[MonarchBackend] = None,
+    include_publications: str = "full",
+) -> StreamingResponse:
+    """Stream the associations of an entity as newline-delimited JSON, one association per line.
+    `builders` maps each category to query (in order) to the function building its association models;
+    `limit` and `offset` apply to each category, as in the non-streaming routers. Associations are fetched
+    in upstream pages of settings.association_page_size (see iter_association_pages), and each page is
+    enriched with its publications (for the categories in `with_publications`, default all, and as
+    `include_publications` asks, see publication_info) and sent as soon as it and the pages before it are in. The first page of every category is fetched up front to
+    report the sum of their totals in the X-Total-Count header. A category or page that fails ends that
+    category with an {"category": ..., "error": ...} line.
+    """
+
+    categories = list(builders)
+    with_publications = categories if with_publications is None else with_publications
+    page_size = max(1, min(limit, settings.association_page_size))
+    first_pages = await get_associations_by_category(categories, entity, page_size, offset, backend=backend)
+    total = sum(page.get("total", 0) for page in first_pages.values())
+
+    async def lines() -> AsyncIterator[bytes]:
+        for category in categories:
+            first_page = first_pages[category]
+            if "error" in first_page:
+                yield _dumps({"category": category, "error": first_page["error"]}) + b"\n"
+                continue
+
+            sent = 0
+            try:
+                async for page in iter_association_pages(category, entity, limit, offset, first_page, backend):
+                    items = page.get("items", [])[:limit - sent]
+                    pub_info = {}
+                    if category in with_publications:
+                        pub_info = await publication_info(
+                            (pub for item in items for pub in item.get("publications", [])), include_publications
+                        )
+                    if items:
+                        build = builders[category]
+                        yield b"".join(_dumps(build(item, pub_info).dict()) + b"\n" for item in items)
+                    sent += len(items)
+            except Exception as e:
+                yield _dumps({"category": category, "error": repr(e)}) + b"\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers={"X-Total-Count": str(total)})
+
+
+def _dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content).encode()
+
+
+def fast_json_enabled() -> bool:
+    """Whether responses are serialized with orjson, see settings.fast_json."""
+    return settings.fast_json and orjson is not None
+
+
+def model_response(content: Union[BaseModel, Sequence[BaseModel]]) -> Union[BaseModel, Sequence[BaseModel], Response]:
+    """Return a router's already-built response model(s).
+    With fast JSON enabled they are serialized directly with orjson; returning a Response makes FastAPI
+    skip re-validating them against the response_model and the jsonable_encoder pass.
+    Otherwise the content is returned unchanged for FastAPI to handle as usual.
+    """
+    if not fast_json_enabled():
+        return content
+    with span("serialize"):
+        if isinstance(content, BaseModel):
+            return ORJSONResponse(content.dict())
+        return ORJSONResponse([item.dict() for item in content])
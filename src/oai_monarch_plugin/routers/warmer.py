@@ -0,0 +1,138 @@
+"""Background warmer for the entity records and first association pages of popular entities.
+
+A few thousand entities account for most requests, and each of their /entity lookups and
+first association pages costs an upstream round trip whenever the response cache has expired.
+With settings.warm enabled, the app lifespan starts a Warmer that refreshes these calls for a hot
+set of entities every settings.warm_interval seconds. Their responses are kept in
+monarch_client.hot_responses, from which MonarchClient serves them without waiting on Monarch,
+stale or not (a stale response is refreshed in the background).
+
+The hot set is the ids listed in settings.warm_seed_file plus the settings.warm_learned_size
+entities most queried recently, counted by MonarchClient.
+"""
+import asyncio
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+from .backends.monarch_client import MonarchClient, entity_requests, hot_responses, warming
+from .config import settings
+from .utils import resolve_publications
+
+# the association pages requested by the routers' default queries for an entity of each category,
+# as (category, offset); the limit is the routers' default limit
+FIRST_PAGE_LIMIT = 10
+FIRST_PAGES: Dict[str, List[Tuple[str, int]]] = {
+    "biolink:Disease": [
+        ("biolink:DiseaseToPhenotypicFeatureAssociation", 0),
+        ("biolink:CausalGeneToDiseaseAssociation", 0),
+        ("biolink:CorrelatedGeneToDiseaseAssociation", 0),
+    ],
+    "biolink:Gene": [
+        ("biolink:GeneToPhenotypicFeatureAssociation", 0),
+        ("biolink:CausalGeneToDiseaseAssociation", 0),
+        ("biolink:CorrelatedGeneToDiseaseAssociation", 0),
+    ],
+    "biolink:PhenotypicFeature": [
+        ("biolink:DiseaseToPhenotypicFeatureAssociation", 0),
+        # /phenotype-genes defaults to offset=1
+        ("biolink:GeneToPhenotypicFeatureAssociation", 1),
+    ],
+}
+
+
+def read_seed_file(path: str) -> List[str]:
+    """Read entity ids, one per line; blank lines and lines starting with # are skipped."""
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+
+class Warmer:
+    """Periodically refreshes the hot set's entity records and first association pages into hot_responses."""
+
+    def __init__(
+        self,
+        client: MonarchClient,
+        seed_ids: Sequence[str] = (),
+        interval: float = settings.warm_interval,
+        learned_size: int = settings.warm_learned_size,
+        concurrency: int = settings.warm_concurrency,
+    ):
+        self.client = client
+        self.seed_ids = list(seed_ids)
+        self.interval = interval
+        self.learned_size = learned_size
+        self.concurrency = concurrency
+        self._task: Optional[asyncio.Task] = None
+
+    def hot_set(self) -> List[str]:
+        """The seed ids, then the most requested entities since the previous call.
+        Request counts are halved on every call, so the learned set follows changes in traffic.
+        """
+        learned = [id for id, _ in entity_requests.most_common(self.learned_size)]
+        for id in list(entity_requests):
+            entity_requests[id] //= 2
+            if entity_requests[id] == 0:
+                del entity_requests[id]
+        return list(dict.fromkeys(self.seed_ids + learned))
+
+    async def refresh(self) -> None:
+        """Refresh every hot call once, and drop responses of entities no longer in the hot set."""
+        start = time.perf_counter()
+        ids = self.hot_set()
+        keys = set()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        token = warming.set(keys)
+        try:
+            failed = sum(await asyncio.gather(*(self._warm(id, semaphore) for id in ids)))
+        finally:
+            warming.reset(token)
+        hot_responses.retain(keys)
+
+        logger.info(
+            "warm_refresh",
+            entities=len(ids),
+            failed=failed,
+            responses=len(keys),
+            duration_ms=round((time.perf_counter() - start) * 1000, 1),
+        )
+
+    async def _warm(self, id: str, semaphore: asyncio.Semaphore) -> bool:
+        """Refresh one entity's calls, returning whether it failed."""
+        async with semaphore:
+            try:
+                entity = await self.client.entity(id)
+                pages = await asyncio.gather(*(
+                    self.client.associations(category, id, FIRST_PAGE_LIMIT, offset)
+                    for category, offset in FIRST_PAGES.get(entity.get("category"), [])
+                ))
+                # publications are cached by resolve_publications itself
+                await resolve_publications(
+                    pub for page in pages for item in page.get("items", []) for pub in item.get("publications", [])
+                )
+                return False
+            except Exception as e:
+                logger.warning("warm_failed", id=id, error=repr(e))
+                return True
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning("warm_refresh_failed", error=repr(e))
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        hot_responses.max_age = self.interval
+        self._task = asyncio.ensure_future(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,44 @@
+import httpx
+import pytest
+
+from oai_monarch_plugin.routers.backends import monarch_client, set_backend
+from oai_monarch_plugin.routers.backends.monarch_client import MonarchClient
+from oai_monarch_plugin.routers.circuit_breaker import reset_breakers
+
+
+def clear_response_caches():
+    monarch_client.response_cache.clear()
+    monarch_client.hot_responses.clear()
+    monarch_client.entity_requests.clear()
+
+
+@pytest.fixture(autouse=True)
+def closed_circuits():
+    # failures recorded by one test must not open a circuit for the next
+    reset_breakers()
+    yield
+    reset_breakers()
+
+
+@pytest.fixture(autouse=True)
+def empty_response_caches():
+    # responses cached by one test must not be served to the next
+    clear_response_caches()
+    yield
+    clear_response_caches()
+
+
+@pytest.fixture
+def mock_monarch():
+    """Serve the app's Monarch API calls from an httpx MockTransport handler.
+    `mock_monarch(handler)` installs a MonarchClient calling the handler as the backend and returns it;
+    the backend is reset after the test.
+    """
+
+    def install(handler) -> MonarchClient:
+        client = MonarchClient(client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+        set_backend(client)
+        return client
+
+    yield install
+    set_backend(None)
@@ -0,0 +1,102 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from oai_monarch_plugin.main import app
+from oai_monarch_plugin.routers.config import settings
+
+test_client = TestClient(app)
+
+
+@pytest.fixture
+def upstream_calls(mock_monarch):
+    calls = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        await asyncio.sleep(0.05)
+        if request.url.path.endswith("/search"):
+            return httpx.Response(200, json={"total": 1, "items": [
+                {"id": "MONDO:0009061", "name": "cystic fibrosis", "category": "biolink:Disease"}
+            ]})
+        if request.url.path.endswith("/association/all"):
+            return httpx.Response(200, json={"total": 1, "items": [
+                {"subject": "HGNC:1884", "subject_label": "CFTR", "object": "MONDO:0009061", "publications": []}
+            ]})
+        id = request.url.path.rsplit("/", 1)[-1]
+        return httpx.Response(200, json={
+            "id": id, "category": "biolink:Disease", "name": f"name of {id}", "synonym": [], "association_counts": []
+        })
+
+    mock_monarch(handler)
+    return calls
+
+
+def test_batch_runs_operations_in_order(upstream_calls):
+    response = test_client.post("/batch", json={"requests": [
+        {"operation_id": "search_entity", "params": {"term": "cystic fibrosis", "limit": 1}},
+        {"operation_id": "get_entities", "params": {"ids": ["MONDO:0009061", "HP:0002721"]}},
+        {"operation_id": "get_disease_gene_associations", "params": {"disease_id": "MONDO:0009061", "limit": 5}},
+    ]})
+
+    assert response.status_code == 200
+    search, entities, genes = response.json()["responses"]
+    assert search["operation_id"] == "search_entity" and search["status"] == 200
+    assert search["body"]["results"][0]["id"] == "MONDO:0009061"
+    assert [entity["id"] for entity in entities["body"]] == ["MONDO:0009061", "HP:0002721"]
+    assert genes["status"] == 200
+    assert genes["body"]["associations"][0]["gene"]["gene_id"] == "HGNC:1884"
+
+
+def test_overlapping_upstream_calls_are_made_once(upstream_calls):
+    response = test_client.post("/batch", json={"requests": [
+        {"operation_id": "get_entities", "params": {"ids": "MONDO:0009061"}},
+        {"operation_id": "get_entities", "params": {"ids": ["MONDO:0009061"]}},
+    ]})
+
+    assert [item["body"] for item in response.json()["responses"]][0] == response.json()["responses"][1]["body"]
+    assert upstream_calls == ["/v3/api/entity/MONDO:0009061"]
+
+
+def test_each_item_has_its_own_status(upstream_calls):
+    response = test_client.post("/batch", json={"requests": [
+        {"operation_id": "get_entities", "params": {}},
+        {"operation_id": "drop_tables"},
+        {"operation_id": "run_batch"},
+        {"operation_id": "get_disease_gene_associations", "params": {"disease_id": "MONDO:0009061", "stream": True}},
+        {"operation_id": "get_entities", "params": {"ids": "MONDO:0009061"}},
+    ]})
+
+    assert response.status_code == 200
+    assert [item["status"] for item in response.json()["responses"]] == [422, 404, 404, 400, 200]
+
+
+@pytest.mark.parametrize("stream, status_code", [
+    ("false", 200), ("0", 200), (False, 200), ("true", 400), ("1", 400), (["true", "false"], 200), ("maybe", 422),
+])
+def test_stream_is_read_as_a_boolean(upstream_calls, stream, status_code):
+    response = test_client.post("/batch", json={"requests": [
+        {"operation_id": "get_disease_gene_associations", "params": {"disease_id": "MONDO:0009061", "stream": stream}},
+    ]})
+
+    assert response.json()["responses"][0]["status"] == status_code
+
+
+def test_each_operation_counts_for_the_rate_limit(upstream_calls, monkeypatch):
+    monkeypatch.setattr(settings, "rate_limit", True)
+    headers = {"openai-conversation-id": "batching"}
+    batch = {"requests": [{"operation_id": "get_entities", "params": {"ids": "MONDO:0009061"}}] * 20}
+
+    assert test_client.post("/batch", json=batch, headers=headers).status_code == 200
+    rejected = test_client.post("/batch", json=batch, headers=headers)
+    assert rejected.status_code == 429
+    assert int(rejected.headers["retry-after"]) >= 1
+    assert upstream_calls == ["/v3/api/entity/MONDO:0009061"]
+
+
+def test_batch_size_is_capped(monkeypatch):
+    monkeypatch.setattr(settings, "batch_max_requests", 2)
+    response = test_client.post("/batch", json={"requests": [{"operation_id": "search_entity"}] * 3})
+    assert response.status_code == 422
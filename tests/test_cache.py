@@ -0,0 +1,95 @@
+import asyncio
+import time
+
+from oai_monarch_plugin.routers.cache import LRUCache, SQLiteCache, TieredCache
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats() == {"hits": 3, "misses": 1, "size": 2, "bytes": 0}
+
+
+def test_lru_cache_expires_entries():
+    cache = LRUCache(max_entries=10, ttl=60)
+    cache.set("short", "value", ttl=0.01)
+    cache.set("long", "value")
+    time.sleep(0.02)
+
+    assert cache.get("short") is None
+    assert cache.get("long") == "value"
+
+
+def test_sqlite_tier_is_shared_and_promoted(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    writer = TieredCache(LRUCache(10, ttl=60), SQLiteCache(path, ttl=60))
+    writer.set("PMID:1", {"id": "PMID:1", "status": "Success"})
+    writer.set("PMID:2", {"id": "PMID:2", "status": "invalid"}, ttl=-1)
+
+    # a second cache over the same file, e.g. another worker or a restarted process
+    reader = TieredCache(LRUCache(10, ttl=60), SQLiteCache(path, ttl=60))
+    assert reader.get("PMID:1") == {"id": "PMID:1", "status": "Success"}
+    assert reader.get("PMID:2") is None
+    assert reader.stats()["disk"] == {"hits": 1, "misses": 1}
+
+    assert reader.get("PMID:1") is not None
+    assert reader.stats()["memory"]["hits"] == 1
+
+
+def test_sqlite_tier_reads_and_writes_many(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    writer = TieredCache(LRUCache(10, ttl=60), SQLiteCache(path, ttl=60))
+    asyncio.run(writer.set_many_async({"PMID:1": {"id": "PMID:1"}, "PMID:2": {"id": "PMID:2"}}))
+
+    reader = TieredCache(LRUCache(10, ttl=60), SQLiteCache(path, ttl=60))
+    assert asyncio.run(reader.get_many_async(["PMID:1", "PMID:2", "PMID:3"])) == {
+        "PMID:1": {"id": "PMID:1"},
+        "PMID:2": {"id": "PMID:2"},
+    }
+    assert reader.stats()["disk"] == {"hits": 2, "misses": 1}
+    assert asyncio.run(reader.get_async("PMID:2")) == {"id": "PMID:2"}
+    assert reader.stats()["memory"]["hits"] == 1
+
+
+def test_shared_tier_does_not_block_the_event_loop():
+    class SlowTier:
+        def get_many_with_expiry(self, keys):
+            time.sleep(0.2)
+            return {}
+
+    async def run():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.ensure_future(tick())
+        assert await TieredCache(LRUCache(10, ttl=60), SlowTier()).get_async("k") is None
+        ticker.cancel()
+        return ticks
+
+    assert asyncio.run(run()) >= 5
+
+
+def test_lru_cache_evicts_to_max_bytes():
+    cache = LRUCache(max_entries=10, ttl=60, max_bytes=100)
+    cache.set("a", "a", size=60)
+    cache.set("b", "b", size=30)
+    cache.set("c", "c", size=30)
+    cache.set("too-big", "x", size=101)
+
+    assert cache.get("a") is None
+    assert cache.get("b") == "b"
+    assert cache.get("c") == "c"
+    assert cache.get("too-big") is None
+    assert cache.stats()["bytes"] == 60
@@ -0,0 +1,114 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from oai_monarch_plugin.main import app
+from oai_monarch_plugin.routers.backends import monarch_client
+from oai_monarch_plugin.routers.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, get_breaker
+from oai_monarch_plugin.routers.config import settings
+
+test_client = TestClient(app)
+
+
+def test_circuit_opens_on_failure_rate_and_recovers_after_a_probe():
+    breaker = CircuitBreaker("example.org", failure_rate=0.5, min_calls=4, window=30, open_duration=0.05)
+
+    for success in (True, False, True):
+        breaker.record(success)
+    assert breaker.state == CLOSED and breaker.allow()
+
+    breaker.record(False)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    time.sleep(0.05)
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()  # a single probe at a time
+
+    breaker.record(False)
+    assert breaker.state == OPEN
+
+    time.sleep(0.05)
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == CLOSED and breaker.allow()
+
+
+@pytest.fixture
+def failing_upstream(monkeypatch, mock_monarch):
+    monkeypatch.setattr(settings, "monarch_max_retries", 0)
+    state = {"up": True, "calls": 0}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        state["calls"] += 1
+        if not state["up"]:
+            raise httpx.ConnectTimeout("timed out", request=request)
+        return httpx.Response(200, json={"total": 1, "items": [
+            {"object": "HP:0000001", "object_label": "All", "publications": []}
+        ]})
+
+    return mock_monarch(handler), state
+
+
+def test_expired_responses_are_served_when_the_upstream_fails(failing_upstream):
+    client, state = failing_upstream
+    response = test_client.get("/disease-phenotypes?disease_id=MONDO:0009061")
+    assert response.status_code == 200
+
+    # expire the cached response
+    memory = monarch_client.response_cache.memory
+    key = next(key for key in memory._entries)
+    memory.set(key, memory.get(key), expires_at=time.time() - 1)
+    state["up"] = False
+
+    stale = test_client.get("/disease-phenotypes?disease_id=MONDO:0009061")
+    assert stale.status_code == 200
+    assert stale.json() == response.json()
+    assert state["calls"] == 2
+
+
+def test_open_circuit_fails_fast_without_calling_upstream(monkeypatch, failing_upstream):
+    client, state = failing_upstream
+    state["up"] = False
+
+    async def fail_repeatedly():
+        for i in range(settings.circuit_min_calls):
+            with pytest.raises(httpx.ConnectTimeout):
+                await client.entity(f"MONDO:{i}")
+
+    asyncio.run(fail_repeatedly())
+    assert get_breaker("api-v3.monarchinitiative.org").state == OPEN
+
+    calls = state["calls"]
+    response = test_client.get("/disease-phenotypes?disease_id=MONDO:0009061")
+    assert response.status_code == 503
+    assert int(response.headers["retry-after"]) >= 1
+    assert state["calls"] == calls
+
+
+@pytest.mark.parametrize("response, status_code", [
+    (httpx.Response(503, json={"detail": "maintenance"}), 503),
+    (httpx.Response(502, text="<html><body>Bad Gateway</body></html>"), 502),
+])
+def test_upstream_errors_are_not_served_as_data(monkeypatch, mock_monarch, response, status_code):
+    monkeypatch.setattr(settings, "monarch_max_retries", 0)
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        return response
+
+    mock_monarch(handler)
+    response = test_client.get("/disease-phenotypes?disease_id=MONDO:0009061")
+
+    assert response.status_code == status_code
+    assert response.json() == {"detail": f"api-v3.monarchinitiative.org returned status {status_code}"}
+
+
+def test_circuit_breaker_can_be_disabled(monkeypatch):
+    monkeypatch.setattr(settings, "circuit_breaker", False)
+    breaker = CircuitBreaker("example.org", min_calls=1)
+    breaker.record(False)
+    assert breaker.allow()
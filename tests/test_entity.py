@@ -0,0 +1,45 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from oai_monarch_plugin.main import app
+
+test_client = TestClient(app)
+
+
+@pytest.fixture
+def upstream_calls(mock_monarch):
+    calls = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        id = request.url.path.rsplit("/", 1)[-1]
+        calls.append(id)
+        await asyncio.sleep(0.05)
+        if id == "MONDO:missing":
+            return httpx.Response(404, json={"detail": "Entity not found"})
+        return httpx.Response(200, json={
+            "id": id,
+            "category": "biolink:Disease",
+            "name": f"name of {id}",
+            "synonym": [],
+            "association_counts": [{"label": "Phenotypes", "count": 3}],
+        })
+
+    mock_monarch(handler)
+    return calls
+
+
+def test_get_entities_dedupes_keeps_order_and_reports_errors(upstream_calls):
+    response = test_client.get(
+        "/entity?ids=MONDO:0009061&ids=MONDO:missing&ids=HP:0002721&ids=MONDO:0009061"
+    )
+    assert response.status_code == 200
+    data = response.json()
+
+    assert [entity["id"] for entity in data] == ["MONDO:0009061", "MONDO:missing", "HP:0002721"]
+    assert sorted(upstream_calls) == sorted(["MONDO:0009061", "MONDO:missing", "HP:0002721"])
+    assert data[0]["error"] is None
+    assert data[0]["association_counts"] == [{"label": "Phenotypes", "count": 3}]
+    assert "Entity not found" in data[1]["error"]
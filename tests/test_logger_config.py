@@ -0,0 +1,64 @@
+import io
+import json
+import threading
+
+from loguru import logger
+
+from oai_monarch_plugin.logger_config import BatchingSink, parse_sample_rates, sampled
+
+
+def test_batching_sink_writes_json_lines_per_stream():
+    stdout, stderr = io.StringIO(), io.StringIO()
+    sink = BatchingSink(queue_size=100, batch_size=10, flush_interval=0.01, stdout=stdout, stderr=stderr)
+    handler = logger.add(sink, format="{message}")
+    try:
+        logger.info("monarch_api_call", endpoint="search", params={"limit": 10}, **{"openai-conversation-id": "c1"})
+        logger.warning("plain text")
+    finally:
+        logger.remove(handler)
+        sink.stop()
+
+    info = json.loads(stdout.getvalue())
+    assert info["level"] == "INFO"
+    assert info["event"] == "monarch_api_call"
+    assert info["params"] == {"limit": 10}
+    assert info["openai-conversation-id"] == "c1"
+    assert json.loads(stderr.getvalue())["event"] == "plain text"
+
+
+def test_batching_sink_drops_records_when_full_and_reports_them():
+    class BlockingStream(io.StringIO):
+        def __init__(self):
+            super().__init__()
+            self.unblocked = threading.Event()
+
+        def write(self, s):
+            self.unblocked.wait()
+            return super().write(s)
+
+    stdout, stderr = BlockingStream(), io.StringIO()
+    sink = BatchingSink(queue_size=2, batch_size=1, flush_interval=0.01, stdout=stdout, stderr=stderr)
+    handler = logger.add(sink, format="{message}")
+    try:
+        for i in range(10):
+            logger.info("request", i=i)
+        assert sink.dropped > 0
+    finally:
+        stdout.unblocked.set()
+        logger.remove(handler)
+        sink.stop()
+
+    written = [json.loads(line) for line in stdout.getvalue().splitlines()]
+    reported = [json.loads(line) for line in stderr.getvalue().splitlines()]
+    assert len(written) + sink.dropped == 10
+    assert sum(line["count"] for line in reported if line["event"] == "log_records_dropped") == sink.dropped
+
+
+def test_sampling_by_event():
+    rates = parse_sample_rates("monarch_api_call=0, pubmed_lookup=1")
+    assert rates == {"monarch_api_call": 0.0, "pubmed_lookup": 1.0}
+
+    assert not sampled("monarch_api_call", rates)
+    assert sampled("pubmed_lookup", rates)
+    assert sampled("request", rates)
+    assert sampled("request", {})
@@ -0,0 +1,90 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from oai_monarch_plugin.main import app
+from oai_monarch_plugin.routers.backends.monarch_client import MonarchClient, UpstreamError
+from oai_monarch_plugin.routers.config import settings
+from oai_monarch_plugin.routers.metrics import track_upstream
+
+test_client = TestClient(app)
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+@pytest.fixture
+def mock_backend(mock_monarch):
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/search"):
+            return httpx.Response(200, json={"total": 0, "items": []})
+        return httpx.Response(503, json={"detail": "unavailable"})
+
+    mock_monarch(handler)
+
+
+def test_requests_and_upstream_calls_are_recorded(mock_backend):
+    requests_before = sample(
+        "monarch_plugin_request_duration_seconds_count", method="GET", route="/search", status="200"
+    )
+    upstream_before = sample(
+        "monarch_plugin_upstream_request_duration_seconds_count", upstream="monarch", call="search", outcome="success"
+    )
+
+    response = test_client.get("/search?term=fibrosis")
+    assert response.status_code == 200
+
+    assert sample(
+        "monarch_plugin_request_duration_seconds_count", method="GET", route="/search", status="200"
+    ) == requests_before + 1
+    assert sample(
+        "monarch_plugin_upstream_request_duration_seconds_count", upstream="monarch", call="search", outcome="success"
+    ) == upstream_before + 1
+
+
+def test_metrics_endpoint_exposes_samples(mock_backend):
+    test_client.get("/search?term=fibrosis")
+
+    response = test_client.get("/metrics")
+    assert response.status_code == 200
+    assert 'monarch_plugin_request_duration_seconds_count{method="GET",route="/search",status="200"}' in response.text
+    assert "monarch_plugin_requests_in_progress" in response.text
+    assert "/metrics" not in test_client.get("/openapi.json").json()["paths"]
+
+
+def test_failed_association_calls_are_labeled_by_category(monkeypatch, mock_backend):
+    monkeypatch.setattr(settings, "monarch_max_retries", 1)
+    monkeypatch.setattr(settings, "monarch_retry_backoff", 0.001)
+    category = "biolink:DiseaseToPhenotypicFeatureAssociation"
+    labels = {"upstream": "monarch", "call": category}
+    errors_before = sample("monarch_plugin_upstream_request_duration_seconds_count", outcome="error", **labels)
+    retries_before = sample("monarch_plugin_upstream_retries_total", **labels)
+
+    async def run():
+        async def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(503, json={"detail": "unavailable"})
+
+        client = MonarchClient(client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+        return await client.associations(category, "MONDO:0009061", 10, 0)
+
+    with pytest.raises(UpstreamError):
+        asyncio.run(run())
+
+    assert sample("monarch_plugin_upstream_request_duration_seconds_count", outcome="error", **labels) == errors_before + 1
+    assert sample("monarch_plugin_upstream_retries_total", **labels) == retries_before + 1
+
+
+def test_track_upstream_marks_exceptions_as_errors():
+    before = sample("monarch_plugin_upstream_request_duration_seconds_count", upstream="ncbi", call="test", outcome="error")
+
+    with pytest.raises(ValueError):
+        with track_upstream("ncbi", "test"):
+            raise ValueError("boom")
+
+    assert sample(
+        "monarch_plugin_upstream_request_duration_seconds_count", upstream="ncbi", call="test", outcome="error"
+    ) == before + 1
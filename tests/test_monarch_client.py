@@ -0,0 +1,75 @@
+import asyncio
+
+import httpx
+import pytest
+
+from oai_monarch_plugin.routers.backends.monarch_client import MonarchClient, UpstreamError
+from oai_monarch_plugin.routers.config import settings
+
+
+@pytest.fixture(autouse=True)
+def short_backoff(monkeypatch):
+    monkeypatch.setattr(settings, "monarch_retry_backoff", 0.01)
+
+
+def test_pool_is_owned_and_reused():
+    async def run():
+        client = MonarchClient()
+        pool = client.http
+        assert client.http is pool
+        assert pool.timeout.connect == settings.http_connect_timeout
+        await client.close()
+        assert pool.is_closed
+
+    asyncio.run(run())
+
+
+def test_retries_transient_errors_then_succeeds():
+    statuses = [503, 429, 200]
+    calls = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.extensions["timeout"]["read"])
+        status = statuses[len(calls) - 1]
+        return httpx.Response(status, json={"id": "MONDO:0009061"} if status == 200 else {"detail": "busy"})
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+            return await MonarchClient(client=http).entity("MONDO:0009061")
+
+    assert asyncio.run(run()) == {"id": "MONDO:0009061"}
+    assert calls == [settings.monarch_entity_timeout] * 3
+
+
+def test_gives_up_after_max_retries():
+    calls = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return httpx.Response(502, json={"detail": "bad gateway"})
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+            return await MonarchClient(client=http).search("cystic", "biolink:Disease", 10, 0)
+
+    with pytest.raises(UpstreamError) as e:
+        asyncio.run(run())
+    assert e.value.status_code == 502
+    assert len(calls) == settings.monarch_max_retries + 1
+
+
+def test_sim_search_uses_v2_api():
+    urls = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        urls.append(request.url)
+        return httpx.Response(200, json={"matches": []})
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+            client = MonarchClient(v2_base_url="https://v2.example.org/api", client=http)
+            return await client.sim_search(["HP:0002721", "HP:0002110"], True, "phenodigm", 5)
+
+    assert asyncio.run(run()) == {"matches": []}
+    assert urls[0].path == "/api/sim/search"
+    assert urls[0].params.get_list("id") == ["HP:0002721", "HP:0002110"]
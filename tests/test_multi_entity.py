@@ -0,0 +1,109 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from oai_monarch_plugin.main import app
+from oai_monarch_plugin.routers import publications
+from oai_monarch_plugin.routers.config import settings
+
+test_client = TestClient(app)
+
+PHENOTYPES = {
+    "MONDO:0009061": [("HP:0002721", ["OMIM:219700", "OMIM:602421"]), ("HP:0002110", [])],
+    "MONDO:0005148": [("HP:0000819", ["OMIM:602421"])],
+}
+
+
+@pytest.fixture
+def upstream_calls(mock_monarch):
+    calls = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        entity, category = request.url.params["entity"], request.url.params["category"]
+        calls.append((entity, category))
+        await asyncio.sleep(0.05)
+        if entity == "MONDO:broken":
+            raise httpx.ConnectError("connection refused", request=request)
+        if category == "biolink:CausalGeneToDiseaseAssociation":
+            items = [{"subject": "HGNC:1884", "subject_label": "CFTR", "object": entity, "publications": []}]
+        elif category == "biolink:CorrelatedGeneToDiseaseAssociation":
+            items = []
+        else:
+            items = [
+                {"subject": entity, "object": id, "object_label": f"label of {id}", "publications": pubs}
+                for id, pubs in PHENOTYPES.get(entity, [])
+            ]
+        return httpx.Response(200, json={"total": len(items), "items": items})
+
+    mock_monarch(handler)
+    return calls
+
+
+def test_single_id_response_is_unchanged(upstream_calls):
+    response = test_client.get("/disease-phenotypes?disease_id=MONDO:0009061")
+
+    body = response.json()
+    assert body["total"] == 2
+    assert [a["phenotype"]["phenotype_id"] for a in body["associations"]] == ["HP:0002721", "HP:0002110"]
+    assert body["groups"] is None
+
+
+def test_associations_are_grouped_per_id_and_publications_resolved_once(monkeypatch, upstream_calls):
+    resolved = []
+
+    async def resolve_publications(pubs):
+        pubs = list(pubs)
+        resolved.append(pubs)
+        return {pub: {"id": pub} for pub in pubs}
+
+    monkeypatch.setattr(publications, "resolve_publications", resolve_publications)
+    response = test_client.get(
+        "/disease-phenotypes?disease_id=MONDO:0005148&disease_id=MONDO:0009061&disease_id=MONDO:0005148"
+    )
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["associations"] == []
+    assert body["total"] == 3
+    assert [(group["id"], group["total"]) for group in body["groups"]] == [("MONDO:0005148", 1), ("MONDO:0009061", 2)]
+    assert body["groups"][1]["associations"][0]["publications"] == [{"id": "OMIM:219700"}, {"id": "OMIM:602421"}]
+    assert len(upstream_calls) == 2
+    assert len(resolved) == 1
+    assert sorted(set(resolved[0])) == ["OMIM:219700", "OMIM:602421"]
+
+
+def test_failed_ids_report_an_error_without_failing_the_others(monkeypatch, upstream_calls):
+    monkeypatch.setattr(settings, "monarch_max_retries", 0)
+    response = test_client.get("/disease-genes?disease_id=MONDO:0009061&disease_id=MONDO:broken")
+
+    assert response.status_code == 200
+    good, broken = response.json()["groups"]
+    assert good["total"] == 1 and good["error"] is None
+    assert good["associations"][0]["gene"]["gene_id"] == "HGNC:1884"
+    assert broken["total"] == 0 and "CausalGeneToDiseaseAssociation" in broken["error"]
+
+
+def test_number_of_ids_is_capped_and_streams_take_one(monkeypatch, upstream_calls):
+    monkeypatch.setattr(settings, "max_association_entities", 2)
+    assert test_client.get("/gene-phenotypes?gene_id=HGNC:1&gene_id=HGNC:2&gene_id=HGNC:3").status_code == 422
+    assert test_client.get("/gene-phenotypes?gene_id=HGNC:1&gene_id=HGNC:2&stream=true").status_code == 400
+    assert upstream_calls == []
+
+
+def test_publications_can_be_left_out_or_given_as_ids(monkeypatch, upstream_calls):
+    async def fail(pubs):
+        raise AssertionError("publications should not be resolved")
+
+    monkeypatch.setattr(publications, "resolve_publications", fail)
+    path = "/disease-phenotypes?disease_id=MONDO:0009061&include_publications="
+
+    ids = test_client.get(path + "ids").json()
+    assert ids["associations"][0]["publications"] == [{"id": "OMIM:219700"}, {"id": "OMIM:602421"}]
+    none = test_client.get(path + "none").json()
+    assert [a["publications"] for a in none["associations"]] == [[], []]
+    assert test_client.get(path + "some").status_code == 422
+
+    streamed = test_client.get(path + "ids&stream=true").text.splitlines()
+    assert '"publications":[{"id":"OMIM:219700"},{"id":"OMIM:602421"}]' in streamed[0].replace(" ", "")
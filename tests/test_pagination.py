@@ -0,0 +1,77 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from oai_monarch_plugin.main import app
+from oai_monarch_plugin.routers.config import settings
+
+test_client = TestClient(app)
+
+TOTAL = 2300
+
+
+@pytest.fixture
+def upstream(monkeypatch, mock_monarch):
+    monkeypatch.setattr(settings, "association_page_size", 500)
+    monkeypatch.setattr(settings, "association_page_concurrency", 2)
+    monkeypatch.setattr(settings, "max_association_results", 2000)
+    state = {"calls": [], "in_flight": 0, "max_in_flight": 0}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        limit, offset = int(request.url.params["limit"]), int(request.url.params["offset"])
+        state["calls"].append((limit, offset))
+        state["in_flight"] += 1
+        state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+        # later pages answer first, so the order of the results can't come from the order of the responses
+        await asyncio.sleep(0.002 * (TOTAL - offset) / 500)
+        state["in_flight"] -= 1
+        return httpx.Response(200, json={"total": TOTAL, "items": [
+            {"subject": "MONDO:0009061", "object": f"HP:{i:07d}", "object_label": f"phenotype {i}", "publications": []}
+            for i in range(offset, min(offset + limit, TOTAL))
+        ]})
+
+    mock_monarch(handler)
+    return state
+
+
+def phenotype_ids(response) -> list:
+    return [assoc["phenotype"]["phenotype_id"] for assoc in response.json()["associations"]]
+
+
+def test_max_results_fetches_the_pages_concurrently_and_in_order(upstream):
+    response = test_client.get("/disease-phenotypes?disease_id=MONDO:0009061&max_results=1200&offset=100")
+
+    assert response.status_code == 200
+    assert response.json()["total"] == TOTAL
+    assert phenotype_ids(response) == [f"HP:{i:07d}" for i in range(100, 1300)]
+    assert sorted(upstream["calls"]) == [(200, 1100), (500, 100), (500, 600)]
+    assert upstream["max_in_flight"] == 2
+
+
+def test_all_is_capped(upstream):
+    response = test_client.get("/disease-phenotypes?disease_id=MONDO:0009061&all=true")
+
+    assert len(phenotype_ids(response)) == 2000
+    assert upstream["calls"][0] == (500, 0)
+    assert len(upstream["calls"]) == 4
+
+
+@pytest.mark.parametrize("stream", ["false", "true"])
+def test_large_limits_are_capped(upstream, stream):
+    response = test_client.get(f"/disease-phenotypes?disease_id=MONDO:0009061&limit=40000&stream={stream}")
+
+    assert response.status_code == 200
+    if stream == "true":
+        assert len(response.text.splitlines()) == 2000
+    else:
+        assert len(phenotype_ids(response)) == 2000
+    assert len(upstream["calls"]) == 4
+
+
+def test_small_limits_take_a_single_call(upstream):
+    response = test_client.get("/disease-phenotypes?disease_id=MONDO:0009061&limit=20")
+
+    assert len(phenotype_ids(response)) == 20
+    assert upstream["calls"] == [(20, 0)]
@@ -1,5 +1,26 @@
+import asyncio
+import socket
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from oai_monarch_plugin.main import app
+from oai_monarch_plugin.routers import publications
+from oai_monarch_plugin.routers.config import settings
+from oai_monarch_plugin.routers.publications import publication_info, resolve_publications
 from oai_monarch_plugin.routers.utils import get_pub_info
 
+
+@pytest.fixture(autouse=True)
+def clear_publication_cache():
+    publications.publication_cache.clear()
+    yield
+    publications.publication_cache.clear()
+
+
 def test_get_pub_info():
     id = "OMIM:180849"
     pub_info = get_pub_info(id)
@@ -27,3 +48,171 @@ def test_get_pub_info():
     assert pub_info["year"] == "2009"
     assert pub_info["journal"] == "Med Princ Pract"
     assert pub_info["url"] == "https://pubmed.ncbi.nlm.nih.gov/19204439"
+
+
+def test_resolve_publications_dedupes_and_keeps_ids():
+    pubs = ["OMIM:180849", "not-a-pub", "OMIM:180849"]
+    resolved = asyncio.run(resolve_publications(pubs))
+    assert list(resolved) == ["OMIM:180849", "not-a-pub"]
+    assert resolved["OMIM:180849"]["title"] == "OMIM Record"
+    assert resolved["not-a-pub"]["status"] == "invalid"
+
+
+def test_resolve_publications_timeout_falls_back_to_status(monkeypatch):
+    def slow_pub_info(pub):
+        time.sleep(0.5)
+        return {"id": pub, "status": "Success"}
+
+    monkeypatch.setattr(publications, "get_pub_info", slow_pub_info)
+    monkeypatch.setattr(publications.settings, "pub_lookup_timeout", 0.05)
+
+    resolved = asyncio.run(resolve_publications(["ISBN:1", "ISBN:2"]))
+    for pub in ["ISBN:1", "ISBN:2"]:
+        assert resolved[pub]["id"] == pub
+        assert resolved[pub]["status"].startswith("Timed out")
+
+
+def test_resolve_publications_batches_pmids(monkeypatch):
+    class FakeArticle:
+        def __init__(self, pmid):
+            self.pmid = pmid
+            self.title = f"Article {pmid}"
+            self.authors = ["Author A", "Author B"]
+            self.year = "2009"
+            self.jrnl = "Journal"
+
+    class FakeEutilsClient:
+        def __init__(self):
+            self.calls = []
+
+        def efetch(self, db, id):
+            self.calls.append(id)
+            return [FakeArticle(pmid) for pmid in id.split(",") if pmid != "3"]
+
+    fake_client = FakeEutilsClient()
+    monkeypatch.setattr(publications, "_get_eutils_client", lambda: fake_client)
+
+    pubs = ["PMID:1", "PMID:2", "PMID:1", "PMID:3", "OMIM:180849"]
+    resolved = asyncio.run(resolve_publications(pubs))
+
+    assert fake_client.calls == ["1,2,3"]
+    assert list(resolved) == ["PMID:1", "PMID:2", "PMID:3", "OMIM:180849"]
+    assert resolved["PMID:1"]["title"] == "Article 1"
+    assert resolved["PMID:1"]["author(s)"] == "Author A et al."
+    assert resolved["PMID:2"]["url"] == "https://pubmed.ncbi.nlm.nih.gov/2"
+    assert resolved["PMID:3"]["status"] == "No publication info found for PMID 3"
+    assert resolved["OMIM:180849"]["status"] == "Success"
+
+    # a second resolution is served from the cache, including the negative result
+    resolved = asyncio.run(resolve_publications(["pmid:2", "PMID:3"]))
+    assert fake_client.calls == ["1,2,3"]
+    assert resolved["pmid:2"]["id"] == "pmid:2"
+    assert resolved["pmid:2"]["title"] == "Article 2"
+    assert resolved["PMID:3"]["status"] == "No publication info found for PMID 3"
+
+
+def test_transient_failures_are_not_cached(monkeypatch):
+    calls = []
+
+    class FailingEutilsClient:
+        def efetch(self, db, id):
+            calls.append(id)
+            raise ConnectionError("NCBI is down")
+
+    def slow_pub_info(pub):
+        calls.append(pub)
+        time.sleep(0.5)
+        return {"id": pub, "status": "Success"}
+
+    monkeypatch.setattr(publications, "_get_eutils_client", lambda: FailingEutilsClient())
+    monkeypatch.setattr(publications, "get_pub_info", slow_pub_info)
+    monkeypatch.setattr(publications.settings, "pub_lookup_timeout", 0.05)
+
+    for _ in range(2):
+        resolved = asyncio.run(resolve_publications(["PMID:1", "ISBN:1"]))
+        assert resolved["PMID:1"]["status"] == "Error fetching publication info for PMID 1"
+        assert resolved["ISBN:1"]["status"].startswith("Timed out")
+    assert sorted(calls) == ["1", "1", "ISBN:1", "ISBN:1"]
+
+
+def test_efetch_requests_time_out(monkeypatch):
+    # accepts connections but never answers
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen()
+    monkeypatch.setattr(publications, "EUTILS_URL", f"http://127.0.0.1:{server.getsockname()[1]}/entrez/eutils")
+    monkeypatch.setattr(publications, "_eutils_client", None)
+    monkeypatch.setattr(publications.settings, "pub_lookup_timeout", 0.2)
+    labels = {"upstream": "ncbi", "call": "pubmed", "outcome": "error"}
+    errors_before = REGISTRY.get_sample_value("monarch_plugin_upstream_request_duration_seconds_count", labels) or 0.0
+
+    start = time.perf_counter()
+    try:
+        result = publications.fetch_pubmed(["PMID:1"])
+    finally:
+        server.close()
+
+    assert time.perf_counter() - start < 2
+    assert result["PMID:1"]["status"] == "Error fetching publication info for PMID 1"
+    # counted as a failed NCBI call, towards opening its circuit
+    assert REGISTRY.get_sample_value("monarch_plugin_upstream_request_duration_seconds_count", labels) == errors_before + 1
+
+
+def test_lookups_waiting_for_the_eutils_client_give_up(monkeypatch):
+    monkeypatch.setattr(publications.settings, "pub_lookup_timeout", 0.05)
+
+    with publications._eutils_lock:
+        result = publications.fetch_pubmed(["PMID:1"])
+
+    assert result["PMID:1"]["status"] == "Error fetching publication info for PMID 1"
+
+
+def test_hung_lookups_do_not_hold_up_the_default_executor(monkeypatch):
+    released = threading.Event()
+
+    def hung_pub_info(pub):
+        released.wait(5)
+        return {"id": pub, "status": "Success"}
+
+    monkeypatch.setattr(publications, "get_pub_info", hung_pub_info)
+    monkeypatch.setattr(publications.settings, "pub_lookup_timeout", 0.05)
+
+    async def run():
+        resolved = await resolve_publications([f"ISBN:{i}" for i in range(40)])
+        start = time.perf_counter()
+        await asyncio.to_thread(time.sleep, 0)
+        return resolved, time.perf_counter() - start
+
+    try:
+        resolved, elapsed = asyncio.run(run())
+    finally:
+        released.set()
+
+    assert all(pub_dict["status"].startswith("Timed out") for pub_dict in resolved.values())
+    assert elapsed < 0.5
+
+
+def test_publication_info_modes(monkeypatch):
+    async def fail(pubs):
+        raise AssertionError("publications should not be resolved")
+
+    pubs = ["OMIM:180849", "PMID:1", "OMIM:180849"]
+    assert asyncio.run(publication_info(pubs))["OMIM:180849"]["title"] == "OMIM Record"
+
+    monkeypatch.setattr(publications, "resolve_publications", fail)
+    assert asyncio.run(publication_info(pubs, "ids")) == {"OMIM:180849": {"id": "OMIM:180849"}, "PMID:1": {"id": "PMID:1"}}
+    assert asyncio.run(publication_info(pubs, "none")) == {}
+
+
+def test_publications_endpoint(monkeypatch):
+    client = TestClient(app)
+
+    response = client.get("/publications?ids=OMIM:180849&ids=not-a-pub&ids=OMIM:180849")
+    assert response.status_code == 200
+    assert response.json() == [
+        {"id": "OMIM:180849", "url": "https://www.omim.org/entry/180849", "title": "OMIM Record", "status": "Success"},
+        {"id": "not-a-pub", "status": "invalid"},
+    ]
+
+    monkeypatch.setattr(settings, "max_publication_ids", 1)
+    assert client.get("/publications?ids=OMIM:1&ids=OMIM:2").status_code == 422
@@ -0,0 +1,91 @@
+import asyncio
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from oai_monarch_plugin.middlewares import RateLimitMiddleware
+from oai_monarch_plugin.routers.config import settings
+from oai_monarch_plugin.routers.rate_limit import AdmissionControl, TokenBuckets
+
+
+def test_token_buckets_allow_a_burst_then_the_rate():
+    buckets = TokenBuckets(rate=100, burst=3, max_keys=10)
+
+    assert [buckets.take("a") for _ in range(3)] == [0, 0, 0]
+    wait = buckets.take("a")
+    assert 0 < wait <= 0.01
+    assert buckets.take("b") == 0
+
+    time.sleep(wait)
+    assert buckets.take("a") == 0
+
+
+def test_token_buckets_take_a_cost():
+    buckets = TokenBuckets(rate=1, burst=3, max_keys=10)
+    assert buckets.take("a", 2) == 0
+    assert buckets.take("a", 2) > 0.9
+    assert buckets.take("a") == 0
+    # a cost above the burst takes a full bucket
+    assert buckets.take("b", 5) == 0
+    assert buckets.take("b") > 0
+
+
+def test_idle_buckets_expire_and_memory_is_bounded():
+    buckets = TokenBuckets(rate=1000, burst=1, max_keys=3)
+    for key in "abcde":
+        buckets.take(key)
+    assert len(buckets) == 3
+
+    time.sleep(0.002)
+    buckets.take("f")
+    assert len(buckets) == 1
+
+
+def test_admission_control_queues_then_rejects():
+    async def run():
+        admission = AdmissionControl(max_in_flight=1, max_queued=1, queue_timeout=1)
+        assert await admission.acquire()
+
+        queued = asyncio.ensure_future(admission.acquire())
+        await asyncio.sleep(0)
+        assert admission.queued == 1
+        assert not await admission.acquire()
+
+        admission.release()
+        assert await queued
+        admission.release()
+
+        timed_out = AdmissionControl(max_in_flight=1, max_queued=1, queue_timeout=0.01)
+        await timed_out.acquire()
+        assert not await timed_out.acquire()
+
+    asyncio.run(run())
+
+
+def test_middleware_limits_each_conversation(monkeypatch):
+    monkeypatch.setattr(settings, "rate_limit", True)
+    monkeypatch.setattr(settings, "rate_limit_rate", 0.1)
+    monkeypatch.setattr(settings, "rate_limit_burst", 2)
+    app = FastAPI()
+    app.middleware("http")(RateLimitMiddleware())
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    @app.get("/metrics")
+    async def metrics():
+        return {}
+
+    client = TestClient(app)
+    runaway = {"openai-conversation-id": "runaway"}
+
+    assert [client.get("/ping", headers=runaway).status_code for _ in range(3)] == [200, 200, 429]
+    rejected = client.get("/ping", headers=runaway)
+    assert rejected.status_code == 429
+    assert 1 <= int(rejected.headers["retry-after"]) <= 10
+
+    assert client.get("/ping", headers={"openai-conversation-id": "other"}).status_code == 200
+    assert client.get("/ping").status_code == 200
+    assert client.get("/metrics", headers=runaway).status_code == 200
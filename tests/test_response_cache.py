@@ -0,0 +1,51 @@
+import asyncio
+
+import httpx
+
+from oai_monarch_plugin.routers.backends.monarch_client import MonarchClient
+
+
+def make_client(calls):
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(str(request.url))
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, json={"items": [{"subject": "HGNC:1884", "publications": None}], "total": 1})
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+def test_concurrent_identical_calls_are_coalesced_and_cached():
+    calls = []
+
+    async def run():
+        async with make_client(calls) as client:
+            backend = MonarchClient(client=client)
+            results = await asyncio.gather(
+                *(backend.associations("biolink:Foo", "MONDO:0009061", 10, 0) for _ in range(5))
+            )
+            again = await backend.associations("biolink:Foo", "MONDO:0009061", 10, 0)
+            other = await backend.associations("biolink:Foo", "MONDO:0009061", 10, 10)
+        return results, again, other
+
+    results, again, other = asyncio.run(run())
+
+    assert len(calls) == 2
+    assert "offset=10" in calls[1]
+    for result in results + [again, other]:
+        assert result["items"][0]["publications"] == []
+
+
+def test_error_responses_are_not_cached():
+    calls = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(str(request.url))
+        return httpx.Response(404, json={"detail": "not found"})
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            await MonarchClient(client=client).entity("MONDO:0009061")
+            await MonarchClient(client=client).entity("MONDO:0009061")
+
+    asyncio.run(run())
+    assert len(calls) == 2
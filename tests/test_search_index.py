@@ -0,0 +1,92 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from oai_monarch_plugin.main import app
+from oai_monarch_plugin.routers.backends import build_snapshot
+from oai_monarch_plugin.routers.search_index import SearchIndex, build_search_index, set_search_index, tokenize
+
+test_client = TestClient(app)
+
+NODES = """id\tcategory\tname\tdescription\tsynonym
+MONDO:0009061\tbiolink:Disease\tcystic fibrosis\tA genetic disorder.\tCF|mucoviscidosis
+MONDO:0008078\tbiolink:Disease\tcystic fibrosis-related diabetes\t\t
+MONDO:0005148\tbiolink:Disease\ttype 2 diabetes mellitus\t\tT2D|adult-onset diabetes
+MONDO:0011027\tbiolink:Disease\tSjögren syndrome\t\t
+HGNC:1884\tbiolink:Gene\tCFTR\t\tcystic fibrosis transmembrane conductance regulator
+HP:0002110\tbiolink:PhenotypicFeature\tBronchiectasis\t\t
+"""
+
+
+@pytest.fixture
+def index(tmp_path):
+    (tmp_path / "nodes.tsv").write_text(NODES)
+    (tmp_path / "edges.tsv").write_text("subject\tpredicate\tobject\n")
+    build_snapshot(str(tmp_path / "nodes.tsv"), str(tmp_path / "edges.tsv"), str(tmp_path / "kg.sqlite"))
+    build_search_index(str(tmp_path / "kg.sqlite"), str(tmp_path / "search.idx"))
+    index = SearchIndex(str(tmp_path / "search.idx"))
+    yield index
+    index.close()
+
+
+def test_tokens_are_lowercased_words_without_accents():
+    assert tokenize("Sjögren-Larsson syndrome, type 2") == ["sjogren", "larsson", "syndrome", "type", "2"]
+
+
+def test_all_tokens_match_as_prefixes_and_names_rank_first(index):
+    result = index.search("cystic fib", None, 10, 0)
+
+    assert result["total"] == 3
+    assert [item["id"] for item in result["items"]] == ["MONDO:0009061", "MONDO:0008078", "HGNC:1884"]
+    assert result["items"][0] == {
+        "id": "MONDO:0009061",
+        "name": "cystic fibrosis",
+        "description": "A genetic disorder.",
+        "category": "biolink:Disease",
+    }
+    assert index.search("mucovisc", None, 10, 0)["items"][0]["id"] == "MONDO:0009061"
+    assert index.search("sjogren", None, 10, 0)["items"][0]["name"] == "Sjögren syndrome"
+    assert index.search("cystic zebra", None, 10, 0)["total"] == 0
+    assert index.search("?!", None, 10, 0)["total"] == 0
+
+
+def test_short_tokens_only_match_whole_tokens(index):
+    assert [item["id"] for item in index.search("cf", None, 10, 0)["items"]] == ["MONDO:0009061"]
+    assert [item["id"] for item in index.search("type 2 diab", None, 10, 0)["items"]] == ["MONDO:0005148"]
+    assert index.search("cy", None, 10, 0)["total"] == 0
+    assert index.search("cys", None, 10, 0)["total"] == 3
+
+
+def test_category_filter_and_pagination(index):
+    assert [item["id"] for item in index.search("cystic", "biolink:Gene", 10, 0)["items"]] == ["HGNC:1884"]
+    assert index.search("cystic", "biolink:Protein", 10, 0)["total"] == 0
+
+    page = index.search("diabetes", "biolink:Disease", 1, 1)
+    assert page["total"] == 2
+    assert page["limit"] == 1 and page["offset"] == 1
+    assert [item["id"] for item in page["items"]] == ["MONDO:0008078"]
+
+
+def test_search_endpoint_uses_the_index(index):
+    set_search_index(index)
+    try:
+        response = test_client.get("/search?term=bronch&category=biolink:PhenotypicFeature")
+    finally:
+        set_search_index(None)
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "results": [{
+            "id": "HP:0002110",
+            "name": "Bronchiectasis",
+            "categories": ["biolink:PhenotypicFeature"],
+            "description": None,
+        }],
+        "total": 1,
+    }
+
+
+def test_index_from_another_format_is_rejected(tmp_path):
+    path = tmp_path / "search.idx"
+    path.write_bytes(b"not an index" * 4)
+    with pytest.raises(ValueError):
+        SearchIndex(str(path))
@@ -0,0 +1,166 @@
+import asyncio
+import fnmatch
+import socketserver
+import threading
+import time
+
+import pytest
+
+from oai_monarch_plugin.routers import cache
+from oai_monarch_plugin.routers.cache import (
+    LRUCache,
+    RedisCache,
+    SQLiteCache,
+    TieredCache,
+    create_shared_cache,
+    deserialize,
+    serialize,
+)
+from oai_monarch_plugin.routers.config import settings
+
+VALUE = {"items": [{"subject": "HGNC:1884", "publications": ["PMID:1"]}], "total": 1, "ratio": 0.5, "next": None}
+
+
+class RedisStandIn(socketserver.ThreadingTCPServer):
+    """Just enough of a Redis server for RedisCache: AUTH, SELECT, GET, MGET, SET with PX, PTTL, DEL and SCAN."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        self.data = {}
+        self.commands = []
+        super().__init__(("127.0.0.1", 0), RedisStandInHandler)
+
+
+class RedisStandInHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            args = [self.rfile.read(int(self.rfile.readline()[1:]) + 2)[:-2] for _ in range(int(line[1:]))]
+            self.server.commands.append(args[0].decode())
+            self.wfile.write(self.reply(args[0].decode().upper(), args[1:]))
+
+    def reply(self, command, args):
+        data = self.server.data
+        now = time.time()
+        for key in [key for key, (_, expires_at) in data.items() if expires_at < now]:
+            del data[key]
+        if command in ("AUTH", "SELECT"):
+            return b"+OK\r\n"
+        if command == "SET":
+            data[args[0]] = (args[1], now + int(args[3]) / 1000)
+            return b"+OK\r\n"
+        if command in ("GET", "MGET"):
+            values = [data.get(key) for key in args]
+            replies = [b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value[0]), value[0]) for value in values]
+            return replies[0] if command == "GET" else b"*%d\r\n" % len(replies) + b"".join(replies)
+        if command == "PTTL":
+            return b":%d\r\n" % (int((data[args[0]][1] - now) * 1000) if args[0] in data else -2)
+        if command == "DEL":
+            return b":%d\r\n" % sum(data.pop(key, None) is not None for key in args)
+        if command == "SCAN":
+            keys = [key for key in data if fnmatch.fnmatchcase(key.decode(), args[2].decode())]
+            return b"*2\r\n$1\r\n0\r\n*%d\r\n" % len(keys) + b"".join(b"$%d\r\n%s\r\n" % (len(k), k) for k in keys)
+        return b"-ERR unknown command\r\n"
+
+
+@pytest.fixture
+def redis_server():
+    server = RedisStandIn()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def redis_url(server) -> str:
+    return f"redis://:secret@127.0.0.1:{server.server_address[1]}/2"
+
+
+@pytest.mark.parametrize("use_msgpack", [True, False])
+def test_values_round_trip_in_either_format(monkeypatch, use_msgpack):
+    if use_msgpack:
+        pytest.importorskip("msgpack")
+    else:
+        monkeypatch.setattr(cache, "msgpack", None)
+    assert deserialize(serialize(VALUE)) == VALUE
+
+
+def test_legacy_json_text_values_are_read(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    legacy = SQLiteCache(path, ttl=60)
+    legacy._conn.execute("INSERT INTO cache VALUES ('k', ?, ?)", ('{"a": 1}', time.time() + 60))
+    assert legacy.get("k") == {"a": 1}
+
+
+def test_redis_cache_is_shared_between_workers(redis_server):
+    writer = TieredCache(LRUCache(10, ttl=60), RedisCache(redis_url(redis_server), ttl=60, prefix="t:"))
+    reader = TieredCache(LRUCache(10, ttl=60), RedisCache(redis_url(redis_server), ttl=60, prefix="t:"))
+
+    writer.set("https://api/entity/HGNC:1884", VALUE, ttl=30)
+    assert reader.get("https://api/entity/HGNC:1884") == VALUE
+    assert reader.get("https://api/entity/other") is None
+    assert reader.stats()["redis"] == {"hits": 1, "misses": 1, "errors": 0}
+
+    # promoted to memory for the rest of its TTL
+    expires_at = reader.memory._entries["https://api/entity/HGNC:1884"][0]
+    assert time.time() + 25 < expires_at <= time.time() + 30
+    assert redis_server.commands[:2] == ["AUTH", "SELECT"]
+
+    writer.clear()
+    assert redis_server.data == {}
+
+
+def test_many_values_take_one_round_trip(redis_server):
+    shared = RedisCache(redis_url(redis_server), ttl=60, prefix="t:")
+    writer = TieredCache(LRUCache(10, ttl=60), shared)
+    reader = TieredCache(LRUCache(10, ttl=60), RedisCache(redis_url(redis_server), ttl=60, prefix="t:"))
+
+    asyncio.run(writer.set_many_async({f"PMID:{i}": {"id": f"PMID:{i}"} for i in range(30)}, ttl=30))
+    assert len(redis_server.data) == 30
+    redis_server.commands.clear()
+
+    found = asyncio.run(reader.get_many_async(["PMID:1", "PMID:2", "PMID:99"]))
+    assert found == {"PMID:1": {"id": "PMID:1"}, "PMID:2": {"id": "PMID:2"}}
+    assert redis_server.commands == ["AUTH", "SELECT", "MGET", "PTTL", "PTTL", "PTTL"]
+    assert reader.stats()["redis"] == {"hits": 2, "misses": 1, "errors": 0}
+
+    # promoted to memory, so only the miss goes to the server again
+    redis_server.commands.clear()
+    assert asyncio.run(reader.get_async("PMID:1")) == {"id": "PMID:1"}
+    assert asyncio.run(reader.get_async("PMID:99")) is None
+    assert redis_server.commands == ["MGET", "PTTL"]
+
+
+def test_redis_errors_are_misses_and_back_off(redis_server):
+    port = redis_server.server_address[1]
+    redis_server.shutdown()
+    redis_server.server_close()
+
+    shared = RedisCache(f"redis://127.0.0.1:{port}", ttl=60)
+    assert shared.get("k") is None
+    shared.set("k", VALUE)
+    assert shared.stats() == {"hits": 0, "misses": 1, "errors": 1}
+
+
+def test_create_shared_cache_from_settings(monkeypatch, tmp_path, redis_server):
+    assert create_shared_cache("responses", ttl=60) is None
+
+    monkeypatch.setattr(settings, "cache_backend", "sqlite")
+    monkeypatch.setattr(settings, "cache_dir", str(tmp_path))
+    assert isinstance(create_shared_cache("responses", ttl=60), SQLiteCache)
+    assert (tmp_path / "responses.sqlite").exists()
+
+    monkeypatch.setattr(settings, "cache_backend", "redis")
+    monkeypatch.setattr(settings, "cache_redis_url", redis_url(redis_server))
+    shared = create_shared_cache("publications", ttl=60)
+    shared.set("PMID:1", VALUE)
+    assert list(redis_server.data) == [b"oai-monarch-plugin:publications:PMID:1"]
+
+    monkeypatch.setattr(settings, "cache_backend", "memcached")
+    with pytest.raises(ValueError):
+        create_shared_cache("responses", ttl=60)
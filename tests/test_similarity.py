@@ -0,0 +1,101 @@
+import pytest
+from fastapi.testclient import TestClient
+
+pytest.importorskip("numpy")
+
+from oai_monarch_plugin.main import app
+from oai_monarch_plugin.routers.backends import build_snapshot
+from oai_monarch_plugin.routers.similarity import PhenotypeSimilarity, set_similarity_engine
+
+test_client = TestClient(app)
+
+# All > Phenotypic abnormality > {lung > {bronchiectasis, cough}, heart > arrhythmia}
+PARENTS = {
+    "HP:0000118": ["HP:0000001"],
+    "HP:0002086": ["HP:0000118"],
+    "HP:0002110": ["HP:0002086"],
+    "HP:0012735": ["HP:0002086"],
+    "HP:0001626": ["HP:0000118"],
+    "HP:0011675": ["HP:0001626"],
+}
+ANNOTATIONS = {
+    "MONDO:0009061": ["HP:0002110", "HP:0012735"],
+    "MONDO:0018956": ["HP:0002110"],
+    "MONDO:0015263": ["HP:0011675"],
+    "HGNC:1884": ["HP:0012735", "HP:0011675"],
+}
+ENTITIES = {
+    "MONDO:0009061": {"label": "cystic fibrosis", "type": "disease", "taxon": {}},
+    "MONDO:0018956": {"label": "idiopathic bronchiectasis", "type": "disease", "taxon": {}},
+    "MONDO:0015263": {"label": "Brugada syndrome", "type": "disease", "taxon": {}},
+    "HGNC:1884": {"label": "CFTR", "type": "gene", "taxon": {"id": "NCBITaxon:9606", "label": "Homo sapiens"}},
+}
+
+
+@pytest.fixture
+def engine():
+    engine = PhenotypeSimilarity(PARENTS, ANNOTATIONS, ENTITIES)
+    set_similarity_engine(engine)
+    yield engine
+    set_similarity_engine(None)
+
+
+def test_profiles_are_ranked_by_similarity(engine):
+    matches = engine.search(["HP:0002110", "HP:0012735"], limit=10)
+
+    assert [match["id"] for match in matches] == ["MONDO:0009061", "MONDO:0018956", "HGNC:1884", "MONDO:0015263"]
+    assert [match["rank"] for match in matches] == ["1", "2", "3", "4"]
+    assert matches[0]["score"] == 100
+    assert matches[0]["score"] > matches[1]["score"] > matches[3]["score"]
+
+
+def test_information_content_and_closure(engine):
+    ic = dict(zip(engine.terms, engine.ic.tolist()))
+    assert ic["HP:0000001"] == 0
+    assert ic["HP:0002110"] == pytest.approx(1.0)  # 2 of 4 entities
+    assert engine.max_ic == 2.0
+    ancestors = {engine.terms[i] for i in engine._ancestors(engine.term_index["HP:0002110"])}
+    assert ancestors == {"HP:0002110", "HP:0002086", "HP:0000118", "HP:0000001"}
+
+
+def test_endpoint_matches_entities_by_their_phenotypes(engine):
+    response = test_client.get("/phenotype-profile-search?ids=MONDO:0009061&limit=2")
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [match["id"] for match in body["matches"]] == ["MONDO:0018956", "HGNC:1884"]
+    assert body["matches"][1]["taxon"] == {"id": "NCBITaxon:9606", "label": "Homo sapiens"}
+    assert body["max_max_ic"] == 2.0
+
+
+def test_endpoint_without_engine_or_phenotypes():
+    assert test_client.get("/phenotype-profile-search?ids=HP:0002110").status_code == 501
+
+    set_similarity_engine(PhenotypeSimilarity(PARENTS, ANNOTATIONS, ENTITIES))
+    try:
+        assert test_client.get("/phenotype-profile-search?ids=MONDO:9999999").status_code == 404
+    finally:
+        set_similarity_engine(None)
+
+
+def test_engine_is_built_from_a_snapshot(tmp_path):
+    nodes = ["id\tcategory\tname\tin_taxon", "NCBITaxon:9606\tbiolink:OrganismTaxon\tHomo sapiens\t"]
+    nodes += [f"{term}\tbiolink:PhenotypicFeature\t{term}\t" for term in PARENTS]
+    nodes += [
+        f"{id}\tbiolink:{entity['type'].capitalize()}\t{entity['label']}\t{entity['taxon'].get('id', '')}"
+        for id, entity in ENTITIES.items()
+    ]
+    edges = ["subject\tpredicate\tobject\tcategory"]
+    edges += [f"{term}\tbiolink:subclass_of\t{parent}\tbiolink:Association" for term, ps in PARENTS.items() for parent in ps]
+    edges += [
+        f"{id}\tbiolink:has_phenotype\t{term}\tbiolink:"
+        + ("Gene" if id.startswith("HGNC") else "Disease") + "ToPhenotypicFeatureAssociation"
+        for id, terms in ANNOTATIONS.items() for term in terms
+    ]
+    (tmp_path / "nodes.tsv").write_text("\n".join(nodes) + "\n")
+    (tmp_path / "edges.tsv").write_text("\n".join(edges) + "\n")
+    build_snapshot(str(tmp_path / "nodes.tsv"), str(tmp_path / "edges.tsv"), str(tmp_path / "kg.sqlite"))
+
+    engine = PhenotypeSimilarity.from_snapshot(str(tmp_path / "kg.sqlite"))
+    expected = PhenotypeSimilarity(PARENTS, ANNOTATIONS, ENTITIES)
+    assert engine.search(["HP:0002110"], limit=10) == expected.search(["HP:0002110"], limit=10)
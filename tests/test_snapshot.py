@@ -0,0 +1,126 @@
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from oai_monarch_plugin.main import app
+from oai_monarch_plugin.routers.backends import SnapshotBackend, build_snapshot, set_backend
+
+NODES = """id\tcategory\tname\tdescription\tsymbol\tsynonym\tin_taxon
+MONDO:0009061\tbiolink:Disease\tcystic fibrosis\tA genetic disorder.\t\tCF|mucoviscidosis\t
+HGNC:1884\tbiolink:Gene\tCFTR\t\tCFTR\t\tNCBITaxon:9606
+HP:0002721\tbiolink:PhenotypicFeature\tImmunodeficiency\t\t\t\t
+HP:0002110\tbiolink:PhenotypicFeature\tBronchiectasis\t\t\t\t
+MONDO:0005148\tbiolink:Disease\ttype 2 diabetes mellitus\t\t\t\t
+"""
+
+EDGES = """id\tsubject\tpredicate\tobject\tcategory\tpublications\tfrequency_qualifier\tonset_qualifier
+e1\tMONDO:0009061\tbiolink:has_phenotype\tHP:0002721\tbiolink:DiseaseToPhenotypicFeatureAssociation\tPMID:1|OMIM:219700\tHP:0040282\t
+e2\tMONDO:0009061\tbiolink:has_phenotype\tHP:0002110\tbiolink:DiseaseToPhenotypicFeatureAssociation\t\t\t
+e3\tHGNC:1884\tbiolink:causes\tMONDO:0009061\tbiolink:CausalGeneToDiseaseAssociation\t\t\t
+"""
+
+
+@pytest.fixture
+def snapshot_path(tmp_path):
+    nodes = tmp_path / "nodes.tsv"
+    edges = tmp_path / "edges.tsv"
+    nodes.write_text(NODES)
+    edges.write_text(EDGES)
+    db_path = str(tmp_path / "kg.sqlite")
+    build_snapshot(str(nodes), str(edges), db_path)
+    return db_path
+
+
+def test_snapshot_associations_match_api_shape(snapshot_path):
+    backend = SnapshotBackend(snapshot_path)
+
+    result = asyncio.run(backend.associations("biolink:DiseaseToPhenotypicFeatureAssociation", "MONDO:0009061", 1, 0))
+    assert result["total"] == 2
+    assert result["items"] == [{
+        "id": "e1",
+        "category": "biolink:DiseaseToPhenotypicFeatureAssociation",
+        "subject": "MONDO:0009061",
+        "subject_label": "cystic fibrosis",
+        "predicate": "biolink:has_phenotype",
+        "object": "HP:0002721",
+        "object_label": "Immunodeficiency",
+        "publications": ["PMID:1", "OMIM:219700"],
+        "frequency_qualifier": "HP:0040282",
+        "onset_qualifier": None,
+    }]
+
+    page_2 = asyncio.run(backend.associations("biolink:DiseaseToPhenotypicFeatureAssociation", "MONDO:0009061", 1, 1))
+    assert [item["object"] for item in page_2["items"]] == ["HP:0002110"]
+    assert page_2["items"][0]["publications"] == []
+
+    # the entity may also be the object of an association
+    causal = asyncio.run(backend.associations("biolink:CausalGeneToDiseaseAssociation", "MONDO:0009061", 10, 0))
+    assert causal["total"] == 1
+    assert causal["items"][0]["subject_label"] == "CFTR"
+
+
+def test_snapshot_search_and_entity(snapshot_path):
+    backend = SnapshotBackend(snapshot_path)
+
+    result = asyncio.run(backend.search("mucovisc", "biolink:Disease", 10, 0))
+    assert result["total"] == 1
+    assert result["items"][0]["id"] == "MONDO:0009061"
+    assert asyncio.run(backend.search("mucovisc", "biolink:Gene", 10, 0))["total"] == 0
+
+    entity = asyncio.run(backend.entity("MONDO:0009061"))
+    assert entity["synonym"] == ["CF", "mucoviscidosis"]
+    counts = {count["label"]: count["count"] for count in entity["association_counts"]}
+    assert counts == {"Causal Genes": 1, "Disease Phenotypes": 2}
+    assert "detail" in asyncio.run(backend.entity("MONDO:nope"))
+
+    # past the last match, the total is still reported
+    assert asyncio.run(backend.search("mucovisc", None, 10, 5)) == {"limit": 10, "offset": 5, "total": 1, "items": []}
+
+
+def test_snapshot_search_without_fts_uses_the_name_index(snapshot_path):
+    backend = SnapshotBackend(snapshot_path)
+    backend._fts = False
+
+    result = asyncio.run(backend.search("Cystic", None, 10, 0))
+    assert result["total"] == 1
+    assert result["items"][0]["id"] == "MONDO:0009061"
+
+    plan = sqlite3.connect(snapshot_path).execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM nodes WHERE name LIKE ?", ("cystic%",)
+    ).fetchall()
+    assert any("nodes_name" in row[-1] for row in plan)
+
+
+def test_snapshot_queries_run_off_the_event_loop(snapshot_path):
+    backend = SnapshotBackend(snapshot_path)
+    threads = []
+    fetchall = backend._fetchall
+
+    def recording_fetchall(sql, params):
+        threads.append(threading.current_thread())
+        return fetchall(sql, params)
+
+    backend._fetchall = recording_fetchall
+    asyncio.run(backend.associations("biolink:DiseaseToPhenotypicFeatureAssociation", "MONDO:0009061", 10, 0))
+    asyncio.run(backend.search("cystic", None, 10, 0))
+    asyncio.run(backend.entity("MONDO:0009061"))
+
+    assert threads and threading.main_thread() not in threads
+
+
+def test_routers_use_snapshot_backend(snapshot_path):
+    set_backend(SnapshotBackend(snapshot_path))
+    try:
+        test_client = TestClient(app)
+        response = test_client.get("/search?term=cystic&category=biolink:Disease")
+        assert response.status_code == 200
+        assert response.json()["results"][0]["name"] == "cystic fibrosis"
+
+        response = test_client.get("/disease-genes?disease_id=MONDO:0009061")
+        assert response.status_code == 200
+        assert response.json()["associations"][0]["gene"]["gene_id"] == "HGNC:1884"
+    finally:
+        set_backend(None)
@@ -0,0 +1,69 @@
+import json
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from oai_monarch_plugin.main import app
+from oai_monarch_plugin.routers.config import settings
+
+test_client = TestClient(app)
+
+TOTAL = 1200
+
+
+@pytest.fixture
+def upstream_calls(monkeypatch, mock_monarch):
+    monkeypatch.setattr(settings, "association_page_size", 500)
+    monkeypatch.setattr(settings, "monarch_max_retries", 0)
+    calls = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        params = request.url.params
+        category, limit, offset = params["category"], int(params["limit"]), int(params["offset"])
+        calls.append((category, limit, offset))
+        if category == "biolink:CausalGeneToDiseaseAssociation":
+            return httpx.Response(200, json={"total": 2, "items": [
+                {"subject": "HGNC:1884", "object": f"MONDO:{i}", "object_label": f"disease {i}"}
+                for i in range(offset, min(offset + limit, 2))
+            ]})
+        if category == "biolink:CorrelatedGeneToDiseaseAssociation":
+            raise httpx.ConnectError("unreachable", request=request)
+        return httpx.Response(200, json={"total": TOTAL, "items": [
+            {"subject": "MONDO:0009061", "object": f"HP:{i:07d}", "object_label": f"phenotype {i}", "publications": []}
+            for i in range(offset, min(offset + limit, TOTAL))
+        ]})
+
+    mock_monarch(handler)
+    return calls
+
+
+def test_streams_ndjson_in_upstream_pages(upstream_calls):
+    response = test_client.get("/disease-phenotypes?disease_id=MONDO:0009061&limit=1100&offset=50&stream=true")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert response.headers["x-total-count"] == str(TOTAL)
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len(lines) == 1100
+    assert lines[0]["phenotype"]["phenotype_id"] == "HP:0000050"
+    assert lines[-1]["phenotype"]["phenotype_id"] == "HP:0001149"
+    assert sorted((limit, offset) for _, limit, offset in upstream_calls) == [(100, 1050), (500, 50), (500, 550)]
+
+
+def test_streaming_stops_at_the_end_of_the_results(upstream_calls):
+    response = test_client.get("/disease-phenotypes?disease_id=MONDO:0009061&limit=5000&offset=1000&stream=true")
+
+    assert len(response.text.splitlines()) == TOTAL - 1000
+    assert len(upstream_calls) == 1
+
+
+def test_streams_each_category_and_reports_failed_ones(upstream_calls):
+    response = test_client.get("/gene-diseases?gene_id=HGNC:1884&limit=10&stream=true")
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert response.headers["x-total-count"] == "2"
+    assert [line["disease"]["disease_id"] for line in lines[:2]] == ["MONDO:0", "MONDO:1"]
+    assert lines[2]["category"] == "biolink:CorrelatedGeneToDiseaseAssociation"
+    assert "error" in lines[2]
@@ -0,0 +1,85 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from oai_monarch_plugin.main import app
+from oai_monarch_plugin.routers import tracing
+from oai_monarch_plugin.routers.config import settings
+
+test_client = TestClient(app)
+
+
+@pytest.fixture
+def mock_backend(mock_monarch):
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, json={
+            "total": 1,
+            "items": [{"object": "HP:0000001", "object_label": "All", "publications": []}],
+        })
+
+    mock_monarch(handler)
+
+
+def test_server_timing_breaks_down_the_request(monkeypatch, mock_backend):
+    monkeypatch.setattr(settings, "tracing", True)
+
+    response = test_client.get("/disease-phenotypes?disease_id=MONDO:0009061")
+    assert response.status_code == 200
+
+    metrics = {metric.split(";")[0]: metric for metric in response.headers["server-timing"].split(", ")}
+    assert set(metrics) >= {"associations", "monarch", "publications", "build", "total"}
+    assert float(metrics["monarch"].split("dur=")[1]) >= 10
+
+
+def test_tracing_is_off_by_default(mock_backend):
+    assert not settings.tracing
+    response = test_client.get("/disease-phenotypes?disease_id=MONDO:0009061")
+    assert "server-timing" not in response.headers
+    assert tracing.span("build") is tracing.span("monarch", call="search")
+
+
+def test_spans_from_tasks_and_threads_are_nested(monkeypatch):
+    monkeypatch.setattr(settings, "tracing", True)
+
+    def in_thread():
+        with tracing.span("ncbi", call="pubmed"):
+            pass
+
+    async def run():
+        with tracing.request_trace() as trace:
+            with tracing.span("publications"):
+                await asyncio.gather(asyncio.to_thread(in_thread), asyncio.to_thread(in_thread))
+        return trace
+
+    trace = asyncio.run(run())
+    assert [span.name for span in trace.spans] == ["publications", "ncbi", "ncbi"]
+    assert trace.spans[1].parent is trace.spans[0]
+    assert 'ncbi;dur=' in trace.server_timing() and 'desc="2 calls"' in trace.server_timing()
+
+
+def test_traces_are_exported_to_opentelemetry(monkeypatch):
+    sdk_trace = pytest.importorskip("opentelemetry.sdk.trace")
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+    exporter = InMemorySpanExporter()
+    provider = sdk_trace.TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    monkeypatch.setattr(tracing, "_otel_tracer", provider.get_tracer("test"))
+    monkeypatch.setattr(settings, "tracing", True)
+    monkeypatch.setattr(settings, "otel_tracing", True)
+
+    with tracing.request_trace() as trace:
+        with tracing.span("associations", category="biolink:DiseaseToPhenotypicFeatureAssociation"):
+            with tracing.span("monarch", call="biolink:DiseaseToPhenotypicFeatureAssociation"):
+                pass
+    tracing.finish_trace(trace, {"endpoint": "/disease-phenotypes", "openai-conversation-id": "abc"})
+
+    spans = {span.name: span for span in exporter.get_finished_spans()}
+    assert set(spans) == {"request", "associations", "monarch"}
+    assert spans["monarch"].parent.span_id == spans["associations"].context.span_id
+    assert spans["associations"].parent.span_id == spans["request"].context.span_id
+    assert spans["request"].attributes["openai-conversation-id"] == "abc"
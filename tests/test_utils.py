@@ -0,0 +1,66 @@
+import asyncio
+import json
+
+import httpx
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse
+
+from oai_monarch_plugin.routers import utils
+from oai_monarch_plugin.routers.backends.monarch_client import MonarchClient
+from oai_monarch_plugin.routers.config import settings
+from oai_monarch_plugin.routers.models import Gene, GeneAssociation, GeneAssociations
+
+
+def test_categories_are_fetched_concurrently_with_partial_results(monkeypatch):
+    # without retries, whose backoff would make the elapsed time random
+    monkeypatch.setattr(settings, "monarch_max_retries", 0)
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        category = request.url.params["category"]
+        if category == "biolink:Slow":
+            await asyncio.sleep(1)
+        elif category == "biolink:Broken":
+            raise httpx.ConnectError("unreachable", request=request)
+        else:
+            await asyncio.sleep(0.1)
+        return httpx.Response(200, json={"items": [{"category": category}], "total": 1})
+
+    categories = ["biolink:B", "biolink:Slow", "biolink:A", "biolink:Broken"]
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            results = await utils.get_associations_by_category(
+                categories, "MONDO:0009061", 10, 0, timeouts={"biolink:Slow": 0.2}, backend=MonarchClient(client=client)
+            )
+            return results, loop.time() - start
+
+    results, elapsed = asyncio.run(run())
+
+    assert list(results) == categories
+    assert elapsed < 0.5
+    assert results["biolink:A"]["items"] == [{"category": "biolink:A", "publications": []}]
+    assert results["biolink:B"]["total"] == 1
+    assert results["biolink:Slow"] == {"items": [], "total": 0, "error": "timed out after 0.2s"}
+    assert results["biolink:Broken"]["items"] == []
+    assert "ConnectError" in results["biolink:Broken"]["error"]
+
+
+def test_model_response_fast_path_matches_default_serialization(monkeypatch):
+    content = GeneAssociations(
+        associations=[GeneAssociation(gene=Gene(gene_id="HGNC:1884", label="CFTR"), metadata={"relationship": "causal"})],
+        total=1,
+        gene_url_template="https://monarchinitiative.org/gene/{gene_id}",
+    )
+
+    monkeypatch.setattr(utils.settings, "fast_json", False)
+    assert utils.model_response(content) is content
+
+    monkeypatch.setattr(utils.settings, "fast_json", True)
+    response = utils.model_response(content)
+    assert isinstance(response, ORJSONResponse)
+    assert json.loads(response.body) == jsonable_encoder(content)
+
+    response = utils.model_response([content.associations[0].gene])
+    assert json.loads(response.body) == [jsonable_encoder(content.associations[0].gene)]
@@ -0,0 +1,88 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from oai_monarch_plugin.main import app
+from oai_monarch_plugin.routers.backends import monarch_client
+from oai_monarch_plugin.routers.config import settings
+from oai_monarch_plugin.routers.warmer import Warmer, read_seed_file
+
+test_client = TestClient(app)
+
+CATEGORIES = {"MONDO:0009061": "biolink:Disease", "HP:0002721": "biolink:PhenotypicFeature"}
+
+
+@pytest.fixture
+def upstream(monkeypatch, mock_monarch):
+    monkeypatch.setattr(settings, "warm", True)
+    calls = []
+    version = {"n": 1}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url)
+        if "/entity/" in request.url.path:
+            id = request.url.path.rsplit("/", 1)[1]
+            return httpx.Response(200, json={
+                "id": id, "category": CATEGORIES[id], "name": f"{id} v{version['n']}", "synonym": [], "association_counts": []
+            })
+        return httpx.Response(200, json={"total": 1, "items": [
+            {"subject": "HGNC:1884", "subject_label": "CREBBP", "object": "HP:0000001", "object_label": "All", "publications": []}
+        ]})
+
+    return mock_monarch(handler), calls, version
+
+
+def test_hot_entities_are_served_without_upstream_calls(upstream):
+    client, calls, _ = upstream
+    asyncio.run(Warmer(client, seed_ids=["MONDO:0009061", "HP:0002721"]).refresh())
+    # entity record plus 3 disease and 2 phenotype first pages
+    assert len(calls) == 7
+
+    monarch_client.response_cache.clear()
+    calls.clear()
+    assert test_client.get("/entity?ids=MONDO:0009061").json()[0]["name"] == "MONDO:0009061 v1"
+    assert test_client.get("/disease-genes?disease_id=MONDO:0009061").status_code == 200
+    assert test_client.get("/phenotype-genes?phenotype_id=HP:0002721").status_code == 200
+    assert calls == []
+
+
+def test_stale_responses_are_served_and_refreshed_in_the_background(upstream):
+    client, calls, version = upstream
+
+    async def run():
+        await Warmer(client, seed_ids=["MONDO:0009061"]).refresh()
+        monarch_client.hot_responses.max_age = 0
+        version["n"] = 2
+        stale = await client.entity("MONDO:0009061")
+        await asyncio.sleep(0.01)
+        return stale, await client.entity("MONDO:0009061")
+
+    stale, refreshed = asyncio.run(run())
+    assert stale["name"] == "MONDO:0009061 v1"
+    assert refreshed["name"] == "MONDO:0009061 v2"
+
+
+def test_hot_set_is_learned_from_requests(upstream):
+    client, _, _ = upstream
+    monarch_client.entity_requests.update({"HP:0002721": 5, "MONDO:0009061": 1})
+
+    warmer = Warmer(client, seed_ids=["HGNC:1884"], learned_size=1)
+    assert warmer.hot_set() == ["HGNC:1884", "HP:0002721"]
+    assert dict(monarch_client.entity_requests) == {"HP:0002721": 2}
+
+
+def test_entities_leaving_the_hot_set_are_dropped(upstream):
+    client, _, _ = upstream
+    asyncio.run(Warmer(client, seed_ids=["MONDO:0009061"]).refresh())
+    assert len(monarch_client.hot_responses) == 4
+
+    asyncio.run(Warmer(client, seed_ids=["HP:0002721"]).refresh())
+    assert len(monarch_client.hot_responses) == 3
+
+
+def test_read_seed_file(tmp_path):
+    seed = tmp_path / "hot.txt"
+    seed.write_text("# popular diseases\nMONDO:0009061\n\n  HP:0002721  \n")
+    assert read_seed_file(str(seed)) == ["MONDO:0009061", "HP:0002721"]